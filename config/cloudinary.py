@@ -1,6 +1,7 @@
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import cloudinary.utils
 from dotenv import load_dotenv
 import os
 
@@ -22,7 +23,7 @@ class CloudinaryConfig:
             api_secret=os.getenv("CLOUDINARY_API_SECRET")
         )
     
-    def upload_file(self, file_path: str, folder: str = "video_assets", eager_transformations: list = None, resource_type: str = "auto") -> dict:
+    def upload_file(self, file_path: str, folder: str = "video_assets", eager_transformations: list = None, resource_type: str = "auto", public_id: str = None) -> dict:
         """
         Upload file lên Cloudinary
         Args:
@@ -30,18 +31,38 @@ class CloudinaryConfig:
             folder: Thư mục trên Cloudinary
             eager_transformations: Danh sách các transformation cần tạo trước
             resource_type: Loại resource (auto, image, video, raw)
+            public_id: Public ID cố định (nếu có), file đã tồn tại với public ID này sẽ không bị upload đè
         Returns:
             Dict chứa thông tin file đã upload
         """
         try:
+            options = {"public_id": public_id, "overwrite": False} if public_id else {}
             result = cloudinary.uploader.upload(
                 file_path,
                 folder=folder,
                 resource_type=resource_type,
                 eager_async=True,
                 eager=eager_transformations,
-                eager_notification_url=os.getenv("CLOUDINARY_NOTIFICATION_URL", None)
+                eager_notification_url=os.getenv("CLOUDINARY_NOTIFICATION_URL", None),
+                **options
             )
             return result
         except Exception as e:
-            raise Exception(f"Lỗi khi upload file lên Cloudinary: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Lỗi khi upload file lên Cloudinary: {str(e)}")
+
+    def verify_notification(self, body: str, timestamp: str, signature: str) -> bool:
+        """
+        Kiểm tra chữ ký notification của Cloudinary (header X-Cld-Timestamp và X-Cld-Signature)
+        Args:
+            body: Body gốc của request (chuỗi JSON chưa parse)
+            timestamp: Giá trị header X-Cld-Timestamp
+            signature: Giá trị header X-Cld-Signature
+        Returns:
+            True nếu chữ ký hợp lệ và chưa hết hạn
+        """
+        if not timestamp or not signature:
+            return False
+        try:
+            return cloudinary.utils.verify_notification_signature(body, timestamp, signature)
+        except ValueError:
+            return False
@@ -5,6 +5,41 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+class VersionedCollection:
+    """
+    Bọc collection của pymongo: mọi lệnh ghi (insert/update) tăng trường version của document,
+    dùng làm ETag cho response mà không phải so sánh nội dung
+    """
+
+    def __init__(self, collection, field: str = "version"):
+        self._collection = collection
+        self._field = field
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def _bump(self, update):
+        if isinstance(update, list):
+            # Update dạng pipeline
+            return [*update, {"$set": {self._field: {"$add": [{"$ifNull": [f"${self._field}", 0]}, 1]}}}]
+        update = dict(update)
+        update["$inc"] = {**update.get("$inc", {}), self._field: 1}
+        return update
+
+    def insert_one(self, document, *args, **kwargs):
+        document.setdefault(self._field, 1)
+        return self._collection.insert_one(document, *args, **kwargs)
+
+    def update_one(self, filter, update, *args, **kwargs):
+        return self._collection.update_one(filter, self._bump(update), *args, **kwargs)
+
+    def update_many(self, filter, update, *args, **kwargs):
+        return self._collection.update_many(filter, self._bump(update), *args, **kwargs)
+
+    def find_one_and_update(self, filter, update, *args, **kwargs):
+        return self._collection.find_one_and_update(filter, self._bump(update), *args, **kwargs)
+
+
 class MongoDB:
     _instance: Optional['MongoDB'] = None
     _client: Optional[MongoClient] = None
@@ -23,8 +58,15 @@ class MongoDB:
             self._client = MongoClient(mongo_uri)
             self.db = self._client.get_database()
     
-    def get_collection(self, collection_name: str):
-        return self.db[collection_name]
+    def get_collection(self, collection_name: str, versioned: bool = False):
+        """
+        Lấy collection
+        Args:
+            collection_name: Tên collection
+            versioned: Tự tăng trường version của document ở mọi lệnh ghi
+        """
+        collection = self.db[collection_name]
+        return VersionedCollection(collection) if versioned else collection
     
     def close(self):
         if self._client:
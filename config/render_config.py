@@ -0,0 +1,202 @@
+import os
+from pathlib import Path
+from typing import Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Lấy đường dẫn thư mục gốc của project
+ROOT_DIR = Path(__file__).parent.parent
+
+
+def _default_ffmpeg_binary() -> str:
+    """Ưu tiên ffmpeg đi kèm imageio-ffmpeg, nếu không có thì dùng ffmpeg trong PATH"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+# Đường dẫn ffmpeg dùng cho renderer local
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY") or _default_ffmpeg_binary()
+
+# Thư mục cache các segment đã encode
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(ROOT_DIR, "temp", "render_cache"))
+
+# Frame rate đầu ra và frame rate nội bộ cho segment ảnh tĩnh
+DEFAULT_FPS = int(os.getenv("RENDER_FPS", "30"))
+STILL_FPS = int(os.getenv("RENDER_STILL_FPS", "5"))
+
+# Số tiến trình worker sinh frame cho segment có chuyển động (0 = sinh trong tiến trình render)
+FRAME_WORKERS = int(os.getenv("RENDER_FRAME_WORKERS", "0"))
+
+# Thời lượng transition mặc định giữa 2 segment (giây)
+DEFAULT_TRANSITION_DURATION = float(os.getenv("RENDER_TRANSITION_DURATION", "1.0"))
+
+# Cạnh ngắn của khung hình theo các giá trị resolution của Shotstack
+RESOLUTION_SHORT_SIDE = {
+    "preview": 288,
+    "mobile": 360,
+    "sd": 576,
+    "hd": 720,
+    "720": 720,
+    "1080": 1080,
+    "4k": 2160,
+}
+
+
+def _even(value: float) -> int:
+    return int(round(value / 2)) * 2
+
+
+def get_frame_size(resolution: str = "1080", aspect_ratio: str = "16:9") -> Tuple[int, int]:
+    """
+    Tính kích thước khung hình (width, height) từ resolution và aspectRatio
+    Args:
+        resolution: Độ phân giải theo chuẩn Shotstack (preview, sd, hd, 1080, ...)
+        aspect_ratio: Tỷ lệ khung hình dạng "W:H" (16:9, 9:16, 1:1, 4:5, ...)
+    Returns:
+        Tuple (width, height) đều là số chẵn
+    """
+    short_side = RESOLUTION_SHORT_SIDE.get(str(resolution).lower())
+    if short_side is None:
+        raise ValueError(f"Resolution không hợp lệ: {resolution}")
+
+    try:
+        ratio_w, ratio_h = (float(part) for part in aspect_ratio.split(":"))
+    except ValueError:
+        raise ValueError(f"Aspect ratio không hợp lệ: {aspect_ratio}")
+
+    if ratio_w >= ratio_h:
+        return _even(short_side * ratio_w / ratio_h), _even(short_side)
+    return _even(short_side), _even(short_side * ratio_h / ratio_w)
+
+# Profile encode theo tên: preset/CRF của libx264, khoảng cách keyframe tối đa (giây), bitrate audio
+# và mức quality của output Shotstack (Shotstack không cho chọn preset/CRF/GOP, None = mặc định của Shotstack).
+# "standard" giữ đúng tham số encode trước đây
+ENCODING_PROFILES = {
+    "draft": {"preset": "ultrafast", "crf": 32, "gopSeconds": 10, "audioBitrate": "96k", "shotstackQuality": "low"},
+    "standard": {"preset": "veryfast", "crf": 20, "gopSeconds": 10, "audioBitrate": "192k", "shotstackQuality": None},
+    "archive": {"preset": "slow", "crf": 16, "gopSeconds": 10, "audioBitrate": "256k", "shotstackQuality": "veryhigh"},
+    # Keyframe mỗi 2 giây để nền tảng xử lý lại và tua nhanh, bitrate audio theo khuyến nghị của mạng xã hội
+    "social": {"preset": "medium", "crf": 21, "gopSeconds": 2, "audioBitrate": "128k", "shotstackQuality": "high"},
+}
+
+# Profile encode mặc định khi request không chọn
+ENCODING_PROFILE = os.getenv("ENCODING_PROFILE", "standard")
+
+
+def get_encoding_profile(name: str = None) -> dict:
+    """
+    Lấy tham số của một profile encode
+    Args:
+        name: Tên profile (draft, standard, archive, social), None là profile mặc định
+    Returns:
+        Dict gồm preset, crf, gopSeconds, audioBitrate, shotstackQuality
+    """
+    profile = ENCODING_PROFILES.get(name or ENCODING_PROFILE)
+    if profile is None:
+        raise ValueError(f"Profile encode không hợp lệ: {name or ENCODING_PROFILE}")
+    return profile
+
+# Renderer mặc định cho video mới: "shotstack" hoặc "local"
+RENDERER = os.getenv("RENDERER", "shotstack")
+
+# Thư mục dùng chung giữa API và các chunk worker (NFS/volume chung), chứa file chunk đã render
+RENDER_SHARED_DIR = os.getenv("RENDER_SHARED_DIR", os.path.join(ROOT_DIR, "temp", "render_shared"))
+
+# Thời lượng mục tiêu của mỗi chunk (giây), số lần render lại tối đa một chunk lỗi
+# và thời gian tối đa một chunk được ở trạng thái rendering trước khi bị giao lại cho worker khác
+RENDER_CHUNK_SECONDS = float(os.getenv("RENDER_CHUNK_SECONDS", "60"))
+RENDER_CHUNK_RETRIES = int(os.getenv("RENDER_CHUNK_RETRIES", "2"))
+RENDER_CHUNK_TIMEOUT = int(os.getenv("RENDER_CHUNK_TIMEOUT", "900"))
+
+# Số ngày giữ một đoạn đã render trong kho dùng chung kể từ lần dùng cuối
+RENDER_ARTIFACT_TTL_DAYS = float(os.getenv("RENDER_ARTIFACT_TTL_DAYS", "14"))
+
+# Cache asset (ảnh, audio, nhạc nền) tải từ URL, dùng chung giữa các worker trên cùng máy/volume
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(ROOT_DIR, "temp", "asset_cache"))
+ASSET_CACHE_MAX_BYTES = int(float(os.getenv("ASSET_CACHE_MAX_GB", "5")) * 1024 ** 3)
+
+# Thời gian (giây) dùng asset trong cache mà không hỏi lại server, khi response không có Cache-Control max-age
+ASSET_CACHE_TTL = int(os.getenv("ASSET_CACHE_TTL", "3600"))
+
+# Chuẩn hóa ảnh segment trước khi render: cover-fit về đúng khung hình đầu ra và encode lại cho nhẹ
+IMAGE_NORMALIZE_ENABLED = os.getenv("IMAGE_NORMALIZE_ENABLED", "true").lower() == "true"
+IMAGE_NORMALIZE_DIR = os.getenv("IMAGE_NORMALIZE_DIR", os.path.join(ROOT_DIR, "temp", "normalized_images"))
+IMAGE_NORMALIZE_FORMAT = os.getenv("IMAGE_NORMALIZE_FORMAT", "jpeg")
+IMAGE_NORMALIZE_QUALITY = int(os.getenv("IMAGE_NORMALIZE_QUALITY", "88"))
+# Số tiến trình resize ảnh (0 = theo số CPU)
+IMAGE_NORMALIZE_WORKERS = int(os.getenv("IMAGE_NORMALIZE_WORKERS", "0"))
+
+# Mix sẵn voice-over và nhạc nền thành một track audio (ducking nhạc nền khi có giọng nói, chuẩn hóa loudness)
+AUDIO_PREMIX_ENABLED = os.getenv("AUDIO_PREMIX_ENABLED", "true").lower() == "true"
+AUDIO_MIX_DIR = os.getenv("AUDIO_MIX_DIR", os.path.join(ROOT_DIR, "temp", "audio_mix"))
+AUDIO_MIX_TARGET_LUFS = float(os.getenv("AUDIO_MIX_TARGET_LUFS", "-16"))
+AUDIO_MIX_BACKGROUND_VOLUME = float(os.getenv("AUDIO_MIX_BACKGROUND_VOLUME", "0.2"))
+# Mức giảm thêm (dB) của nhạc nền khi có giọng nói
+AUDIO_MIX_DUCKING_DB = float(os.getenv("AUDIO_MIX_DUCKING_DB", "8"))
+
+# Đóng gói HLS nhiều mức bitrate sau khi render xong: danh sách "cạnh ngắn:bitrate video"
+HLS_ENABLED = os.getenv("HLS_ENABLED", "false").lower() == "true"
+HLS_LADDER = [
+    (int(rung.split(":")[0]), rung.split(":")[1])
+    for rung in os.getenv("HLS_LADDER", "1080:5000k,720:2800k,480:1200k").split(",")
+]
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+HLS_UPLOAD_CONCURRENCY = int(os.getenv("HLS_UPLOAD_CONCURRENCY", "8"))
+
+# Bản video theo tỷ lệ khung hình của từng nền tảng, cắt từ video đã render: "platform:W:H"
+VARIANTS_ENABLED = os.getenv("VARIANTS_ENABLED", "false").lower() == "true"
+VARIANT_PLATFORMS = {
+    item.split(":", 1)[0]: item.split(":", 1)[1]
+    for item in os.getenv("VARIANT_PLATFORMS", "youtube:16:9,facebook:1:1,tiktok:9:16").split(",")
+}
+
+# Thumbnail và storyboard (sprite nhiều frame + VTT để tua) tạo từ file video ngay khi render xong
+THUMBNAIL_ENABLED = os.getenv("THUMBNAIL_ENABLED", "true").lower() == "true"
+# Cạnh dài của thumbnail (pixel) và vị trí lấy frame (tỷ lệ thời lượng video)
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "1280"))
+THUMBNAIL_POSITION = float(os.getenv("THUMBNAIL_POSITION", "0.1"))
+# Storyboard: một ô mỗi STORYBOARD_INTERVAL giây, ô rộng STORYBOARD_TILE_WIDTH pixel, mỗi sprite COLUMNS x ROWS ô
+STORYBOARD_INTERVAL = float(os.getenv("STORYBOARD_INTERVAL", "2"))
+STORYBOARD_TILE_WIDTH = int(os.getenv("STORYBOARD_TILE_WIDTH", "160"))
+STORYBOARD_COLUMNS = int(os.getenv("STORYBOARD_COLUMNS", "10"))
+STORYBOARD_ROWS = int(os.getenv("STORYBOARD_ROWS", "10"))
+# Số tiến trình trích frame (0 = theo số CPU)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "0"))
+
+# Bản nháp độ phân giải thấp render local song song với bản đầy đủ, preview trả bản nháp cho tới khi bản đầy đủ xong
+DRAFT_PREVIEW_ENABLED = os.getenv("DRAFT_PREVIEW_ENABLED", "false").lower() == "true"
+DRAFT_RESOLUTION = os.getenv("DRAFT_RESOLUTION", "preview")
+DRAFT_FPS = int(os.getenv("DRAFT_FPS", "12"))
+DRAFT_CRF = int(os.getenv("DRAFT_CRF", "32"))
+
+# Proxy xem trước: thời gian (giây) CDN/trình duyệt dùng response mà không hỏi lại (sau đó kiểm tra lại bằng ETag)
+PREVIEW_CACHE_MAX_AGE = int(os.getenv("PREVIEW_CACHE_MAX_AGE", "300"))
+# Kích thước mỗi lần đọc file khi server ASGI không hỗ trợ gửi file zero-copy
+PREVIEW_CHUNK_SIZE = int(os.getenv("PREVIEW_CHUNK_SIZE", str(256 * 1024)))
+
+# Cache-Control (giây) của chi tiết video và preview khi video đã hoàn thành; khi đang xử lý luôn là no-cache
+VIDEO_DETAIL_MAX_AGE = int(os.getenv("VIDEO_DETAIL_MAX_AGE", "300"))
+VIDEO_PREVIEW_MAX_AGE = int(os.getenv("VIDEO_PREVIEW_MAX_AGE", "60"))
+
+# Dự đoán thời gian render/upload từ lịch sử các job (collection render_history)
+# Số job tối thiểu để fit mô hình, số job gần nhất dùng để fit
+RENDER_ETA_MIN_SAMPLES = int(os.getenv("RENDER_ETA_MIN_SAMPLES", "20"))
+RENDER_HISTORY_LIMIT = int(os.getenv("RENDER_HISTORY_LIMIT", "500"))
+# Khi chưa đủ lịch sử: số giây render và upload cho mỗi giây video
+RENDER_ETA_FALLBACK_RATE = float(os.getenv("RENDER_ETA_FALLBACK_RATE", "1.0"))
+UPLOAD_ETA_FALLBACK_RATE = float(os.getenv("UPLOAD_ETA_FALLBACK_RATE", "0.3"))
+# Khoảng cách ngắn nhất/dài nhất giữa 2 lần hỏi trạng thái Shotstack (giây)
+RENDER_POLL_MIN_INTERVAL = float(os.getenv("RENDER_POLL_MIN_INTERVAL", "3"))
+RENDER_POLL_MAX_INTERVAL = float(os.getenv("RENDER_POLL_MAX_INTERVAL", "60"))
+# Hết thời gian chờ render khi quá RENDER_TIMEOUT_FACTOR lần thời gian dự đoán (ít nhất RENDER_TIMEOUT_MIN giây)
+RENDER_TIMEOUT_FACTOR = float(os.getenv("RENDER_TIMEOUT_FACTOR", "3"))
+RENDER_TIMEOUT_MIN = int(os.getenv("RENDER_TIMEOUT_MIN", "300"))
+
+# Sổ thời gian theo giai đoạn của từng video (collection video_stages), ghi theo lô
+STAGE_LEDGER_ENABLED = os.getenv("STAGE_LEDGER_ENABLED", "true").lower() == "true"
+STAGE_LEDGER_BATCH_SIZE = int(os.getenv("STAGE_LEDGER_BATCH_SIZE", "50"))
+STAGE_LEDGER_FLUSH_INTERVAL = float(os.getenv("STAGE_LEDGER_FLUSH_INTERVAL", "5"))
@@ -7,14 +7,41 @@ class VideoController:
     async def generate_video(self, data: dict):
         return await self.video_service.generate_video(data)
     
+    async def get_video_version(self, video_id: str, endpoint: str):
+        return await self.video_service.get_video_version(video_id, endpoint)
+    
     async def get_video_status(self, video_id: str):
         return await self.video_service.get_video_status(video_id)
     
     async def get_video_preview(self, video_id: str):
         return await self.video_service.get_video_preview(video_id)
     
+    async def get_preview_file(self, video_id: str):
+        return await self.video_service.get_preview_file(video_id)
+    
     async def get_video_detail(self, video_id: str):
         return await self.video_service.get_video_detail(video_id)
     
+    async def edit_segments(self, video_id: str, changes: list):
+        return await self.video_service.edit_segments(video_id, changes)
+    
+    async def trim_video(self, video_id: str, start: float, end: float = None):
+        return await self.video_service.trim_video(video_id, start, end)
+    
+    async def compile_videos(self, video_ids: list, user_id: str = None):
+        return await self.video_service.compile_videos(video_ids, user_id)
+    
     async def delete_video(self, video_id: str):
-        return await self.video_service.delete_video(video_id) 
\ No newline at end of file
+        return await self.video_service.delete_video(video_id)
+    
+    async def get_asset_cache_stats(self):
+        return await self.video_service.get_asset_cache_stats()
+
+    async def get_video_stages(self, video_id: str):
+        return await self.video_service.get_video_stages(video_id)
+
+    async def get_stage_latency(self, since=None, until=None, hours: float = 24):
+        return await self.video_service.get_stage_latency(since, until, hours)
+
+    async def handle_cloudinary_notification(self, body: str, timestamp: str, signature: str):
+        return await self.video_service.handle_cloudinary_notification(body, timestamp, signature)
@@ -1,5 +1,6 @@
 from service.youtube_service import YouTubeService
 from service.video_service import VideoService
+from service.stage_ledger import StageLedger
 from models.youtube_model import (
     YouTubeUploadRequest, 
     YouTubeUpdateRequest, 
@@ -39,6 +40,7 @@ def get_youtube_tokens_from_db(user_id):
 class YouTubeController:
     def __init__(self):
         self.video_service = VideoService()
+        self.ledger = StageLedger()
         
     async def get_user_videos(self, user_id: str) -> UserVideosResponse:
         """
@@ -190,8 +192,9 @@ class YouTubeController:
                 token_uri=token_uri
             )
            
-            # Tải video từ Cloudinary về local
-            video_url = video_info.get('originUrl') or video_info.get('url')
+            # Tải video từ Cloudinary về local, ưu tiên bản theo tỷ lệ khung hình của YouTube
+            youtube_variant = (video_info.get('variants') or {}).get('youtube') or {}
+            video_url = youtube_variant.get('url') or video_info.get('originUrl') or video_info.get('url')
             if not video_url:
                 raise Exception("Không tìm thấy URL của video")
                 
@@ -204,23 +207,27 @@ class YouTubeController:
             video_path = os.path.join(temp_dir, f"{data.videoId}.mp4")
             
             # Tải video từ Cloudinary
-            download_result = os.system(f"curl -o {video_path} {video_url}")
-            if download_result != 0:
-                raise Exception("Không thể tải video từ Cloudinary")
-                
-            if not os.path.exists(video_path):
-                raise Exception("Video không được tải về thành công")
+            with self.ledger.stage(data.videoId, "youtube_download") as timer:
+                download_result = os.system(f"curl -o {video_path} {video_url}")
+                if download_result != 0:
+                    raise Exception("Không thể tải video từ Cloudinary")
+
+                if not os.path.exists(video_path):
+                    raise Exception("Video không được tải về thành công")
+                timer.bytes = os.path.getsize(video_path)
             
             # Upload lên YouTube
             logger.info("Bắt đầu upload lên YouTube...")
-            result = await youtube_service.upload_video(
-                video_path=video_path,
-                title=data.title,
-                description=data.description,
-                category_id=data.categoryId,
-                privacy_status=data.privacyStatus,
-                tags=data.tags
-            )
+            with self.ledger.stage(data.videoId, "youtube_upload") as timer:
+                timer.bytes = os.path.getsize(video_path)
+                result = await youtube_service.upload_video(
+                    video_path=video_path,
+                    title=data.title,
+                    description=data.description,
+                    category_id=data.categoryId,
+                    privacy_status=data.privacyStatus,
+                    tags=data.tags
+                )
             logger.info(f"Upload thành công: {result}")
             
             # Cập nhật thông tin video lên YouTube vào VideoModel
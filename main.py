@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from routes.video_routes import router as video_router
 from routes.youtube_routes import router as youtube_router
 from service.video_service import VideoService
+from service.stage_ledger import StageLedger
 import sys
 import platform
 
@@ -10,6 +11,11 @@ video_service = VideoService()
 
 app = FastAPI()
 
+@app.on_event("shutdown")
+async def flush_stage_ledger():
+    """Ghi nốt các sự kiện thời gian giai đoạn còn trong bộ nhớ trước khi tắt"""
+    StageLedger().flush()
+
 @app.get("/health")
 async def health_check():
     """Endpoint kiểm tra trạng thái hoạt động của ứng dụng"""
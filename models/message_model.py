@@ -1,6 +1,17 @@
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
  
 class VideoMessage(BaseModel):
     video_id: str
-    data: Dict[str, Any] 
\ No newline at end of file
+    data: Dict[str, Any]
+
+class ChunkMessage(BaseModel):
+    video_id: str
+    chunk_index: int
+    attempt: int = 0
+    width: int
+    height: int
+    parts: List[Dict[str, Any]]  # Các đoạn trong plan của LocalRenderService cần render
+    keys: List[str]  # Khóa nội dung của từng đoạn trong kho đoạn dùng chung
+    artifact_dir: str  # Thư mục kho đoạn dùng chung
+    profile: Optional[str] = None  # Profile encode (ENCODING_PROFILES), None là profile mặc định
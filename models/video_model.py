@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Literal, Optional, Dict
+from typing import List, Literal, Optional, Dict, Any
 import os
 from datetime import datetime
 
@@ -9,6 +9,7 @@ class Segment(BaseModel):
     image: str
     audio: str
     duration: float
+    motion: Optional[Literal["zoom_in", "zoom_out", "pan_left", "pan_right", "pan_up", "pan_down"]] = None
 
 class PlatformVideo(BaseModel):
     platform: Literal["youtube", "facebook", "tiktok"]
@@ -29,6 +30,11 @@ class VideoModel(BaseModel):
     # Video settings
     resolution: str = "1080"  # Độ phân giải mặc định là 1080p
     aspectRatio: str = "16:9"  # Tỷ lệ khung hình mặc định là 16:9
+    renderer: Literal["shotstack", "local", "clip"] = "shotstack"  # Shotstack, renderer local theo chunk, hoặc cắt/ghép video có sẵn
+    encodingProfile: Optional[str] = None  # Profile encode (draft, standard, archive, social)
+    kind: Optional[Literal["trim", "compilation"]] = None  # Video cắt/ghép từ video đã render
+    source: Optional[Dict[str, Any]] = None  # Video nguồn khi cắt {"videoId", "start", "end"}
+    sources: Optional[List[str]] = None  # ID các video nguồn khi ghép
     
     # Generated fields
     status: Literal["pending", "processing", "done", "failed"] = "pending"
@@ -36,11 +42,19 @@ class VideoModel(BaseModel):
     log: str = ""
     duration: int = 0
     render_id: Optional[str] = None
+    renderEstimate: Optional[Dict[str, float]] = None  # Thời gian chờ/render/upload dự đoán (giây)
+    etaAt: Optional[datetime] = None  # Thời điểm dự kiến hoàn thành
     outputPath: Optional[str] = None  # URL video MP4 trên Cloudinary
     originPath: Optional[str] = None  # URL video gốc từ Shotstack
     streamingUrl: Optional[str] = None  # URL streaming m3u8
+    draftUrl: Optional[str] = None  # URL bản nháp độ phân giải thấp
+    variants: Optional[Dict[str, Dict[str, Any]]] = None  # Bản video theo tỷ lệ khung hình của từng nền tảng
     thumbnailUrl: Optional[str] = None  # URL thumbnail
+    storyboard: Optional[Dict[str, Any]] = None  # Sprite + VTT xem trước khi tua
     cloudinaryPublicId: Optional[str] = None  # Public ID trên Cloudinary
+    derivedAssets: Optional[List[Dict[str, Any]]] = None  # Asset dẫn xuất (eager) từ notification của Cloudinary
+    copiedSeconds: Optional[float] = None  # Video cắt/ghép: số giây lấy bằng stream copy
+    encodedSeconds: Optional[float] = None  # Video cắt/ghép: số giây phải encode lại
     
     # Platform upload information
     platform_videos: Dict[str, PlatformVideo] = {}
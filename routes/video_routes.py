@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response, Header
 from pydantic import BaseModel
-from typing import List, Literal, Optional
+from typing import List, Literal, Optional, Dict, Any
 from bson import ObjectId
 from controllers.video_controller import VideoController
 from datetime import datetime
@@ -12,6 +12,8 @@ import time
 from service.video_service import VideoService
 from service.shotstack_service import ShotstackService
 from models.video_model import VideoModel
+from service.preflight_service import PreflightError
+from service.preview_proxy import RangeFileResponse
 
 router = APIRouter()
 video_controller = VideoController()
@@ -38,6 +40,7 @@ class Segment(BaseModel):
     image: str
     audio: str
     duration: float
+    motion: Optional[Literal["zoom_in", "zoom_out", "pan_left", "pan_right", "pan_up", "pan_down"]] = None
 
 class VideoGenerateRequest(BaseModel):
     job_id: str
@@ -48,6 +51,34 @@ class VideoGenerateRequest(BaseModel):
     resolution: str = "1080"
     aspectRatio: str = "16:9"
     subtitle: Subtitle = Subtitle()
+    renderer: Optional[Literal["shotstack", "local"]] = None  # Mặc định theo biến môi trường RENDERER
+    durationMode: Optional[Literal["client", "check", "audio"]] = None  # Mặc định theo DURATION_MODE ("client": giữ nguyên duration)
+    draftPreview: Optional[bool] = None  # Render bản nháp độ phân giải thấp, mặc định theo DRAFT_PREVIEW_ENABLED
+    encodingProfile: Optional[Literal["draft", "standard", "archive", "social"]] = None  # Mặc định theo ENCODING_PROFILE
+
+class SegmentEdit(BaseModel):
+    index: int
+    script: Optional[str] = None
+    image: Optional[str] = None
+    audio: Optional[str] = None
+    duration: Optional[float] = None
+    motion: Optional[Literal["zoom_in", "zoom_out", "pan_left", "pan_right", "pan_up", "pan_down"]] = None
+
+class VideoEditRequest(BaseModel):
+    segments: List[SegmentEdit]
+
+class VideoEditResponse(BaseModel):
+    message: str
+    videoId: str
+    changedSegments: List[int]
+
+class VideoTrimRequest(BaseModel):
+    start: float
+    end: Optional[float] = None  # Mặc định tới hết video
+
+class VideoCompileRequest(BaseModel):
+    videoIds: List[str]  # Ít nhất 2 video, theo thứ tự ghép
+    user_id: Optional[str] = None  # Mặc định theo video đầu tiên
 
 class VideoGenerateResponse(BaseModel):
     message: str
@@ -58,6 +89,8 @@ class VideoStatusResponse(BaseModel):
     status: str
     progress: int
     log: str
+    etaSeconds: Optional[int] = None  # Số giây dự đoán còn lại tới khi hoàn thành
+    etaAt: Optional[datetime] = None  # Thời điểm dự kiến hoàn thành (đúng cả khi response được cache)
 
 class VideoDetailResponse(BaseModel):
     videoId: str
@@ -67,15 +100,65 @@ class VideoDetailResponse(BaseModel):
     originUrl: str
     status: str
     duration: int
+    captions: Optional[Dict[str, str]] = None  # URL file phụ đề {"srt", "vtt"}
+    variants: Optional[Dict[str, Dict[str, Any]]] = None  # Bản video theo nền tảng {platform: {aspectRatio, width, height, url}}
+    thumbnailUrl: Optional[str] = None
+    storyboard: Optional[Dict[str, Any]] = None  # Sprite + VTT xem trước khi tua {"vtt", "sprites", ...}
+    derivedAssets: Optional[List[Dict[str, Any]]] = None  # Asset dẫn xuất (eager) của Cloudinary
+    kind: Optional[str] = None  # "trim"/"compilation" với video cắt/ghép từ video khác
     createdAt: datetime
 
 class VideoPreviewResponse(BaseModel):
     url: str = None
     streamUrl: str
+    isDraft: bool = False  # streamUrl là bản nháp độ phân giải thấp, bản đầy đủ chưa xong
 
 class VideoDeleteResponse(BaseModel):
     message: str
 
+class AssetCacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    revalidated: int
+    refreshed: int
+    evictions: int
+    bytesDownloaded: int
+    bytesServed: int
+    hitRatio: float
+    entries: int
+    sizeBytes: int
+    maxBytes: int
+
+class StageEvent(BaseModel):
+    stage: str
+    start: datetime
+    seconds: float
+    ok: bool
+    bytes: Optional[int] = None
+    attempts: Optional[int] = None
+    error: Optional[str] = None
+
+class VideoStagesResponse(BaseModel):
+    videoId: str
+    stages: List[StageEvent]
+
+class StageLatency(BaseModel):
+    count: int
+    failed: int
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    max: Optional[float] = None
+    bytesP50: Optional[int] = None
+
+class StageLatencyResponse(BaseModel):
+    since: datetime
+    until: datetime
+    stages: Dict[str, StageLatency]
+
+class CloudinaryNotificationResponse(BaseModel):
+    message: str
+    videoId: Optional[str] = None
+
 def submit_render(timeline_data):
     """
     Gửi request render video đến Shotstack API
@@ -109,36 +192,110 @@ async def generate_video(request: VideoGenerateRequest):
     try:
         data = request.model_dump()
         return await video_controller.generate_video(data)
+    except PreflightError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e), "errors": e.errors})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """So sánh ETag kiểu weak (bỏ tiền tố W/) với danh sách trong If-None-Match"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+async def _conditional_get(videoId: str, endpoint: str, request: Request, response: Response, build):
+    """
+    Conditional GET theo version của video: trả 304 khi If-None-Match khớp mà không dựng response,
+    ngược lại dựng response và gắn ETag, Cache-Control theo endpoint
+    """
+    version = await video_controller.get_video_version(videoId, endpoint)
+    if_none_match = request.headers.get("if-none-match")
+    if not version["revalidate"] and _etag_matches(if_none_match, version["etag"]):
+        return Response(status_code=304, headers={"ETag": version["etag"], "Cache-Control": version["cacheControl"]})
+
+    body = await build(videoId)
+    if version["revalidate"]:
+        # Bước dựng response có thể đã cập nhật trạng thái từ renderer
+        version = await video_controller.get_video_version(videoId, endpoint)
+        if _etag_matches(if_none_match, version["etag"]):
+            return Response(status_code=304, headers={"ETag": version["etag"], "Cache-Control": version["cacheControl"]})
+    response.headers["ETag"] = version["etag"]
+    response.headers["Cache-Control"] = version["cacheControl"]
+    return body
+
 @router.get("/video/status/{videoId}", response_model=VideoStatusResponse)
-async def get_video_status(videoId: str):
+async def get_video_status(videoId: str, request: Request, response: Response):
     """
     Route kiểm tra trạng thái của video
     """
     try:
-        return await video_controller.get_video_status(videoId)
+        return await _conditional_get(videoId, "status", request, response, video_controller.get_video_status)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/video/preview/{videoId}", response_model=VideoPreviewResponse)
-async def get_video_preview(videoId: str):
+async def get_video_preview(videoId: str, request: Request, response: Response):
     """
     Route lấy URL xem trước video
     """
     try:
-        return await video_controller.get_video_preview(videoId)
+        return await _conditional_get(videoId, "preview", request, response, video_controller.get_video_preview)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.api_route("/video/preview/{videoId}/stream", methods=["GET", "HEAD"])
+async def stream_video_preview(videoId: str, request: Request):
+    """
+    Route phục vụ file video xem trước từ cache của API: hỗ trợ Range (tua), conditional request (304)
+    và Cache-Control để CDN đặt phía trước
+    """
+    try:
+        file_info = await video_controller.get_preview_file(videoId)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return RangeFileResponse(file_info, request.headers, request.method)
 
 @router.get("/video/details/{videoId}", response_model=VideoDetailResponse)
-async def get_video_detail(videoId: str):
+async def get_video_detail(videoId: str, request: Request, response: Response):
     """
     Route lấy thông tin chi tiết của video
     """
     try:
-        return await video_controller.get_video_detail(videoId)
+        return await _conditional_get(videoId, "detail", request, response, video_controller.get_video_detail)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.patch("/video/{videoId}/segments", response_model=VideoEditResponse)
+async def edit_segments(videoId: str, request: VideoEditRequest):
+    """
+    Route sửa segment của video và render lại các phần thay đổi
+    """
+    try:
+        changes = [segment.model_dump(exclude_none=True) for segment in request.segments]
+        return await video_controller.edit_segments(videoId, changes)
+    except PreflightError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e), "errors": e.errors})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/video/compile", response_model=VideoGenerateResponse)
+async def compile_videos(request: VideoCompileRequest):
+    """
+    Route ghép các video đã render thành video mới (stream copy, không render lại)
+    """
+    try:
+        return await video_controller.compile_videos(request.videoIds, request.user_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/video/{videoId}/trim", response_model=VideoGenerateResponse)
+async def trim_video(videoId: str, request: VideoTrimRequest):
+    """
+    Route cắt một đoạn của video đã render thành video mới (stream copy, chỉ encode lại sát điểm cắt)
+    """
+    try:
+        return await video_controller.trim_video(videoId, request.start, request.end)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -150,4 +307,51 @@ async def delete_video(videoId: str):
     try:
         return await video_controller.delete_video(videoId)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/assets/cache/stats", response_model=AssetCacheStatsResponse)
+async def get_asset_cache_stats():
+    """
+    Route lấy số liệu hit/miss của cache asset
+    """
+    try:
+        return await video_controller.get_asset_cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/video/{videoId}/stages", response_model=VideoStagesResponse)
+async def get_video_stages(videoId: str):
+    """
+    Route lấy thời gian từng giai đoạn xử lý của video
+    """
+    try:
+        return await video_controller.get_video_stages(videoId)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/stages/latency", response_model=StageLatencyResponse)
+async def get_stage_latency(since: Optional[datetime] = None, until: Optional[datetime] = None, hours: float = 24):
+    """
+    Route lấy phân vị thời gian (p50/p95) theo giai đoạn trong một khoảng thời gian
+    """
+    try:
+        return await video_controller.get_stage_latency(since, until, hours)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/cloudinary/notification", response_model=CloudinaryNotificationResponse)
+async def cloudinary_notification(
+    request: Request,
+    x_cld_timestamp: Optional[str] = Header(None),
+    x_cld_signature: Optional[str] = Header(None)
+):
+    """
+    Route nhận notification của Cloudinary (eager_notification_url) khi transformation bất đồng bộ hoàn thành
+    """
+    try:
+        body = (await request.body()).decode("utf-8")
+        return await video_controller.handle_cloudinary_notification(body, x_cld_timestamp, x_cld_signature)
+    except PermissionError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
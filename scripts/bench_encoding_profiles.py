@@ -0,0 +1,151 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+# Lấy đường dẫn thư mục gốc của project
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import cv2
+import numpy as np
+from config.render_config import ENCODING_PROFILES
+from service.ffmpeg_service import FFmpegService
+
+# Bộ fixture cố định: nguồn lavfi của ffmpeg (tất định) và một đoạn ảnh tĩnh giống video slideshow của service
+LAVFI_FIXTURES = {
+    "motion": "testsrc2=size={width}x{height}:rate={fps}",
+    "detail": "mandelbrot=size={width}x{height}:rate={fps}",
+}
+
+
+def make_frame(width: int, height: int, seed: int) -> np.ndarray:
+    """Tạo frame gradient có nhiễu nhẹ, gần với ảnh thật hơn ảnh một màu"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None, None]
+    frame = (x * rng.random(3) + y * rng.random(3)) / 2 + rng.normal(0, 8, (height, width, 3))
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def build_fixtures(ffmpeg: FFmpegService, work_dir: str, width: int, height: int, fps: int,
+                   duration: float) -> dict:
+    """Tạo các video tham chiếu không mất dữ liệu (qp 0) kèm audio sine, dùng làm nguồn và chuẩn so sánh"""
+    fixtures = {}
+    audio = ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}"]
+    lossless = ["-c:v", "libx264", "-preset", "ultrafast", "-qp", "0", "-pix_fmt", "yuv420p",
+                "-c:a", "pcm_s16le", "-shortest"]
+    for name, source in LAVFI_FIXTURES.items():
+        path = os.path.join(work_dir, f"{name}.nut")
+        ffmpeg.run(["-f", "lavfi", "-i", source.format(width=width, height=height, fps=fps), *audio,
+                    "-t", str(duration), *lossless, path])
+        fixtures[name] = path
+
+    image_path = os.path.join(work_dir, "still.png")
+    cv2.imwrite(image_path, make_frame(width, height, 1))
+    path = os.path.join(work_dir, "still.nut")
+    ffmpeg.run(["-loop", "1", "-framerate", str(fps), "-i", image_path, *audio,
+                "-t", str(duration), *lossless, path])
+    fixtures["still"] = path
+    return fixtures
+
+
+def measure_quality(ffmpeg: FFmpegService, encoded_path: str, reference_path: str) -> tuple:
+    """SSIM (All) và PSNR trung bình của video đã encode so với video tham chiếu"""
+    result = subprocess.run(
+        [ffmpeg.binary, "-hide_banner", "-i", encoded_path, "-i", reference_path,
+         "-lavfi", "[0:v]setpts=PTS-STARTPTS,split[a1][a2];[1:v]setpts=PTS-STARTPTS,split[b1][b2];"
+                   "[a1][b1]ssim;[a2][b2]psnr",
+         "-f", "null", "-"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    log = result.stderr.decode("utf-8", errors="ignore")
+    ssim = re.search(r"SSIM .*All:([\d.]+)", log)
+    psnr = re.search(r"PSNR .*average:([\d.]+|inf)", log)
+    return float(ssim.group(1)) if ssim else float("nan"), float(psnr.group(1)) if psnr else float("nan")
+
+
+def bench(width: int, height: int, fps: int, duration: float, profiles: list, min_ssim: float, output: str):
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fixtures = build_fixtures(FFmpegService(), temp_dir, width, height, fps, duration)
+
+        print(f"Fixture {duration:g} giây ở {width}x{height}, {fps} fps")
+        print(f"{'profile':<10}{'fixture':<10}{'encode s':>10}{'size KB':>10}{'kbps':>10}{'SSIM':>9}{'PSNR dB':>9}")
+        for profile in profiles:
+            ffmpeg = FFmpegService(profile=profile)
+            for name, reference in fixtures.items():
+                output_path = os.path.join(temp_dir, f"{profile}_{name}.mp4")
+                start = time.perf_counter()
+                # Cùng tham số codec với renderer local, GOP bị giới hạn theo gopSeconds của profile
+                ffmpeg.run([
+                    "-i", reference,
+                    *ffmpeg.video_codec_args(width, height, fps, gop=fps * 10),
+                    "-c:a", "aac", "-b:a", ffmpeg.audio_bitrate,
+                    "-movflags", "+faststart",
+                    output_path,
+                ])
+                encode_seconds = time.perf_counter() - start
+                size = os.path.getsize(output_path)
+                ssim, psnr = measure_quality(ffmpeg, output_path, reference)
+                results.append({
+                    "profile": profile,
+                    "fixture": name,
+                    "encodeSeconds": round(encode_seconds, 3),
+                    "bytes": size,
+                    "kbps": round(size * 8 / duration / 1000, 1),
+                    "ssim": ssim,
+                    "psnr": psnr,
+                })
+                print(f"{profile:<10}{name:<10}{encode_seconds:>10.2f}{size / 1024:>10.0f}"
+                      f"{size * 8 / duration / 1000:>10.0f}{ssim:>9.4f}{psnr:>9.2f}")
+
+    # Profile rẻ nhất (thời gian encode, rồi dung lượng) mà mọi fixture đều đạt ngưỡng SSIM
+    summary = []
+    for profile in profiles:
+        rows = [row for row in results if row["profile"] == profile]
+        summary.append({
+            "profile": profile,
+            "encodeSeconds": round(sum(row["encodeSeconds"] for row in rows), 3),
+            "bytes": sum(row["bytes"] for row in rows),
+            "minSsim": min(row["ssim"] for row in rows),
+        })
+    passing = sorted((row for row in summary if row["minSsim"] >= min_ssim),
+                     key=lambda row: (row["encodeSeconds"], row["bytes"]))
+    if passing:
+        print(f"\nProfile rẻ nhất đạt SSIM >= {min_ssim}: {passing[0]['profile']}")
+    else:
+        print(f"\nKhông có profile nào đạt SSIM >= {min_ssim}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({
+                "fixture": {"width": width, "height": height, "fps": fps, "duration": duration},
+                "minSsim": min_ssim,
+                "results": results,
+                "summary": summary,
+                "recommended": passing[0]["profile"] if passing else None,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi kết quả vào {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark thời gian encode, dung lượng và chất lượng của từng profile encode")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--profiles", default=",".join(ENCODING_PROFILES), help="Danh sách profile, cách nhau bởi dấu phẩy")
+    parser.add_argument("--min-ssim", type=float, default=0.95, help="Ngưỡng chất lượng để chọn profile")
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+    bench(args.width, args.height, args.fps, args.duration, args.profiles.split(","), args.min_ssim, args.output)
+
+
+if __name__ == "__main__":
+    main()
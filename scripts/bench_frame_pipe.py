@@ -0,0 +1,109 @@
+import sys
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+# Lấy đường dẫn thư mục gốc của project
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import numpy as np
+from config.render_config import FFMPEG_BINARY
+from service.ffmpeg_service import RawVideoWriter
+from service.frame_pipe import stream_frames
+from service.ken_burns_effect import KenBurnsEffect
+
+
+def null_sink(width: int, height: int, fps: int) -> RawVideoWriter:
+    """ffmpeg chỉ đọc frame raw rồi bỏ đi, để đo riêng chi phí sinh và đẩy frame"""
+    return RawVideoWriter([
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps),
+        "-i", "pipe:0", "-f", "null", "-",
+    ])
+
+
+class AllocationCounter:
+    """
+    Bọc writer, mỗi lần ghi frame cộng dồn lượng bộ nhớ cấp phát tạm thời (đỉnh tracemalloc)
+    kể từ lần ghi trước, để ra số byte cấp phát trên mỗi frame
+    """
+
+    def __init__(self, writer: RawVideoWriter):
+        self.writer = writer
+        self.allocated = 0
+        self.frames = 0
+        self._base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def write(self, frame) -> None:
+        self.allocated += max(tracemalloc.get_traced_memory()[1] - self._base, 0)
+        self.writer.write(frame)
+        self.frames += 1
+        # bytes truyền vào là bản sao tạm, sẽ được giải phóng ngay sau lần ghi này
+        temporary = len(frame) if isinstance(frame, (bytes, bytearray)) else 0
+        self._base = tracemalloc.get_traced_memory()[0] - temporary
+        tracemalloc.reset_peak()
+
+
+def naive_frame(render_frame, index, width, height) -> bytes:
+    """Giống moviepy: mỗi frame một mảng mới, rồi tobytes() tạo thêm một bản sao trước khi ghi vào pipe"""
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    render_frame(index, frame)
+    return frame.tobytes()
+
+
+def run_naive(render_frame, num_frames, width, height, writer):
+    for index in range(num_frames):
+        writer.write(naive_frame(render_frame, index, width, height))
+
+
+def measure(label, run, num_frames, width, height, fps):
+    frame_bytes = width * height * 3
+    writer = null_sink(width, height, fps)
+
+    tracemalloc.start()
+    counter = AllocationCounter(writer)
+    start = time.perf_counter()
+    run(counter)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    writer.close()
+
+    print(f"{label:<26}{num_frames / elapsed:>10.1f}{elapsed / num_frames * 1000:>12.2f}"
+          f"{frame_bytes * num_frames / elapsed / 1e9:>12.2f}"
+          f"{counter.allocated / counter.frames / 1e6:>14.2f}{counter.allocated / counter.frames / frame_bytes:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipe frame raw từ renderer sang ffmpeg")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=90)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (args.height // 4, args.width // 4, 3), dtype=np.uint8)
+    render_frame = KenBurnsEffect("zoom_in").frame_source(image, args.frames, args.width, args.height)
+
+    print(f"{args.frames} frame Ken Burns {args.width}x{args.height}")
+    print(f"{'mode':<26}{'fps':>10}{'ms/frame':>12}{'GB/s pipe':>12}{'MB alloc/frm':>14}{'frame allocs':>14}")
+    measure("naive (new + tobytes)",
+            lambda writer: run_naive(render_frame, args.frames, args.width, args.height, writer),
+            args.frames, args.width, args.height, args.fps)
+    measure("ring (preallocated)",
+            lambda writer: stream_frames(render_frame, args.frames, args.width, args.height, writer),
+            args.frames, args.width, args.height, args.fps)
+    measure(f"shared ring, {args.workers} workers",
+            lambda writer: stream_frames(render_frame, args.frames, args.width, args.height, writer,
+                                         workers=args.workers),
+            args.frames, args.width, args.height, args.fps)
+    print("MB alloc/frm: bộ nhớ cấp phát mới trung bình mỗi frame ở tiến trình cha")
+    print("frame allocs: số buffer cỡ một frame được cấp phát mỗi frame (ring chỉ cấp phát các slot một lần lúc đầu)")
+
+
+if __name__ == "__main__":
+    main()
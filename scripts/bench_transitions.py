@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+# Lấy đường dẫn thư mục gốc của project
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import numpy as np
+from service.vid_transition_func import ANIMATIONS, iter_transition_chunks, write_transition
+
+
+def make_frame(width: int, height: int, seed: int) -> np.ndarray:
+    """Tạo frame gradient có nhiễu nhẹ, gần với ảnh thật hơn ảnh một màu"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None, None]
+    frame = (x * rng.random(3) + y * rng.random(3)) / 2 + rng.normal(0, 8, (height, width, 3))
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def bench(width: int, height: int, num_frames: int, repeat: int, encode: bool):
+    frame_a = make_frame(width, height, 1)
+    frame_b = make_frame(width, height, 2)
+    buffer = np.empty((8, height, width, 3), dtype=np.uint8)
+
+    print(f"Transition {num_frames} frame ở {width}x{height}, lặp {repeat} lần")
+    print(f"{'animation':<22}{'compute fps':>14}{'encode fps':>14}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for animation in ANIMATIONS:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for _chunk in iter_transition_chunks(frame_a, frame_b, animation, num_frames, buffer=buffer):
+                    pass
+            compute_fps = num_frames * repeat / (time.perf_counter() - start)
+
+            encode_fps = float("nan")
+            if encode:
+                start = time.perf_counter()
+                write_transition(frame_a, frame_b, os.path.join(temp_dir, f"{animation}.mp4"),
+                                 animation, num_frames)
+                encode_fps = num_frames / (time.perf_counter() - start)
+
+            print(f"{animation:<22}{compute_fps:>14.1f}{encode_fps:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark số frame/giây của từng kiểu transition")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-encode", action="store_true", help="Chỉ đo phần tính frame, bỏ qua encode")
+    args = parser.parse_args()
+    bench(args.width, args.height, args.frames, args.repeat, not args.no_encode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+from pathlib import Path
+
+# Lấy đường dẫn thư mục gốc của project
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from service.message_service import MessageService
+from service.chunk_render_service import ChunkRenderCoordinator
+
+def main():
+    try:
+        # Khởi tạo message service và coordinator (dùng để render chunk)
+        message_service = MessageService()
+        coordinator = ChunkRenderCoordinator()
+
+        # Kết nối đến RabbitMQ
+        message_service.connect()
+
+        # Bắt đầu nhận chunk cần render
+        print("Bắt đầu chunk worker...")
+        message_service.consume_chunks(coordinator.render_chunk)
+
+    except KeyboardInterrupt:
+        print("\nĐang dừng chunk worker...")
+        message_service.close()
+        sys.exit(0)
+    except Exception as e:
+        print(f"Lỗi: {str(e)}")
+        message_service.close()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
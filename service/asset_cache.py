@@ -0,0 +1,290 @@
+import os
+import re
+import json
+import time
+import socket
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+import requests
+from config.render_config import ASSET_CACHE_DIR, ASSET_CACHE_MAX_BYTES, ASSET_CACHE_TTL
+
+# Asset có Cache-Control immutable được coi là còn mới trong 1 năm
+IMMUTABLE_TTL = 365 * 86400
+
+
+class AssetCache:
+    """
+    Cache asset từ URL trên đĩa, dùng chung cho mọi tiến trình trỏ tới cùng thư mục.
+    Mỗi URL được lưu kèm ETag/Last-Modified; khi hết hạn, asset được kiểm tra lại bằng conditional GET
+    (304 thì dùng tiếp file cũ). File được ghi vào file tạm rồi đổi tên nguyên tử nên các worker
+    chạy song song không đọc phải file ghi dở. Tổng dung lượng bị giới hạn, asset lâu không dùng bị xóa trước (LRU).
+    Mỗi thư mục cache chỉ có một instance trong tiến trình để gom số liệu hit/miss.
+    """
+
+    _instances: Dict[str, "AssetCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __new__(cls, cache_dir: str = ASSET_CACHE_DIR, max_bytes: int = ASSET_CACHE_MAX_BYTES,
+                ttl: int = ASSET_CACHE_TTL):
+        key = os.path.abspath(cache_dir)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                instance = super(AssetCache, cls).__new__(cls)
+                instance._init(key, max_bytes, ttl)
+                cls._instances[key] = instance
+            return cls._instances[key]
+
+    def _init(self, cache_dir: str, max_bytes: int, ttl: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        # Khóa theo URL (chia theo hash) để các thread cùng tải một URL chỉ tải một lần
+        self._url_locks = [threading.Lock() for _ in range(64)]
+        self._total_bytes: Optional[int] = None
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "refreshed": 0,
+            "evictions": 0,
+            "bytesDownloaded": 0,
+            "bytesServed": 0,
+        }
+        self._flushed_at = 0.0
+        os.makedirs(os.path.join(self.cache_dir, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(self.cache_dir, "stats"), exist_ok=True)
+
+    def _paths(self, url: str):
+        """Đường dẫn file dữ liệu và file metadata của một URL"""
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        extension = os.path.splitext(url.split("?")[0].split("#")[0])[1][:8]
+        directory = os.path.join(self.cache_dir, "objects", digest[:2])
+        return os.path.join(directory, digest + extension), os.path.join(directory, f"{digest}-meta.json")
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+            flush = time.time() - self._flushed_at > 5
+        if flush:
+            self._flush_counters()
+
+    def _flush_counters(self) -> None:
+        """Ghi số liệu của tiến trình ra file riêng để stats() gộp được số liệu của mọi worker"""
+        with self._lock:
+            counters = dict(self._counters)
+            self._flushed_at = time.time()
+        path = os.path.join(self.cache_dir, "stats", f"{socket.gethostname()}-{os.getpid()}.json")
+        try:
+            self._write_json(path, counters)
+        except OSError:
+            pass
+
+    def get(self, url: str) -> str:
+        """
+        Trả về đường dẫn local của asset, tải hoặc kiểm tra lại với server khi cần
+        Args:
+            url: URL http(s) của asset
+        Returns:
+            Đường dẫn file trong cache
+        """
+        try:
+            data_path, meta_path = self._paths(url)
+            with self._url_locks[int(os.path.basename(meta_path)[:8], 16) % len(self._url_locks)]:
+                meta = self._read_json(meta_path)
+                if meta and os.path.exists(data_path):
+                    if time.time() < meta.get("freshUntil", 0):
+                        return self._hit(data_path, meta)
+                    return self._revalidate(url, data_path, meta_path, meta)
+
+                self._count("misses")
+                return self._download(url, data_path, meta_path)
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi tải asset {url}: {str(e)}")
+
+    def metadata(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Metadata của asset đã có trong cache (etag, lastModified, contentType, size, fetchedAt của lần tải)
+        Returns:
+            Dict metadata hoặc None nếu URL chưa có trong cache
+        """
+        return self._read_json(self._paths(url)[1])
+
+    def _hit(self, data_path: str, meta: Dict[str, Any]) -> str:
+        self._count("hits")
+        self._count("bytesServed", meta.get("size", 0))
+        # mtime của file dữ liệu là thời điểm dùng cuối, dùng cho LRU
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+        return data_path
+
+    def _revalidate(self, url: str, data_path: str, meta_path: str, meta: Dict[str, Any]) -> str:
+        """Conditional GET, 304 thì gia hạn entry hiện có, 200 thì ghi đè nội dung mới"""
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("lastModified"):
+            headers["If-Modified-Since"] = meta["lastModified"]
+        if not headers:
+            self._count("misses")
+            return self._download(url, data_path, meta_path)
+
+        response = self.session.get(url, headers=headers, stream=True, timeout=60)
+        if response.status_code == 304:
+            response.close()
+            meta["freshUntil"] = time.time() + self._max_age(response.headers, meta.get("maxAge", self.ttl))
+            self._write_json(meta_path, meta)
+            self._count("revalidated")
+            return self._hit(data_path, meta)
+
+        self._count("refreshed")
+        return self._download(url, data_path, meta_path, response)
+
+    def _download(self, url: str, data_path: str, meta_path: str,
+                  response: Optional[requests.Response] = None) -> str:
+        if response is None:
+            response = self.session.get(url, stream=True, timeout=60)
+        if response.status_code != 200:
+            response.close()
+            raise Exception(f"HTTP {response.status_code}")
+
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        suffix = f".{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_path = data_path + suffix
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    if chunk:
+                        f.write(chunk)
+                        size += len(chunk)
+            previous_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+            os.replace(tmp_path, data_path)
+        finally:
+            response.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        max_age = self._max_age(response.headers, self.ttl)
+        self._write_json(meta_path, {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "lastModified": response.headers.get("Last-Modified"),
+            "contentType": response.headers.get("Content-Type"),
+            "size": size,
+            "maxAge": max_age,
+            "freshUntil": time.time() + max_age,
+            "fetchedAt": time.time(),
+        })
+        self._count("bytesDownloaded", size)
+        self._count("bytesServed", size)
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += size - previous_size
+        if self._usage() > self.max_bytes:
+            self.evict(keep=data_path)
+        return data_path
+
+    def _max_age(self, headers, default: int) -> int:
+        """Thời gian còn mới của asset theo Cache-Control của response"""
+        cache_control = headers.get("Cache-Control", "").lower()
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            return 0
+        if "immutable" in cache_control:
+            return IMMUTABLE_TTL
+        match = re.search(r"max-age=(\d+)", cache_control)
+        return int(match.group(1)) if match else default
+
+    def _read_json(self, meta_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, meta_path: str, meta: Dict[str, Any]) -> None:
+        tmp_path = f"{meta_path}.{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _entries(self):
+        """Các file dữ liệu trong cache: (đường dẫn, kích thước, thời điểm dùng cuối)"""
+        for root, _, files in os.walk(os.path.join(self.cache_dir, "objects")):
+            for name in files:
+                if name.endswith((".tmp", "-meta.json")):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _usage(self) -> int:
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            return self._total_bytes
+
+    def evict(self, target_ratio: float = 0.9, keep: Optional[str] = None) -> int:
+        """
+        Xóa các asset dùng cũ nhất cho tới khi tổng dung lượng còn target_ratio * max_bytes
+        (quét lại thư mục vì các tiến trình khác cũng ghi vào cache)
+        Args:
+            target_ratio: Tỷ lệ dung lượng còn lại so với max_bytes
+            keep: Asset không được xóa (asset vừa tải, sắp được dùng)
+        Returns:
+            Số asset đã xóa
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * target_ratio
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                os.remove(os.path.join(os.path.dirname(path), os.path.basename(path).split(".")[0] + "-meta.json"))
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._total_bytes = total
+            self._counters["evictions"] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Số liệu hit/miss gộp từ mọi tiến trình dùng thư mục cache này và dung lượng đang dùng"""
+        self._flush_counters()
+        counters = {name: 0 for name in self._counters}
+        stats_dir = os.path.join(self.cache_dir, "stats")
+        for name in os.listdir(stats_dir):
+            if not name.endswith(".json"):
+                continue
+            for counter, value in (self._read_json(os.path.join(stats_dir, name)) or {}).items():
+                if counter in counters:
+                    counters[counter] += value
+
+        lookups = counters["hits"] + counters["misses"] + counters["refreshed"]
+        entries = list(self._entries())
+        with self._lock:
+            self._total_bytes = sum(size for _, size, _ in entries)
+        return {
+            **counters,
+            "hitRatio": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(entries),
+            "sizeBytes": self._total_bytes,
+            "maxBytes": self.max_bytes,
+        }
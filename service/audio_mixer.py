@@ -0,0 +1,295 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+import numpy as np
+from config.cloudinary import CloudinaryConfig
+from config.render_config import (
+    AUDIO_MIX_DIR,
+    AUDIO_MIX_TARGET_LUFS,
+    AUDIO_MIX_BACKGROUND_VOLUME,
+    AUDIO_MIX_DUCKING_DB,
+)
+from service.ffmpeg_service import FFmpegService
+from service.asset_cache import AssetCache
+
+# Tăng khi thay đổi thuật toán mix để cache cũ không còn được dùng
+MIX_VERSION = 1
+
+SAMPLE_RATE = 48000
+
+# Bộ lọc K-weighting của ITU-R BS.1770 tại 48 kHz (shelf + high-pass), dạng (b, a)
+K_WEIGHTING = [
+    ([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585]),
+    ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621]),
+]
+
+# Ngưỡng phát hiện giọng nói (dBFS) và thời gian attack/release của ducking (giây)
+SPEECH_THRESHOLD_DB = -45.0
+DUCK_ATTACK = 0.05
+DUCK_RELEASE = 0.3
+
+# Ngưỡng bắt đầu nén đỉnh sau khi chuẩn hóa loudness (-1 dBFS)
+PEAK_CEILING = 10 ** (-1 / 20)
+
+
+def _k_weighting_power(size: int, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """|H|^2 của bộ lọc K-weighting tại các bin của rfft độ dài size"""
+    z = np.exp(-1j * 2 * np.pi * np.fft.rfftfreq(size, 1 / sample_rate) / sample_rate)
+    response = np.ones_like(z)
+    for b, a in K_WEIGHTING:
+        response *= np.polyval(b[::-1], z) / np.polyval(a[::-1], z)
+    return np.abs(response) ** 2
+
+
+def integrated_loudness(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, batch: int = 256) -> float:
+    """
+    Loudness tích hợp (LUFS) theo BS.1770: năng lượng K-weighted trên block 400 ms chồng 75%,
+    gate tuyệt đối -70 LUFS và gate tương đối -10 LU.
+    K-weighting được áp trong miền tần số trên từng block con 100 ms (rfft theo lô).
+    Args:
+        samples: Mảng (N, 2) float32
+        sample_rate: Sample rate
+        batch: Số block con xử lý mỗi lô (giới hạn bộ nhớ)
+    Returns:
+        Loudness (LUFS), -inf nếu im lặng
+    """
+    step = sample_rate // 10
+    count = len(samples) // step
+    if count < 4:
+        return float("-inf")
+    weights = _k_weighting_power(step, sample_rate)
+    blocks = samples[:count * step].reshape(count, step, 2)
+
+    energy = np.empty(count, dtype=np.float64)
+    for start in range(0, count, batch):
+        spectrum = np.fft.rfft(blocks[start:start + batch], axis=1)
+        power = (np.abs(spectrum) ** 2) * weights[None, :, None]
+        # Parseval: năng lượng trung bình mỗi mẫu, cộng 2 kênh (trọng số 1.0 cho L/R)
+        energy[start:start + batch] = (2 * power.sum(axis=1) - power[:, 0] - power[:, -1]).sum(axis=1) / step ** 2
+
+    # Block 400 ms = trung bình 4 block con liên tiếp (bước 100 ms)
+    cumulative = np.concatenate(([0.0], np.cumsum(energy)))
+    z = (cumulative[4:] - cumulative[:-4]) / 4
+    loudness = -0.691 + 10 * np.log10(np.maximum(z, 1e-12))
+    gated = z[loudness > -70]
+    if not len(gated):
+        return float("-inf")
+    relative = -0.691 + 10 * np.log10(gated.mean()) - 10
+    gated = z[(loudness > -70) & (loudness > relative)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def ducking_gain(voice: np.ndarray, ducking_db: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Hệ số nhân của nhạc nền theo từng mẫu: giảm ducking_db khi có giọng nói, tăng/giảm mượt theo attack/release
+    Args:
+        voice: Track voice-over (N, 2)
+        ducking_db: Mức giảm (dB) khi có giọng nói
+    Returns:
+        Mảng (N,) float32
+    """
+    block = sample_rate // 100
+    count = -(-len(voice) // block)
+    padded = np.zeros((count * block, 2), dtype=np.float32)
+    padded[:len(voice)] = voice
+    power = np.square(padded).reshape(count, block * 2).mean(axis=1)
+    speech = (10 * np.log10(power + 1e-12) > SPEECH_THRESHOLD_DB).astype(np.float32)
+
+    # Giữ trạng thái duck thêm DUCK_RELEASE sau khi giọng nói dừng và bắt đầu sớm DUCK_ATTACK
+    attack = max(int(DUCK_ATTACK * 100), 1)
+    release = max(int(DUCK_RELEASE * 100), 1)
+    held = np.convolve(speech, np.ones(attack + release + 1, dtype=np.float32), mode="full")
+    held = (held[attack:attack + count] > 0).astype(np.float32)
+    # Làm mượt chuyển trạng thái bằng trung bình trượt độ dài attack
+    smooth = np.convolve(held, np.ones(attack, dtype=np.float32) / attack, mode="same")
+
+    gain = 10 ** (-ducking_db * smooth / 20)
+    centers = (np.arange(count) + 0.5) * block
+    return np.interp(np.arange(len(voice)), centers, gain).astype(np.float32)
+
+
+def soft_limit(samples: np.ndarray, ceiling: float = PEAK_CEILING) -> np.ndarray:
+    """Nén mềm (tanh) phần biên độ vượt ceiling, không đổi phần dưới ngưỡng (thực hiện tại chỗ)"""
+    threshold = ceiling * 0.9
+    magnitude = np.abs(samples)
+    over = magnitude > threshold
+    if over.any():
+        headroom = 1.0 - threshold
+        limited = threshold + headroom * np.tanh((magnitude[over] - threshold) / headroom)
+        samples[over] = np.sign(samples[over]) * limited * ceiling
+    return samples
+
+
+class AudioMixer:
+    """
+    Mix sẵn voice-over của các segment và nhạc nền thành một track duy nhất.
+    Mỗi voice-over được đặt đúng vị trí của segment trên timeline (cắt theo duration của segment),
+    nhạc nền được lặp/cắt theo tổng thời lượng và tự giảm âm lượng khi có giọng nói (ducking),
+    sau đó cả track được chuẩn hóa loudness (BS.1770) về một mức chung.
+    Mọi phép tính trên mẫu âm thanh là phép toán NumPy trên mảng cấp phát sẵn.
+    Kết quả được cache theo hash nội dung các file đầu vào, duration và tham số mix.
+    """
+
+    def __init__(self, cache_dir: str = AUDIO_MIX_DIR, target_lufs: float = AUDIO_MIX_TARGET_LUFS,
+                 background_volume: float = AUDIO_MIX_BACKGROUND_VOLUME, ducking_db: float = AUDIO_MIX_DUCKING_DB,
+                 assets: Optional[AssetCache] = None, max_workers: int = 4, folder: str = "audio_mixes"):
+        self.cache_dir = cache_dir
+        self.target_lufs = target_lufs
+        self.background_volume = background_volume
+        self.ducking_db = ducking_db
+        self.assets = assets or AssetCache()
+        self.max_workers = max_workers
+        self.folder = folder
+        self.ffmpeg = FFmpegService()
+        self._locks = [threading.Lock() for _ in range(16)]
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def localize(self, source: str) -> str:
+        """Đường dẫn local của audio (tải qua cache nếu là URL)"""
+        if source.startswith(("http://", "https://")):
+            return self.assets.get(source)
+        return source
+
+    def _file_hash(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def cache_key(self, audio_paths: List[str], durations: List[float], background_path: Optional[str]) -> str:
+        """Hash nội dung các file audio, duration từng segment và tham số mix"""
+        digest = hashlib.sha256()
+        for path, duration in zip(audio_paths, durations):
+            digest.update(f"{self._file_hash(path)}:{duration:.3f};".encode("utf-8"))
+        if background_path:
+            digest.update(f"bg:{self._file_hash(background_path)};".encode("utf-8"))
+        digest.update(
+            f"{self.target_lufs}:{self.background_volume}:{self.ducking_db}:v{MIX_VERSION}".encode("utf-8")
+        )
+        return digest.hexdigest()
+
+    def _paths(self, key: str):
+        directory = os.path.join(self.cache_dir, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{key}.m4a"), os.path.join(directory, f"{key}-meta.json")
+
+    def _read_meta(self, meta_path: str) -> Dict[str, Any]:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, meta_path: str, meta: Dict[str, Any]) -> None:
+        tmp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def mix(self, segments: List[Dict[str, Any]], background_music: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Mix voice-over và nhạc nền thành một file audio (dùng cache nếu đã mix)
+        Args:
+            segments: Danh sách segment, mỗi segment có "audio" và "duration"
+            background_music: URL/đường dẫn nhạc nền (nếu có)
+        Returns:
+            Dict gồm "key", "path" (file .m4a), "duration", "loudness" (trước chuẩn hóa) và "gain" (dB)
+        """
+        try:
+            durations = [float(segment["duration"]) for segment in segments]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                audio_paths = list(executor.map(self.localize, [segment["audio"] for segment in segments]))
+            background_path = self.localize(background_music) if background_music else None
+
+            key = self.cache_key(audio_paths, durations, background_path)
+            output_path, meta_path = self._paths(key)
+            with self._locks[int(key[:4], 16) % len(self._locks)]:
+                meta = self._read_meta(meta_path)
+                if meta and os.path.exists(output_path):
+                    return {**meta, "key": key, "path": output_path}
+
+                meta = self._render(audio_paths, durations, background_path, output_path)
+                self._write_meta(meta_path, meta)
+            return {**meta, "key": key, "path": output_path}
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi mix audio: {str(e)}")
+
+    def _render(self, audio_paths: List[str], durations: List[float], background_path: Optional[str],
+                output_path: str) -> Dict[str, Any]:
+        lengths = [int(round(duration * SAMPLE_RATE)) for duration in durations]
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        total = int(offsets[-1])
+
+        # Decode song song, mỗi voice-over chỉ decode tới hết duration của segment
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            clips = list(executor.map(
+                lambda item: self.ffmpeg.decode_audio(item[0], SAMPLE_RATE, item[1]),
+                zip(audio_paths, durations)
+            ))
+            background = (
+                executor.submit(self.ffmpeg.decode_audio, background_path, SAMPLE_RATE, total / SAMPLE_RATE)
+                if background_path else None
+            )
+            background = background.result() if background else None
+
+        mix = np.zeros((total, 2), dtype=np.float32)
+        for clip, offset, length in zip(clips, offsets, lengths):
+            count = min(len(clip), length)
+            mix[offset:offset + count] = clip[:count]
+
+        if background is not None and len(background):
+            gain = ducking_gain(mix, self.ducking_db) * np.float32(self.background_volume)
+            # Lặp nhạc nền cho đủ tổng thời lượng (np.resize lặp lại dữ liệu)
+            looped = background if len(background) >= total else np.resize(background, (total, 2))
+            looped = looped[:total] * gain[:, None]
+            mix += looped
+
+        loudness = integrated_loudness(mix)
+        gain_db = self.target_lufs - loudness if np.isfinite(loudness) else 0.0
+        mix *= np.float32(10 ** (gain_db / 20))
+        soft_limit(mix)
+
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp.m4a"
+        try:
+            self.ffmpeg.encode_audio(mix, SAMPLE_RATE, tmp_path)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return {
+            "duration": total / SAMPLE_RATE,
+            "loudness": round(loudness, 2) if np.isfinite(loudness) else None,
+            "gain": round(gain_db, 2),
+        }
+
+    async def premix_url(self, data: Dict[str, Any]) -> str:
+        """
+        Mix audio của video và upload lên Cloudinary để dùng làm clip audio duy nhất trên timeline
+        Args:
+            data: Dữ liệu tạo video (segments, backgroundMusic)
+        Returns:
+            URL file audio đã mix
+        """
+        result = await asyncio.to_thread(self.mix, data["segments"], data.get("backgroundMusic"))
+        _, meta_path = self._paths(result["key"])
+        if result.get("url"):
+            return result["url"]
+
+        upload = await asyncio.to_thread(
+            CloudinaryConfig().upload_file,
+            result["path"],
+            folder=self.folder,
+            resource_type="video",
+            public_id=result["key"],
+        )
+        meta = {field: result[field] for field in ("duration", "loudness", "gain")}
+        meta["url"] = upload["secure_url"]
+        await asyncio.to_thread(self._write_meta, meta_path, meta)
+        return meta["url"]
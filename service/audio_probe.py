@@ -0,0 +1,392 @@
+import os
+import re
+import math
+import struct
+import asyncio
+import hashlib
+import threading
+import subprocess
+from typing import Dict, Any, List, Optional, Callable
+import requests
+from cachetools import LRUCache, TTLCache
+from dotenv import load_dotenv
+from config.render_config import FFMPEG_BINARY
+from service.asset_cache import AssetCache
+from service.preflight_service import PreflightError
+
+load_dotenv()
+
+# Cách xác định duration của segment: "client" (giữ nguyên), "check" (báo lỗi nếu lệch audio), "audio" (lấy theo audio).
+# Mặc định giữ nguyên duration client gửi, đặt theo audio chỉ khi request (hoặc biến môi trường) chọn "audio"
+DURATION_MODE = os.getenv("DURATION_MODE", "client")
+# Độ lệch tối đa (giây) giữa duration của segment và audio ở chế độ "check"
+DURATION_TOLERANCE = float(os.getenv("DURATION_TOLERANCE", "0.25"))
+
+# Số byte đầu file đọc để phân tích header
+HEAD_BYTES = 64 * 1024
+
+# Bảng bitrate (kbps) của MPEG audio theo (MPEG1?, layer)
+MPEG_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MPEG_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+
+
+class ByteSource:
+    """Đọc một khoảng byte của file local hoặc URL (GET có Range), phần đầu file được giữ lại"""
+
+    def __init__(self, source: str, session: Optional[requests.Session] = None, head_bytes: int = HEAD_BYTES):
+        self.source = source
+        self.session = session or requests.Session()
+        self.remote = source.startswith(("http://", "https://"))
+        self.etag = None
+        if self.remote:
+            self.head, self.size = self._fetch_head(head_bytes)
+        else:
+            self.size = os.path.getsize(source)
+            with open(source, "rb") as f:
+                self.head = f.read(head_bytes)
+
+    def _fetch_head(self, length: int):
+        response = self.session.get(self.source, headers={"Range": f"bytes=0-{length - 1}"},
+                                    stream=True, timeout=15)
+        try:
+            if response.status_code not in (200, 206):
+                raise Exception(f"HTTP {response.status_code}")
+            self.etag = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            size = None
+            match = re.search(r"/(\d+)$", response.headers.get("Content-Range", ""))
+            if match:
+                size = int(match.group(1))
+            elif response.headers.get("Content-Length"):
+                size = int(response.headers["Content-Length"])
+            head = b""
+            for chunk in response.iter_content(chunk_size=length):
+                head += chunk
+                if len(head) >= length:
+                    break
+            return head[:length], size
+        finally:
+            response.close()
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Đọc length byte từ offset (dùng phần đầu đã có nếu đủ)"""
+        if offset + length <= len(self.head):
+            return self.head[offset:offset + length]
+        if not self.remote:
+            with open(self.source, "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+        response = self.session.get(self.source, headers={"Range": f"bytes={offset}-{offset + length - 1}"},
+                                    timeout=15)
+        if response.status_code != 206:
+            raise Exception(f"Server không hỗ trợ Range (HTTP {response.status_code})")
+        return response.content
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash nội dung rút gọn: phần đầu file, dung lượng và ETag"""
+        digest = hashlib.sha1(self.head)
+        digest.update(f"{self.size}:{self.etag}".encode("utf-8"))
+        return digest.hexdigest()
+
+
+def _skip_id3(head: bytes) -> int:
+    """Vị trí sau tag ID3v2 (nếu có)"""
+    if head[:3] != b"ID3" or len(head) < 10:
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    return 10 + size + (10 if head[5] & 0x10 else 0)
+
+
+def _mpeg_frame(data: bytes, offset: int) -> Optional[Dict[str, Any]]:
+    """Phân tích header frame MPEG audio tại offset"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = MPEG_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {
+        "mpeg1": mpeg1,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "samples": samples,
+        "length": length,
+        "mono": (b3 >> 6) == 3,
+    }
+
+
+def mp3_duration(source: ByteSource) -> Optional[float]:
+    """
+    Thời lượng MP3 từ header: frame Xing/Info hoặc VBRI nếu có (VBR), nếu không thì tính theo bitrate (CBR)
+    """
+    head = source.head
+    offset = _skip_id3(head)
+    if offset + 4 > len(head):
+        head = source.read(offset, 4096)
+        offset, base = 0, offset
+    else:
+        base = 0
+
+    # Tìm frame đầu tiên có frame kế tiếp hợp lệ để tránh nhầm sync giả
+    frame = None
+    limit = min(len(head) - 4, offset + 8192)
+    while offset < limit:
+        frame = _mpeg_frame(head, offset)
+        if frame and (offset + frame["length"] + 4 > len(head) or _mpeg_frame(head, offset + frame["length"])):
+            break
+        frame = None
+        offset += 1
+    if not frame:
+        return None
+
+    side_info = (32 if not frame["mono"] else 17) if frame["mpeg1"] else (17 if not frame["mono"] else 9)
+    xing = offset + 4 + side_info
+    if head[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", head[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack(">I", head[xing + 8:xing + 12])[0]
+            return frames * frame["samples"] / frame["sample_rate"]
+    vbri = offset + 4 + 32
+    if head[vbri:vbri + 4] == b"VBRI":
+        frames = struct.unpack(">I", head[vbri + 14:vbri + 18])[0]
+        return frames * frame["samples"] / frame["sample_rate"]
+
+    if not source.size:
+        return None
+    audio_bytes = source.size - (base + offset)
+    return audio_bytes * 8 / frame["bitrate"]
+
+
+def wav_duration(source: ByteSource) -> Optional[float]:
+    """Thời lượng WAV từ chunk fmt (byte rate) và kích thước chunk data"""
+    head = source.head
+    if head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    offset, byte_rate = 12, None
+    while offset + 8 <= len(head):
+        chunk_id = head[offset:offset + 4]
+        chunk_size = struct.unpack("<I", head[offset + 4:offset + 8])[0]
+        if chunk_id == b"fmt ":
+            byte_rate = struct.unpack("<I", head[offset + 16:offset + 20])[0]
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            # File ghi dạng stream có thể để kích thước data là 0 hoặc 0xFFFFFFFF
+            if chunk_size in (0, 0xFFFFFFFF) and source.size:
+                chunk_size = source.size - offset - 8
+            return chunk_size / byte_rate
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def mp4_duration(source: ByteSource) -> Optional[float]:
+    """
+    Thời lượng MP4/M4A từ box mvhd.
+    Duyệt các box cấp cao nhất theo kích thước, nên moov nằm cuối file (sau mdat) chỉ tốn thêm một GET có Range.
+    """
+    if source.head[4:8] != b"ftyp":
+        return None
+    offset = 0
+    size = source.size or len(source.head)
+    while offset + 8 <= size:
+        header = source.read(offset, 16)
+        box_size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = size - offset
+        if box_type == b"moov":
+            moov = source.read(offset + header_size, min(box_size - header_size, 1024 * 1024))
+            index = moov.find(b"mvhd")
+            if index < 4:
+                return None
+            body = moov[index + 4:]
+            if body[0] == 1:
+                timescale, duration = struct.unpack(">IQ", body[20:32])
+            else:
+                timescale, duration = struct.unpack(">II", body[12:20])
+            return duration / timescale if timescale else None
+        if box_size < header_size:
+            return None
+        offset += box_size
+    return None
+
+
+def adts_duration(source: ByteSource) -> Optional[float]:
+    """
+    Thời lượng AAC dạng ADTS, ước lượng từ độ dài trung bình các frame ở phần đầu file
+    (ADTS không có header chứa tổng thời lượng)
+    """
+    head = source.head
+    offset = _skip_id3(head)
+    frames, frame_bytes, sample_rate, start = 0, 0, None, offset
+    while offset + 7 <= len(head) and head[offset] == 0xFF and (head[offset + 1] & 0xF6) == 0xF0:
+        rate_index = (head[offset + 2] >> 2) & 0xF
+        if rate_index >= len(ADTS_SAMPLE_RATES):
+            return None
+        sample_rate = ADTS_SAMPLE_RATES[rate_index]
+        length = ((head[offset + 3] & 3) << 11) | (head[offset + 4] << 3) | (head[offset + 5] >> 5)
+        if length < 7:
+            return None
+        blocks = (head[offset + 6] & 3) + 1
+        frames += blocks
+        frame_bytes += length
+        offset += length
+    if not frames or not source.size:
+        return None
+    total_frames = (source.size - start) * frames / frame_bytes
+    return total_frames * 1024 / sample_rate
+
+
+# Thứ tự thử các parser
+PARSERS: List[Callable[[ByteSource], Optional[float]]] = [wav_duration, mp4_duration, adts_duration, mp3_duration]
+
+
+class AudioProbe:
+    """
+    Đọc thời lượng audio mà không decode toàn bộ file.
+    MP3 (Xing/VBRI/CBR), WAV, MP4/M4A (mvhd) và AAC ADTS được tính từ header chỉ với một vài GET có Range;
+    định dạng khác được tải qua AssetCache rồi để ffmpeg demux (không decode) lấy thời lượng.
+    Kết quả được cache theo URL và theo hash nội dung rút gọn (phần đầu file, dung lượng, ETag).
+    """
+
+    def __init__(self, assets: Optional[AssetCache] = None, url_ttl: int = 3600, concurrency: int = 8):
+        self.assets = assets or AssetCache()
+        self.session = requests.Session()
+        self.concurrency = concurrency
+        self._by_url = TTLCache(maxsize=4096, ttl=url_ttl)
+        self._by_content = LRUCache(maxsize=16384)
+        self._lock = threading.Lock()
+
+    def duration(self, source: str) -> float:
+        """
+        Thời lượng (giây) của file audio
+        Args:
+            source: URL hoặc đường dẫn local
+        Returns:
+            Thời lượng tính bằng giây
+        """
+        try:
+            with self._lock:
+                if source in self._by_url:
+                    return self._by_url[source]
+
+            byte_source = ByteSource(source, self.session)
+            fingerprint = byte_source.fingerprint
+            with self._lock:
+                duration = self._by_content.get(fingerprint)
+
+            if duration is None:
+                for parser in PARSERS:
+                    try:
+                        duration = parser(byte_source)
+                    except (struct.error, IndexError):
+                        duration = None
+                    if duration:
+                        break
+                if not duration:
+                    duration = self._demux_duration(source)
+
+            with self._lock:
+                self._by_content[fingerprint] = duration
+                self._by_url[source] = duration
+            return duration
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi đọc thời lượng audio {source}: {str(e)}")
+
+    def _demux_duration(self, source: str) -> float:
+        """Fallback: ffmpeg đọc các packet audio (stream copy, không decode) và lấy timestamp cuối"""
+        path = self.assets.get(source) if source.startswith(("http://", "https://")) else source
+        result = subprocess.run(
+            [FFMPEG_BINARY, "-hide_banner", "-nostats", "-i", path, "-map", "0:a:0", "-c", "copy",
+             "-f", "null", "-progress", "pipe:1", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        matches = re.findall(r"out_time_us=(\d+)", result.stdout.decode("utf-8", errors="ignore"))
+        if result.returncode != 0 or not matches:
+            raise Exception("Không đọc được file audio")
+        return int(matches[-1]) / 1_000_000
+
+    async def durations(self, sources: List[str]) -> Dict[str, Any]:
+        """
+        Đọc song song thời lượng của nhiều file audio
+        Returns:
+            Dict source -> thời lượng (giây) hoặc Exception nếu lỗi
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def probe(source: str):
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(self.duration, source)
+                except Exception as e:
+                    return e
+
+        unique = list(dict.fromkeys(sources))
+        results = await asyncio.gather(*(probe(source) for source in unique))
+        return dict(zip(unique, results))
+
+    async def align_segments(self, data: Dict[str, Any], mode: str = DURATION_MODE,
+                             tolerance: float = DURATION_TOLERANCE) -> List[Dict[str, Any]]:
+        """
+        Đối chiếu duration của từng segment với thời lượng audio của nó
+        Args:
+            data: Dữ liệu tạo video (segments)
+            mode: "client" giữ nguyên, "check" báo lỗi nếu lệch quá tolerance, "audio" đặt duration theo audio
+            tolerance: Độ lệch cho phép (giây) ở chế độ "check"
+        Returns:
+            Danh sách segment sau khi điều chỉnh (chế độ "audio" làm tròn lên theo mili giây)
+        Raises:
+            PreflightError: Nếu không đọc được audio hoặc duration lệch audio (chế độ "check")
+        """
+        segments = data.get("segments", [])
+        if mode == "client":
+            return segments
+        if mode not in ("check", "audio"):
+            raise ValueError(f"durationMode không hợp lệ: {mode}")
+
+        durations = await self.durations([segment.get("audio") for segment in segments])
+        errors = []
+        aligned = []
+        for segment in segments:
+            audio_duration = durations[segment.get("audio")]
+            error = None
+            if isinstance(audio_duration, Exception):
+                error = str(audio_duration)
+            elif mode == "check" and abs(segment.get("duration", 0) - audio_duration) > tolerance:
+                error = f"Duration {segment.get('duration')}s lệch với audio {audio_duration:.3f}s"
+            if error:
+                errors.append({"segment": segment.get("index"), "field": "duration",
+                               "url": segment.get("audio"), "error": error})
+                continue
+            if mode == "audio":
+                segment = {**segment, "duration": math.ceil(audio_duration * 1000) / 1000}
+            aligned.append(segment)
+
+        if errors:
+            raise PreflightError(errors)
+        return aligned
@@ -0,0 +1,204 @@
+import os
+import re
+import math
+import asyncio
+import hashlib
+import tempfile
+import textwrap
+from typing import Dict, Any, List
+from dotenv import load_dotenv
+from config.cloudinary import CloudinaryConfig
+
+load_dotenv()
+
+# Số ký tự tối đa mỗi dòng và số dòng tối đa của một cue phụ đề
+CAPTION_MAX_CHARS = int(os.getenv("CAPTION_MAX_CHARS", "42"))
+CAPTION_MAX_LINES = int(os.getenv("CAPTION_MAX_LINES", "2"))
+# Cue ngắn hơn ngưỡng này (giây) được gộp vào cue trước
+CAPTION_MIN_DURATION = float(os.getenv("CAPTION_MIN_DURATION", "1.0"))
+
+# Trọng số thời gian (tính theo số ký tự) của khoảng nghỉ sau dấu câu
+PAUSE_WEIGHTS = {".": 8, "!": 8, "?": 8, "…": 8, ";": 5, ":": 5, ",": 3}
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+
+
+def format_timestamp(seconds: float, separator: str = ",") -> str:
+    """Thời gian dạng HH:MM:SS,mmm (SRT) hoặc HH:MM:SS.mmm (WebVTT)"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+
+class CaptionBuilder:
+    """
+    Tạo phụ đề có thời gian từ script của các segment.
+    Mỗi script được chia thành các cue theo câu/mệnh đề, vừa tối đa max_lines dòng x max_chars ký tự;
+    thời lượng của segment (bằng thời lượng audio) được chia cho các cue theo số ký tự và khoảng nghỉ sau dấu câu.
+    Kết quả xuất ra SRT/WebVTT để Shotstack vẽ thành một layer caption duy nhất và để player dùng làm phụ đề rời.
+    """
+
+    def __init__(self, max_chars: int = CAPTION_MAX_CHARS, max_lines: int = CAPTION_MAX_LINES,
+                 min_duration: float = CAPTION_MIN_DURATION):
+        self.max_chars = max_chars
+        self.max_lines = max_lines
+        self.min_duration = min_duration
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Chia script thành các đoạn vừa một cue, ưu tiên ngắt ở cuối câu rồi tới dấu phẩy, cuối cùng là giữa các từ
+        Args:
+            text: Script của segment
+        Returns:
+            Danh sách nội dung cue
+        """
+        limit = self.max_chars * self.max_lines
+        chunks = []
+        for sentence in SENTENCE_END.split(" ".join(text.split())):
+            if not sentence:
+                continue
+            current = ""
+            for clause in CLAUSE_END.split(sentence):
+                pieces = [clause] if len(clause) <= limit else textwrap.wrap(clause, width=limit)
+                for piece in pieces:
+                    if current and len(current) + 1 + len(piece) > limit:
+                        chunks.append(current)
+                        current = piece
+                    else:
+                        current = f"{current} {piece}".strip()
+            if current:
+                chunks.append(current)
+        return chunks
+
+    def segment_cues(self, text: str, duration: float) -> List[Dict[str, Any]]:
+        """
+        Chia script của một segment thành các cue trong khoảng [0, duration]
+        Returns:
+            Danh sách cue {"start", "end", "text"} (giây, tính từ đầu segment)
+        """
+        chunks = self.split_text(text or "")
+        if not chunks or duration <= 0:
+            return []
+        weights = [len(chunk) + PAUSE_WEIGHTS.get(chunk[-1], 0) for chunk in chunks]
+        total = sum(weights)
+
+        cues, start = [], 0.0
+        for chunk, weight in zip(chunks, weights):
+            end = start + duration * weight / total
+            if cues and end - start < self.min_duration:
+                # Cue quá ngắn để đọc kịp: gộp vào cue trước
+                cues[-1]["end"] = end
+                cues[-1]["text"] = f"{cues[-1]['text']} {chunk}"
+            else:
+                cues.append({"start": start, "end": end, "text": chunk})
+            start = end
+        cues[-1]["end"] = duration
+        return cues
+
+    def build_cues(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Tạo cue cho cả video từ script và duration của các segment
+        Args:
+            segments: Danh sách segment theo thứ tự timeline
+        Returns:
+            Danh sách cue {"start", "end", "text", "segment"} theo thời gian của video
+        """
+        cues, offset = [], 0.0
+        for segment in segments:
+            duration = float(segment["duration"])
+            for cue in self.segment_cues(segment.get("script", ""), duration):
+                cues.append({
+                    "start": round(offset + cue["start"], 3),
+                    "end": round(offset + cue["end"], 3),
+                    "text": cue["text"],
+                    "segment": segment.get("index"),
+                })
+            offset += duration
+        return cues
+
+    def split_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Tách mỗi segment ảnh tĩnh thành các segment con theo cue (cùng ảnh, caption là nội dung cue,
+        không có transition giữa các segment con), dùng cho renderer local vẽ phụ đề vào hình.
+        Segment có chuyển động giữ nguyên cả script làm caption để chuyển động không bị ngắt.
+        Segment nối tiếp segment trước cùng ảnh (không chuyển động) cũng chỉ đổi caption, không fade giữa 2 ảnh giống nhau.
+        """
+        result = []
+        for segment in segments:
+            cues = self.segment_cues(segment.get("script", ""), float(segment["duration"]))
+            if segment.get("motion") or len(cues) <= 1:
+                parts = [dict(segment, caption=" ".join(cue["text"] for cue in cues))]
+            else:
+                parts = [dict(segment, caption=cue["text"], duration=round(cue["end"] - cue["start"], 3))
+                         for cue in cues]
+            for position, part in enumerate(parts):
+                previous = result[-1] if result else None
+                if position > 0 or (
+                    previous is not None
+                    and previous.get("image") == part.get("image")
+                    and not previous.get("motion")
+                    and not part.get("motion")
+                ):
+                    part["transition"] = {"duration": 0}
+                result.append(part)
+        return result
+
+    def wrap(self, text: str) -> str:
+        """Ngắt nội dung cue thành tối đa max_lines dòng có độ dài cân đối"""
+        lines = max(1, math.ceil(len(text) / self.max_chars))
+        width = min(self.max_chars, math.ceil(len(text) / lines) + 4)
+        wrapped = textwrap.wrap(text, width=width)
+        if len(wrapped) > self.max_lines:
+            wrapped = textwrap.wrap(text, width=self.max_chars)
+        return "\n".join(wrapped)
+
+    def to_srt(self, cues: List[Dict[str, Any]]) -> str:
+        """Xuất cue ra định dạng SRT"""
+        blocks = [
+            f"{number}\n{format_timestamp(cue['start'])} --> {format_timestamp(cue['end'])}\n{self.wrap(cue['text'])}\n"
+            for number, cue in enumerate(cues, start=1)
+        ]
+        return "\n".join(blocks)
+
+    def to_vtt(self, cues: List[Dict[str, Any]]) -> str:
+        """Xuất cue ra định dạng WebVTT"""
+        blocks = [
+            f"{format_timestamp(cue['start'], '.')} --> {format_timestamp(cue['end'], '.')}\n{self.wrap(cue['text'])}\n"
+            for cue in cues
+        ]
+        return "WEBVTT\n\n" + "\n".join(blocks)
+
+    async def publish(self, video_id: str, cues: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Upload file SRT và WebVTT lên Cloudinary (resource raw) cạnh video
+        Args:
+            video_id: ID của video
+            cues: Danh sách cue
+        Returns:
+            Dict {"srt": URL, "vtt": URL}
+        """
+        try:
+            urls = {}
+            for extension, content in (("srt", self.to_srt(cues)), ("vtt", self.to_vtt(cues))):
+                digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+                with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=f".{extension}", delete=False) as f:
+                    f.write(content)
+                    path = f.name
+                try:
+                    result = await asyncio.to_thread(
+                        CloudinaryConfig().upload_file,
+                        path,
+                        folder=f"videos/{video_id}",
+                        resource_type="raw",
+                        public_id=f"captions-{digest}.{extension}",
+                    )
+                    urls[extension] = result["secure_url"]
+                finally:
+                    os.unlink(path)
+            return urls
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi upload phụ đề: {str(e)}")
@@ -0,0 +1,385 @@
+import os
+import time
+import shutil
+import asyncio
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable
+from config.mongodb import MongoDB
+from config.render_config import (
+    RENDER_SHARED_DIR,
+    RENDER_CHUNK_SECONDS,
+    RENDER_CHUNK_RETRIES,
+    RENDER_CHUNK_TIMEOUT,
+    RENDER_ARTIFACT_TTL_DAYS,
+    AUDIO_PREMIX_ENABLED,
+    get_frame_size,
+)
+from models.message_model import ChunkMessage
+from service.ffmpeg_service import FFmpegService
+from service.local_render_service import LocalRenderService
+from service.audio_mixer import AudioMixer
+
+
+class ChunkRenderCoordinator:
+    """
+    Render phân tán theo chunk.
+    Mỗi đoạn trong plan của LocalRenderService có khóa nội dung (input của segment, transition kề bên,
+    kích thước khung hình, tham số codec) và được lưu trong kho đoạn dùng chung.
+    Chỉ các đoạn chưa có trong kho mới được chia thành chunk và gửi cho bất kỳ chunk worker nào đang rảnh,
+    nên khi sửa một segment chỉ các đoạn của segment đó và transition kề bên được render lại.
+    Đoạn transition mang theo cả 2 segment hai bên (phần overlap), nên biên chunk không bao giờ cắt ngang transition.
+    Trạng thái từng chunk nằm trong collection render_chunks, chunk lỗi được render lại riêng,
+    khi đủ đoạn thì ghép bằng stream copy và gắn audio.
+    """
+
+    def __init__(self, shared_dir: str = RENDER_SHARED_DIR, chunk_seconds: float = RENDER_CHUNK_SECONDS,
+                 max_retries: int = RENDER_CHUNK_RETRIES, chunk_timeout: int = RENDER_CHUNK_TIMEOUT,
+                 renderer: Optional[LocalRenderService] = None):
+        self.mongodb = MongoDB()
+        self.chunk_collection = self.mongodb.get_collection("render_chunks")
+        self.shared_dir = shared_dir
+        self.artifact_dir = os.path.join(shared_dir, "parts")
+        self.chunk_seconds = chunk_seconds
+        self.max_retries = max_retries
+        self.chunk_timeout = chunk_timeout
+        self.renderer = renderer or LocalRenderService()
+        self.ffmpeg = FFmpegService()
+        self.mixer = AudioMixer(assets=self.renderer.assets)
+        self._renderers: Dict[str, LocalRenderService] = {}
+        self._message_service = None
+
+    @property
+    def message_service(self):
+        """MessageService được tạo khi cần (message_service import VideoService, tránh import vòng)"""
+        if self._message_service is None:
+            from service.message_service import MessageService
+            self._message_service = MessageService()
+        return self._message_service
+
+    def renderer_for(self, profile: Optional[str]) -> LocalRenderService:
+        """Renderer encode theo profile, dùng chung cache và kho asset với renderer mặc định"""
+        if not profile:
+            return self.renderer
+        if profile not in self._renderers:
+            self._renderers[profile] = LocalRenderService(
+                cache_dir=self.renderer.cache_dir,
+                fps=self.renderer.fps,
+                still_fps=self.renderer.still_fps,
+                max_workers=self.renderer.max_workers,
+                frame_workers=self.renderer.frame_workers,
+                rasterizer=self.renderer.rasterizer,
+                assets=self.renderer.assets,
+                ffmpeg=FFmpegService(profile=profile),
+            )
+        return self._renderers[profile]
+
+    def artifact_path(self, key: str) -> str:
+        """Đường dẫn của đoạn có khóa key trong kho dùng chung"""
+        return os.path.join(self.artifact_dir, key[:2], f"{key}.mp4")
+
+    def split(self, parts: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Chia các đoạn thành các chunk liên tiếp có thời lượng xấp xỉ chunk_seconds
+        Args:
+            parts: Các đoạn cần render, theo thứ tự timeline
+        Returns:
+            Danh sách chunk, mỗi chunk là danh sách đoạn
+        """
+        chunks, current, current_duration = [], [], 0.0
+        for part in parts:
+            current.append(part)
+            current_duration += part["duration"]
+            if current_duration >= self.chunk_seconds:
+                chunks.append(current)
+                current, current_duration = [], 0.0
+        if current:
+            # Chunk cuối quá ngắn được gộp vào chunk trước
+            if chunks and current_duration < self.chunk_seconds / 4:
+                chunks[-1].extend(current)
+            else:
+                chunks.append(current)
+        return chunks
+
+    def submit(self, video_id: str, segments: List[Dict[str, Any]], resolution: str = "1080",
+               aspect_ratio: str = "16:9", subtitle_enabled: bool = False, profile: Optional[str] = None) -> List[str]:
+        """
+        Lập plan, gửi các đoạn chưa có trong kho thành các chunk và lưu trạng thái chunk
+        Returns:
+            Khóa nội dung của mọi đoạn theo thứ tự timeline
+        """
+        try:
+            width, height = get_frame_size(resolution, aspect_ratio)
+            renderer = self.renderer_for(profile)
+            parts = renderer.plan(segments, subtitle_enabled)
+            # Khóa gồm cả tham số encode nên đoạn của profile khác không bị dùng lại
+            keys = [renderer.part_key(part, width, height) for part in parts]
+
+            # Bỏ qua các đoạn đã có trong kho (kể cả đoạn trùng nhau trong cùng video)
+            missing, seen = [], set()
+            for part, key in zip(parts, keys):
+                if key in seen:
+                    continue
+                if os.path.exists(self.artifact_path(key)):
+                    # Đánh dấu lần dùng cuối để việc dọn kho không xóa đoạn sắp được ghép
+                    os.utime(self.artifact_path(key))
+                    continue
+                seen.add(key)
+                missing.append(dict(part, key=key))
+
+            self.chunk_collection.delete_many({"video_id": video_id})
+            documents = [
+                {
+                    "video_id": video_id,
+                    "chunk_index": index,
+                    "attempt": 0,
+                    "status": "pending",
+                    "width": width,
+                    "height": height,
+                    "profile": profile,
+                    "parts": [{k: v for k, v in part.items() if k != "key"} for part in chunk],
+                    "keys": [part["key"] for part in chunk],
+                    "duration": sum(part["duration"] for part in chunk),
+                    "updatedAt": datetime.now(),
+                }
+                for index, chunk in enumerate(self.split(missing))
+            ]
+            if documents:
+                self.chunk_collection.insert_many(documents)
+            for document in documents:
+                self._publish(document)
+
+            print(f"Video {video_id}: {len(parts) - len(missing)}/{len(parts)} đoạn có sẵn, "
+                  f"gửi {len(documents)} chunk")
+            return keys
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi chia chunk render: {str(e)}")
+
+    def _publish(self, chunk: Dict[str, Any]) -> None:
+        message = ChunkMessage(
+            video_id=chunk["video_id"],
+            chunk_index=chunk["chunk_index"],
+            attempt=chunk["attempt"],
+            width=chunk["width"],
+            height=chunk["height"],
+            parts=chunk["parts"],
+            keys=chunk["keys"],
+            artifact_dir=self.artifact_dir,
+            profile=chunk.get("profile"),
+        )
+        self.message_service.publish_chunk(message.model_dump())
+
+    def render_chunk(self, message: ChunkMessage) -> Optional[List[str]]:
+        """
+        Render các đoạn của một chunk vào kho dùng chung (chạy trên chunk worker)
+        Args:
+            message: Message của chunk
+        Returns:
+            Đường dẫn các đoạn, hoặc None nếu message đã cũ (chunk đã được giao lại cho lần thử khác)
+        """
+        claimed = self.chunk_collection.update_one(
+            {
+                "video_id": message.video_id,
+                "chunk_index": message.chunk_index,
+                "attempt": message.attempt,
+                "status": "pending",
+            },
+            {
+                "$set": {
+                    "status": "rendering",
+                    "worker": f"{socket.gethostname()}:{os.getpid()}",
+                    "startedAt": datetime.now(),
+                    "updatedAt": datetime.now(),
+                }
+            }
+        )
+        if claimed.matched_count == 0:
+            print(f"Bỏ qua chunk {message.chunk_index} của video {message.video_id} (attempt {message.attempt} đã cũ)")
+            return None
+
+        query = {"video_id": message.video_id, "chunk_index": message.chunk_index, "attempt": message.attempt}
+        renderer = self.renderer_for(message.profile)
+
+        def store(part: Dict[str, Any], key: str) -> str:
+            """Render đoạn rồi đưa vào kho dùng chung (đổi tên nguyên tử)"""
+            path = os.path.join(message.artifact_dir, key[:2], f"{key}.mp4")
+            if os.path.exists(path):
+                return path
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp.mp4"
+            try:
+                shutil.copyfile(renderer.render_part(part, message.width, message.height), tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            return path
+
+        try:
+            # Encode song song các đoạn của chunk
+            with ThreadPoolExecutor(max_workers=renderer.max_workers) as executor:
+                paths = list(executor.map(store, message.parts, message.keys))
+
+            self.chunk_collection.update_one(query, {"$set": {"status": "done", "updatedAt": datetime.now()}})
+            return paths
+
+        except Exception as e:
+            self.chunk_collection.update_one(
+                query,
+                {"$set": {"status": "failed", "error": str(e), "updatedAt": datetime.now()}}
+            )
+            raise Exception(f"Lỗi khi render chunk {message.chunk_index}: {str(e)}")
+
+    def _retry(self, chunk: Dict[str, Any], reason: str) -> None:
+        """Giao lại một chunk lỗi/quá hạn với attempt mới, message cũ sẽ bị worker bỏ qua"""
+        if chunk["attempt"] >= self.max_retries:
+            raise Exception(f"Chunk {chunk['chunk_index']} lỗi sau {chunk['attempt'] + 1} lần: {reason}")
+
+        chunk = dict(chunk, attempt=chunk["attempt"] + 1, status="pending")
+        self.chunk_collection.update_one(
+            {"_id": chunk["_id"]},
+            {"$set": {"attempt": chunk["attempt"], "status": "pending", "updatedAt": datetime.now()},
+             "$push": {"errors": reason}}
+        )
+        print(f"Render lại chunk {chunk['chunk_index']} của video {chunk['video_id']} (lần {chunk['attempt']}): {reason}")
+        self._publish(chunk)
+
+    def _republish(self, chunk: Dict[str, Any]) -> None:
+        """
+        Gửi lại message của chunk còn pending quá lâu (message có thể đã mất khi publish/broker lỗi).
+        Giữ nguyên attempt: worker chỉ nhận chunk một lần nên message trùng bị bỏ qua, không tính là lần thử lại
+        """
+        self.chunk_collection.update_one(
+            {"_id": chunk["_id"], "attempt": chunk["attempt"], "status": "pending"},
+            {"$set": {"updatedAt": datetime.now()}}
+        )
+        print(f"Gửi lại chunk {chunk['chunk_index']} của video {chunk['video_id']} (chờ trong hàng đợi quá lâu)")
+        self._publish(chunk)
+
+    async def wait_for_chunks(self, video_id: str, timeout: float = 3600, interval: float = 2,
+                              on_progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """
+        Chờ tất cả chunk render xong, render lại các chunk lỗi hoặc bị treo, gửi lại chunk pending quá lâu
+        Args:
+            video_id: ID của video
+            timeout: Thời gian chờ tối đa (giây)
+            interval: Khoảng thời gian giữa các lần kiểm tra (giây)
+            on_progress: Callback (số chunk xong, tổng số chunk)
+        """
+        deadline = datetime.now() + timedelta(seconds=timeout)
+        last_done = -1
+        while datetime.now() < deadline:
+            chunks = list(self.chunk_collection.find({"video_id": video_id}).sort("chunk_index", 1))
+
+            stale_before = datetime.now() - timedelta(seconds=self.chunk_timeout)
+            for chunk in chunks:
+                if chunk["status"] == "failed":
+                    self._retry(chunk, chunk.get("error", "Không xác định"))
+                elif chunk["status"] == "rendering" and chunk.get("startedAt", datetime.now()) < stale_before:
+                    self._retry(chunk, "Quá thời gian render")
+                elif chunk["status"] == "pending" and chunk.get("updatedAt", datetime.now()) < stale_before:
+                    self._republish(chunk)
+
+            done = sum(1 for chunk in chunks if chunk["status"] == "done")
+            if done == len(chunks):
+                return
+            if on_progress and done != last_done:
+                on_progress(done, len(chunks))
+                last_done = done
+            await asyncio.sleep(interval)
+
+        raise Exception("Hết thời gian chờ render chunk")
+
+    def stitch(self, video_id: str, keys: List[str], segments: List[Dict[str, Any]],
+               output_path: str, background_music: Optional[str] = None, profile: Optional[str] = None) -> str:
+        """
+        Ghép các đoạn trong kho bằng stream copy rồi gắn track audio dựng từ voice-over của các segment
+        (bitrate audio theo profile encode)
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        ffmpeg = self.renderer_for(profile).ffmpeg
+        video_dir = os.path.join(self.shared_dir, video_id)
+        os.makedirs(video_dir, exist_ok=True)
+        video_only_path = os.path.join(video_dir, "video.mp4")
+        audio_path = os.path.join(video_dir, "audio.m4a")
+
+        ffmpeg.concat_copy([self.artifact_path(key) for key in keys], video_only_path)
+
+        durations = [float(segment["duration"]) for segment in segments]
+        audio_sources = [segment.get("audio") for segment in segments]
+        if not all(audio_sources):
+            if background_music:
+                raise Exception("Mọi segment phải có audio khi dùng nhạc nền")
+            shutil.move(video_only_path, output_path)
+            return output_path
+
+        if AUDIO_PREMIX_ENABLED:
+            # Track đã mix (ducking, chuẩn hóa loudness) được cache, render lại video không phải mix lại
+            audio_path = self.mixer.mix(segments, background_music)["path"]
+        else:
+            ffmpeg.build_audio_track(
+                [self.renderer.localize(source) for source in audio_sources],
+                durations,
+                audio_path,
+                self.renderer.localize(background_music) if background_music else None,
+            )
+        return ffmpeg.mux_audio(video_only_path, audio_path, output_path, sum(durations))
+
+    async def render(self, video_id: str, data: Dict[str, Any], output_path: str,
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> str:
+        """
+        Render cả video theo chunk: gửi các đoạn còn thiếu, chờ worker, ghép kết quả
+        Args:
+            video_id: ID của video
+            data: Dữ liệu tạo video (segments, backgroundMusic, subtitle, resolution, aspectRatio, encodingProfile)
+            output_path: Đường dẫn file mp4 đầu ra
+            on_progress: Callback (số chunk xong, tổng số chunk)
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        try:
+            segments = data["segments"]
+            keys = self.submit(
+                video_id,
+                segments,
+                data.get("resolution", "1080"),
+                data.get("aspectRatio", "16:9"),
+                (data.get("subtitle") or {}).get("enabled", False),
+                data.get("encodingProfile"),
+            )
+            await self.wait_for_chunks(video_id, on_progress=on_progress)
+            return await asyncio.to_thread(
+                self.stitch, video_id, keys, segments, output_path, data.get("backgroundMusic"),
+                data.get("encodingProfile")
+            )
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi render video theo chunk: {str(e)}")
+
+    def cleanup(self, video_id: str) -> None:
+        """Xóa file tạm và trạng thái chunk của video, dọn các đoạn lâu không dùng trong kho"""
+        shutil.rmtree(os.path.join(self.shared_dir, video_id), ignore_errors=True)
+        self.chunk_collection.delete_many({"video_id": video_id})
+        self.prune_artifacts()
+
+    def prune_artifacts(self, ttl_days: float = RENDER_ARTIFACT_TTL_DAYS) -> int:
+        """
+        Xóa các đoạn không được dùng trong ttl_days ngày
+        Returns:
+            Số đoạn đã xóa
+        """
+        expire_before = time.time() - ttl_days * 86400
+        removed = 0
+        for root, _, files in os.walk(self.artifact_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < expire_before:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
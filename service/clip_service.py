@@ -0,0 +1,275 @@
+import glob
+import os
+from typing import Dict, Any, List, Optional, Tuple
+from service.ffmpeg_service import FFmpegService
+
+# Tham số stream phải giống nhau để ghép các file bằng stream copy
+COPY_COMPATIBLE_FIELDS = (
+    "videoCodec", "width", "height", "pixelFormat", "timescale",
+    "hasAudio", "audioCodec", "sampleRate", "channels",
+)
+
+# Tên profile H.264 trong output của ffmpeg -i -> giá trị -profile:v của libx264
+X264_PROFILES = {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high"}
+
+CHANNEL_COUNTS = {"mono": 1, "stereo": 2}
+
+
+class ClipService:
+    """
+    Cắt (trim) và ghép (compilation) các video đã render mà không render lại.
+    Phần nằm giữa 2 keyframe được lấy bằng stream copy; chỉ đoạn ngắn từ điểm cắt tới keyframe kế tiếp
+    (đầu) và từ keyframe cuối tới điểm kết thúc (cuối) được encode lại với cùng tham số stream với video gốc.
+    Khi ghép, video cùng tham số stream được nối nguyên bằng stream copy, chỉ video khác tham số mới được encode lại.
+    """
+
+    def __init__(self, ffmpeg: Optional[FFmpegService] = None, crf: int = 18):
+        self.ffmpeg = ffmpeg or FFmpegService()
+        self.crf = crf
+
+    def _stream_args(self, info: Dict[str, Any]) -> List[str]:
+        """Tham số encode lại để đoạn mới ghép được với stream của info bằng stream copy"""
+        return self._video_args(info) + self._audio_args(info)
+
+    def _video_args(self, info: Dict[str, Any]) -> List[str]:
+        """Tham số encode lại stream video theo info"""
+        args = [
+            "-c:v", "libx264",
+            "-preset", self.ffmpeg.preset,
+            "-crf", str(self.crf),
+            "-pix_fmt", info.get("pixelFormat") or "yuv420p",
+            "-bf", "0",
+            # Giữ nguyên thời điểm từng frame (video ảnh tĩnh của renderer local có frame rate thay đổi)
+            "-fps_mode", "passthrough",
+            "-enc_time_base:v", "filter",
+        ]
+        if info.get("profile") in X264_PROFILES:
+            args += ["-profile:v", X264_PROFILES[info["profile"]]]
+        if info.get("timescale"):
+            args += ["-video_track_timescale", str(info["timescale"])]
+        return args
+
+    def _audio_args(self, info: Dict[str, Any]) -> List[str]:
+        """Tham số encode lại stream audio theo info"""
+        args = []
+        if info.get("hasAudio"):
+            args += ["-c:a", "aac", "-b:a", self.ffmpeg.audio_bitrate]
+            if info.get("sampleRate"):
+                args += ["-ar", str(info["sampleRate"])]
+            if info.get("channels") in CHANNEL_COUNTS:
+                args += ["-ac", str(CHANNEL_COUNTS[info["channels"]])]
+        return args
+
+    def _encode_range(self, input_path: str, start: float, end: float, output_path: str,
+                      info: Dict[str, Any]) -> str:
+        """Encode lại video (không audio) của khoảng [start, end) với tham số stream của info"""
+        self.ffmpeg.run([
+            "-ss", f"{start:.6f}", "-i", input_path, "-t", f"{end - start:.6f}",
+            "-map", "0:v:0", "-an",
+            *self._video_args(info),
+            output_path,
+        ])
+        return output_path
+
+    def _copy_range(self, input_path: str, start: float, end: Optional[float], output_path: str,
+                    frame_time: float) -> str:
+        """
+        Lấy video (không audio) của khoảng [start, end) bằng stream copy, start và end là keyframe.
+        Cắt bằng segment muxer: muxer tách đúng tại packet keyframe đầu tiên có pts >= thời điểm cắt
+        (cắt bằng -ss/-t theo dts sẽ thiếu hoặc thừa frame khi video có B-frame)
+        """
+        if start <= 0 and end is None:
+            self.ffmpeg.run(["-i", input_path, "-map", "0:v:0", "-c", "copy", output_path])
+            return output_path
+
+        cuts = [time - frame_time / 2 for time in (start, end) if time is not None and time > 0]
+        pattern = f"{output_path}.seg%03d.mp4"
+        try:
+            self.ffmpeg.run([
+                "-i", input_path, "-map", "0:v:0", "-c", "copy",
+                "-f", "segment", "-segment_times", ",".join(f"{time:.6f}" for time in cuts),
+                "-reset_timestamps", "1",
+                "-segment_format", "mp4",
+                pattern,
+            ])
+            os.replace(pattern % (1 if start > 0 else 0), output_path)
+        finally:
+            for path in glob.glob(f"{glob.escape(output_path)}.seg*.mp4"):
+                os.remove(path)
+        return output_path
+
+    def _mux_audio(self, video_path: str, input_path: str, start: float, end: float, output_path: str,
+                   info: Dict[str, Any]) -> str:
+        """Ghép video đã cắt với audio của khoảng [start, end) lấy liền một lần từ video nguồn"""
+        self.ffmpeg.run([
+            "-i", video_path,
+            "-ss", f"{start:.6f}", "-t", f"{end - start:.6f}", "-i", input_path,
+            "-map", "0:v:0", "-map", "1:a:0",
+            "-c:v", "copy",
+            *self._audio_args(info),
+            "-movflags", "+faststart",
+            output_path,
+        ])
+        return output_path
+
+    def plan_trim(self, keyframes: List[float], start: float, end: float, duration: float,
+                  frame_time: float) -> List[Tuple[str, float, float]]:
+        """
+        Chia khoảng [start, end] thành các đoạn encode lại/stream copy
+        Args:
+            keyframes: Thời điểm keyframe của video
+            start, end: Khoảng cần lấy (giây)
+            duration: Thời lượng video
+            frame_time: Thời lượng một frame, sai số khi so điểm cắt với keyframe
+        Returns:
+            Danh sách ("encode" hoặc "copy", bắt đầu, kết thúc)
+        """
+        inside = [time for time in keyframes if start - frame_time / 2 <= time < end - frame_time / 2]
+        if not inside:
+            return [("encode", start, end)]
+
+        first, last = inside[0], inside[-1]
+        pieces = []
+        if first - start > frame_time / 2:
+            pieces.append(("encode", start, first))
+        if end >= duration - frame_time / 2:
+            # Lấy tới hết video: phần sau keyframe đầu tiên copy được toàn bộ
+            pieces.append(("copy", first, duration))
+        else:
+            # Đoạn cuối encode lại từ keyframe cuối để không phụ thuộc frame tham chiếu nằm sau điểm cắt
+            if last > first:
+                pieces.append(("copy", first, last))
+            pieces.append(("encode", last, end))
+
+        # Các đoạn encode liền nhau (keyframe nằm giữa không copy được) gộp thành một đoạn
+        merged = []
+        for kind, piece_start, piece_end in pieces:
+            if merged and kind == "encode" and merged[-1][0] == "encode":
+                merged[-1] = ("encode", merged[-1][1], piece_end)
+            else:
+                merged.append((kind, piece_start, piece_end))
+        return merged
+
+    def trim(self, input_path: str, start: float, end: Optional[float], output_path: str) -> Dict[str, Any]:
+        """
+        Cắt một đoạn của video
+        Args:
+            input_path: File mp4 nguồn
+            start: Thời điểm bắt đầu (giây)
+            end: Thời điểm kết thúc (giây), None là tới hết video
+            output_path: File mp4 đầu ra
+        Returns:
+            Dict gồm path, duration, copiedSeconds và encodedSeconds
+        """
+        try:
+            info = self.ffmpeg.probe_video(input_path)
+            duration = info["duration"]
+            end = duration if end is None else min(end, duration)
+            if start < 0 or end - start <= 0:
+                raise ValueError("Khoảng cắt không hợp lệ")
+
+            frame_time = 1.0 / (info["fps"] or 30)
+            pieces = self.plan_trim(self.ffmpeg.keyframe_times(input_path), start, end, duration, frame_time)
+            # Các đoạn chỉ chứa video; audio được lấy liền một lần sau khi ghép để không hở ở điểm nối
+            video_path = f"{output_path}.video.mp4" if info.get("hasAudio") else output_path
+            paths = []
+            try:
+                for number, (kind, piece_start, piece_end) in enumerate(pieces):
+                    path = f"{output_path}.part{number}.mp4"
+                    if kind == "copy":
+                        self._copy_range(input_path, piece_start, None if piece_end >= duration else piece_end,
+                                         path, frame_time)
+                    else:
+                        # Đoạn encode nằm trước đoạn copy không được lấy frame keyframe tại piece_end
+                        encode_end = piece_end - frame_time / 2 if number < len(pieces) - 1 else piece_end
+                        self._encode_range(input_path, piece_start, encode_end, path, info)
+                    paths.append(path)
+
+                if len(paths) == 1:
+                    os.replace(paths[0], video_path)
+                else:
+                    self.ffmpeg.concat_copy(paths, video_path)
+                if info.get("hasAudio"):
+                    self._mux_audio(video_path, input_path, start, end, output_path, info)
+            finally:
+                for path in paths + [f"{output_path}.video.mp4"]:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            return {
+                "path": output_path,
+                "duration": end - start,
+                "copiedSeconds": sum(b - a for kind, a, b in pieces if kind == "copy"),
+                "encodedSeconds": sum(b - a for kind, a, b in pieces if kind == "encode"),
+            }
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi cắt video: {str(e)}")
+
+    def _conform(self, input_path: str, output_path: str, target: Dict[str, Any]) -> str:
+        """Encode lại cả video theo kích thước và tham số stream của target (giữ tỷ lệ, thêm viền đen)"""
+        width, height = target["width"], target["height"]
+        info = self.ffmpeg.probe_video(input_path)
+        args = ["-i", input_path]
+        if target["hasAudio"] and not info["hasAudio"]:
+            # Video không có audio: thêm audio im lặng để ghép được với các video có audio
+            args += ["-f", "lavfi", "-i", f"anullsrc=r={target.get('sampleRate') or 48000}:cl=stereo", "-shortest"]
+        args += [
+            "-map", "0:v:0",
+            "-map", "1:a:0" if target["hasAudio"] and not info["hasAudio"] else "0:a:0?",
+        ]
+        if not target["hasAudio"]:
+            args += ["-an"]
+        self.ffmpeg.run([
+            *args,
+            "-vf", f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                   f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1",
+            *self._stream_args(target),
+            "-movflags", "+faststart",
+            output_path,
+        ])
+        return output_path
+
+    def compile(self, input_paths: List[str], output_path: str) -> Dict[str, Any]:
+        """
+        Ghép nhiều video nối tiếp nhau
+        Args:
+            input_paths: Các file mp4 theo thứ tự
+            output_path: File mp4 đầu ra
+        Returns:
+            Dict gồm path, duration, copiedSeconds và encodedSeconds
+        """
+        try:
+            if len(input_paths) < 2:
+                raise ValueError("Cần ít nhất 2 video để ghép")
+            infos = [self.ffmpeg.probe_video(path) for path in input_paths]
+            # Tham số của video đầu tiên là chuẩn, video khác tham số được encode lại theo chuẩn đó
+            target = infos[0]
+            paths, conformed = [], []
+            copied = encoded = 0.0
+            for number, (path, info) in enumerate(zip(input_paths, infos)):
+                if all(info.get(field) == target.get(field) for field in COPY_COMPATIBLE_FIELDS):
+                    paths.append(path)
+                    copied += info["duration"]
+                else:
+                    conformed_path = f"{output_path}.conform{number}.mp4"
+                    paths.append(self._conform(path, conformed_path, target))
+                    conformed.append(conformed_path)
+                    encoded += info["duration"]
+
+            try:
+                self.ffmpeg.concat_copy(paths, output_path)
+            finally:
+                for path in conformed:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            return {
+                "path": output_path,
+                "duration": copied + encoded,
+                "copiedSeconds": copied,
+                "encodedSeconds": encoded,
+            }
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi ghép video: {str(e)}")
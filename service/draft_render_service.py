@@ -0,0 +1,95 @@
+import os
+import hashlib
+from typing import Dict, Any, Optional
+from config.cloudinary import CloudinaryConfig
+from config.render_config import (
+    AUDIO_PREMIX_ENABLED,
+    DRAFT_RESOLUTION,
+    DRAFT_FPS,
+    DRAFT_CRF,
+    STILL_FPS,
+)
+from service.ffmpeg_service import FFmpegService
+from service.local_render_service import LocalRenderService
+from service.audio_mixer import AudioMixer
+
+
+class DraftRenderService:
+    """
+    Render bản nháp của video (độ phân giải thấp, frame rate thấp, preset ultrafast) bằng renderer local
+    ngay trên API, chạy song song với bản render đầy đủ (Shotstack hoặc chunk worker).
+    Bản nháp dùng cùng plan với renderer local (ảnh, transition, chuyển động, phụ đề) và cùng track audio đã mix
+    nên người dùng xem được nội dung video sau vài giây thay vì chờ bản 1080p.
+    """
+
+    def __init__(self, resolution: str = DRAFT_RESOLUTION, fps: int = DRAFT_FPS, crf: int = DRAFT_CRF):
+        self.resolution = resolution
+        self.renderer = LocalRenderService(
+            fps=fps,
+            still_fps=min(STILL_FPS, fps),
+            ffmpeg=FFmpegService(profile="draft", crf=crf),
+        )
+        self.mixer = AudioMixer(assets=self.renderer.assets)
+
+    def render(self, data: Dict[str, Any], output_path: str) -> str:
+        """
+        Render bản nháp
+        Args:
+            data: Dữ liệu tạo video (segments, backgroundMusic, subtitle, aspectRatio)
+            output_path: Đường dẫn file mp4 đầu ra
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        segments = data["segments"]
+        audio_path: Optional[str] = None
+        if all(segment.get("audio") for segment in segments):
+            if AUDIO_PREMIX_ENABLED:
+                # Cùng khóa cache với bản đầy đủ nên track audio chỉ mix một lần
+                audio_path = self.mixer.mix(segments, data.get("backgroundMusic"))["path"]
+            else:
+                audio_path = f"{output_path}.audio.m4a"
+                self.renderer.ffmpeg.build_audio_track(
+                    [self.renderer.localize(segment["audio"]) for segment in segments],
+                    [float(segment["duration"]) for segment in segments],
+                    audio_path,
+                    self.renderer.localize(data["backgroundMusic"]) if data.get("backgroundMusic") else None,
+                )
+        try:
+            return self.renderer.render_slideshow(
+                segments,
+                output_path,
+                self.resolution,
+                data.get("aspectRatio", "16:9"),
+                audio_path,
+                (data.get("subtitle") or {}).get("enabled", False),
+            )
+        finally:
+            if audio_path and audio_path.startswith(output_path):
+                os.remove(audio_path)
+
+    def render_and_upload(self, data: Dict[str, Any], work_dir: str, video_id: str) -> str:
+        """
+        Render bản nháp và upload lên Cloudinary
+        Args:
+            data: Dữ liệu tạo video
+            work_dir: Thư mục tạm
+            video_id: ID của video
+        Returns:
+            URL bản nháp
+        """
+        try:
+            output_path = self.render(data, os.path.join(work_dir, "draft.mp4"))
+            digest = hashlib.sha256()
+            with open(output_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            result = CloudinaryConfig().upload_file(
+                output_path,
+                folder=f"videos/{video_id}",
+                resource_type="video",
+                public_id=f"draft-{digest.hexdigest()[:16]}",
+            )
+            return result["secure_url"]
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi render bản nháp: {str(e)}")
@@ -0,0 +1,459 @@
+import os
+import re
+import subprocess
+from typing import Dict, Any, List, Optional
+import numpy as np
+from config.render_config import FFMPEG_BINARY, get_encoding_profile
+
+
+class FFmpegService:
+    """
+    Bọc các lệnh ffmpeg dùng cho renderer local.
+    Mọi đoạn video đều được encode với cùng tham số codec để có thể ghép bằng stream copy.
+    Preset, CRF, khoảng cách keyframe tối đa và bitrate audio lấy theo profile encode (ENCODING_PROFILES),
+    preset/crf truyền vào sẽ ghi đè giá trị của profile.
+    """
+
+    def __init__(self, binary: str = FFMPEG_BINARY, preset: Optional[str] = None, crf: Optional[int] = None,
+                 profile: Optional[str] = None):
+        settings = get_encoding_profile(profile)
+        self.binary = binary
+        self.profile = profile
+        self.preset = preset or settings["preset"]
+        self.crf = settings["crf"] if crf is None else crf
+        self.gop_seconds = settings["gopSeconds"]
+        self.audio_bitrate = settings["audioBitrate"]
+
+    def run(self, args: List[str]) -> None:
+        """
+        Chạy ffmpeg với danh sách tham số
+        Args:
+            args: Tham số truyền cho ffmpeg (không gồm tên binary)
+        """
+        command = [self.binary, "-hide_banner", "-loglevel", "error", "-y", *args]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            error = result.stderr.decode("utf-8", errors="ignore").strip()
+            raise Exception(f"Lỗi khi chạy ffmpeg: {error[-500:]}")
+
+    def scale_filter(self, width: int, height: int) -> str:
+        """Filter scale + crop theo kiểu cover giống "fit": "cover" của Shotstack"""
+        return (
+            f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+            f"crop={width}:{height},setsar=1,format=yuv420p"
+        )
+
+    def still_filter(self, width: int, height: int, fps: int, frames: int) -> str:
+        """
+        Scale ảnh một lần rồi lặp lại frame đã scale bằng filter loop,
+        tránh việc decode và scale lại ảnh ở mỗi frame như khi dùng -loop 1
+        """
+        return (
+            f"{self.scale_filter(width, height)},"
+            f"loop=loop={max(frames - 1, 0)}:size=1:start=0,setpts=N/{fps}/TB,fps={fps}"
+        )
+
+    def encode_still_frame(self, frame, output_path: str, duration: float, fps: int) -> str:
+        """
+        Encode một frame BGR đã dựng sẵn (ví dụ đã vẽ phụ đề) thành đoạn video tĩnh,
+        frame được đưa qua stdin một lần và lặp lại bằng filter loop
+        Args:
+            frame: Mảng numpy (H, W, 3) uint8 BGR
+            output_path: Đường dẫn file mp4 đầu ra
+            duration: Thời lượng đoạn (giây)
+            fps: Frame rate nội bộ của đoạn
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        height, width = frame.shape[:2]
+        frames = max(int(round(duration * fps)), 1)
+        command = [
+            self.binary, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}",
+            "-framerate", str(fps),
+            "-i", "pipe:0",
+            "-vf", f"format=yuv420p,loop=loop={frames - 1}:size=1:start=0,setpts=N/{fps}/TB",
+            "-frames:v", str(frames),
+            "-an",
+            *self.video_codec_args(width, height, fps, gop=max(fps * 10, 1), still=True),
+            output_path,
+        ]
+        with RawVideoWriter(command) as writer:
+            writer.write(frame)
+        return output_path
+
+    def video_codec_args(self, width: int, height: int, fps: int, gop: int, still: bool = False) -> List[str]:
+        """
+        Tham số encode H.264 dùng chung cho mọi đoạn video
+        Args:
+            width, height: Kích thước khung hình
+            fps: Frame rate của đoạn
+            gop: Số frame giữa 2 keyframe (không vượt quá gopSeconds của profile)
+            still: Bật tune stillimage cho đoạn ảnh tĩnh
+        """
+        level = "5.1" if width * height > 1920 * 1080 else "4.2"
+        gop = min(gop, max(int(round(self.gop_seconds * fps)), 1))
+        args = [
+            "-c:v", "libx264",
+            "-preset", self.preset,
+            "-crf", str(self.crf),
+            "-pix_fmt", "yuv420p",
+            "-profile:v", "high",
+            "-level:v", level,
+            "-r", str(fps),
+            "-g", str(gop),
+            "-bf", "0",
+            "-video_track_timescale", "90000",
+        ]
+        if still:
+            args += ["-tune", "stillimage"]
+        return args
+
+    def keyframe_args(self, seconds: float) -> List[str]:
+        """Đặt keyframe theo thời gian (mỗi seconds giây), không phụ thuộc frame rate của nguồn"""
+        return ["-force_key_frames", f"expr:gte(t,n_forced*{seconds:g})"]
+
+    def passthrough_codec_args(self, width: int, height: int, keyframe_seconds: float) -> List[str]:
+        """
+        Tham số encode H.264 giữ nguyên thời điểm từng frame của nguồn.
+        Video render local có frame rate thay đổi (ảnh tĩnh encode ở frame rate thấp, transition ở frame rate đầu ra),
+        ép về frame rate trung bình sẽ làm transition và hiệu ứng chuyển động bị giật
+        Args:
+            width, height: Kích thước khung hình
+            keyframe_seconds: Khoảng cách giữa 2 keyframe (giây, không vượt quá gopSeconds của profile)
+        """
+        level = "5.1" if width * height > 1920 * 1080 else "4.2"
+        return [
+            "-c:v", "libx264",
+            "-preset", self.preset,
+            "-crf", str(self.crf),
+            "-pix_fmt", "yuv420p",
+            "-profile:v", "high",
+            "-level:v", level,
+            "-fps_mode", "passthrough",
+            # Time base mặc định của encoder theo frame rate trung bình, làm tròn lệch thời điểm frame
+            "-enc_time_base:v", "filter",
+            *self.keyframe_args(min(keyframe_seconds, self.gop_seconds)),
+            "-bf", "0",
+            "-video_track_timescale", "90000",
+        ]
+
+    def encode_still(self, image_path: str, output_path: str, duration: float,
+                     width: int, height: int, fps: int) -> str:
+        """
+        Encode một ảnh tĩnh thành đoạn video không có audio
+        Args:
+            image_path: Đường dẫn ảnh
+            output_path: Đường dẫn file mp4 đầu ra
+            duration: Thời lượng đoạn (giây)
+            width, height: Kích thước khung hình
+            fps: Frame rate nội bộ của đoạn (có thể thấp hơn frame rate đầu ra)
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        frames = max(int(round(duration * fps)), 1)
+        self.run([
+            "-i", image_path,
+            "-vf", self.still_filter(width, height, fps, frames),
+            "-frames:v", str(frames),
+            "-an",
+            *self.video_codec_args(width, height, fps, gop=max(fps * 10, 1), still=True),
+            output_path,
+        ])
+        return output_path
+
+    def encode_crossfade(self, image_a: str, image_b: str, output_path: str, duration: float,
+                         width: int, height: int, fps: int) -> str:
+        """
+        Encode đoạn crossfade giữa 2 ảnh tĩnh bằng filter xfade
+        Args:
+            image_a: Ảnh của segment trước
+            image_b: Ảnh của segment sau
+            output_path: Đường dẫn file mp4 đầu ra
+            duration: Thời lượng transition (giây)
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        frames = max(int(round(duration * fps)), 1)
+        source = self.still_filter(width, height, fps, frames)
+        self.run([
+            "-i", image_a,
+            "-i", image_b,
+            "-filter_complex",
+            f"[0:v]{source}[a];[1:v]{source}[b];"
+            f"[a][b]xfade=transition=fade:duration={frames / fps:.3f}:offset=0[v]",
+            "-map", "[v]",
+            "-frames:v", str(frames),
+            "-an",
+            *self.video_codec_args(width, height, fps, gop=fps),
+            output_path,
+        ])
+        return output_path
+
+    def open_rawvideo_writer(self, output_path: str, width: int, height: int, fps: int,
+                             pix_fmt: str = "bgr24") -> "RawVideoWriter":
+        """
+        Mở tiến trình ffmpeg nhận frame raw qua stdin và encode ra file mp4
+        Args:
+            output_path: Đường dẫn file mp4 đầu ra
+            width, height: Kích thước frame
+            fps: Frame rate
+            pix_fmt: Định dạng pixel của frame ghi vào pipe
+        Returns:
+            RawVideoWriter đã sẵn sàng nhận frame
+        """
+        command = [
+            self.binary, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo",
+            "-pix_fmt", pix_fmt,
+            "-s", f"{width}x{height}",
+            "-r", str(fps),
+            "-i", "pipe:0",
+            "-an",
+            "-vf", "format=yuv420p",
+            *self.video_codec_args(width, height, fps, gop=fps),
+            output_path,
+        ]
+        return RawVideoWriter(command)
+
+    def concat_copy(self, inputs: List[str], output_path: str) -> str:
+        """
+        Ghép các đoạn video bằng concat demuxer, không encode lại (stream copy)
+        Args:
+            inputs: Danh sách file mp4 cùng tham số codec
+            output_path: Đường dẫn file đầu ra
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        list_path = f"{output_path}.txt"
+        with open(list_path, "w", encoding="utf-8") as list_file:
+            for path in inputs:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+
+        try:
+            self.run([
+                "-f", "concat",
+                "-safe", "0",
+                "-i", list_path,
+                "-c", "copy",
+                "-movflags", "+faststart",
+                output_path,
+            ])
+        finally:
+            if os.path.exists(list_path):
+                os.remove(list_path)
+        return output_path
+
+    def mux_audio(self, video_path: str, audio_path: str, output_path: str,
+                  duration: Optional[float] = None) -> str:
+        """
+        Gắn audio vào video, giữ nguyên stream video (stream copy)
+        Args:
+            video_path: File video không có audio
+            audio_path: File audio
+            output_path: Đường dẫn file đầu ra
+            duration: Cắt đầu ra theo thời lượng này nếu có
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        args = [
+            "-i", video_path,
+            "-i", audio_path,
+            "-map", "0:v:0",
+            "-map", "1:a:0",
+            "-c:v", "copy",
+            "-c:a", "aac",
+            "-b:a", self.audio_bitrate,
+        ]
+        if duration:
+            args += ["-t", f"{duration:.3f}"]
+        args += ["-movflags", "+faststart", output_path]
+        self.run(args)
+        return output_path
+
+    def build_audio_track(self, audio_paths: List[str], durations: List[float], output_path: str,
+                          background_path: Optional[str] = None, background_volume: float = 0.2) -> str:
+        """
+        Ghép voice-over của các segment thành một track, mỗi đoạn được cắt/đệm đúng thời lượng segment
+        Args:
+            audio_paths: File audio của từng segment
+            durations: Thời lượng từng segment (giây)
+            output_path: File audio đầu ra (.m4a)
+            background_path: Nhạc nền lặp lại suốt video (nếu có)
+            background_volume: Âm lượng nhạc nền
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        args = []
+        for path in audio_paths:
+            args += ["-i", path]
+        filters = [
+            f"[{idx}:a]aresample=48000,aformat=channel_layouts=stereo,apad,atrim=0:{duration:.3f},asetpts=N/SR/TB[a{idx}]"
+            for idx, duration in enumerate(durations)
+        ]
+        labels = "".join(f"[a{idx}]" for idx in range(len(durations)))
+        filters.append(f"{labels}concat=n={len(durations)}:v=0:a=1[voice]")
+        output_label = "[voice]"
+        if background_path:
+            args += ["-stream_loop", "-1", "-i", background_path]
+            filters.append(f"[{len(audio_paths)}:a]aresample=48000,aformat=channel_layouts=stereo,"
+                           f"volume={background_volume}[bg]")
+            filters.append("[voice][bg]amix=inputs=2:duration=first:dropout_transition=0:normalize=0[mix]")
+            output_label = "[mix]"
+
+        args += [
+            "-filter_complex", ";".join(filters),
+            "-map", output_label,
+            "-c:a", "aac",
+            "-b:a", self.audio_bitrate,
+            output_path,
+        ]
+        self.run(args)
+        return output_path
+
+    def probe_video(self, path: str) -> Dict[str, Any]:
+        """
+        Đọc thông tin cơ bản của file video từ output của ffmpeg -i (không cần ffprobe)
+        Args:
+            path: File video
+        Returns:
+            Dict gồm width, height, fps, duration (giây), hasAudio và tham số codec dùng để so khớp khi ghép
+            (videoCodec, profile, pixelFormat, timescale, audioCodec, sampleRate, channels)
+        """
+        result = subprocess.run([self.binary, "-hide_banner", "-i", path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = result.stderr.decode("utf-8", errors="ignore")
+        video = re.search(r"Stream #\S+.*?Video:.*?(\d{2,5})x(\d{2,5})", output)
+        if not video:
+            raise Exception(f"Không đọc được stream video của {path}")
+        video_line = re.search(r"Stream #\S+.*?Video: (.*)", output).group(1)
+        audio_line = re.search(r"Stream #\S+.*?Audio: (.*)", output)
+        audio_line = audio_line.group(1) if audio_line else ""
+        fps = re.search(r"Stream #\S+.*?Video:.*?([\d.]+) fps", output)
+        duration = re.search(r"Duration: (\d+):(\d+):([\d.]+)", output)
+        profile = re.match(r"\w+ \(([^)]+)\)", video_line)
+        pixel_format = re.search(r", (yuv\w+|yuvj\w+|nv12|gray\w*|rgb\w+)", video_line)
+        timescale = re.search(r"([\d.]+)(k?) tbn", video_line)
+        sample_rate = re.search(r"(\d+) Hz", audio_line)
+        channels = re.search(r"Hz, ([^,]+),", audio_line)
+        return {
+            "width": int(video.group(1)),
+            "height": int(video.group(2)),
+            "fps": float(fps.group(1)) if fps else 30.0,
+            "duration": (int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3)))
+            if duration else 0.0,
+            "hasAudio": bool(audio_line),
+            "videoCodec": video_line.split(" ")[0],
+            "profile": profile.group(1) if profile else None,
+            "pixelFormat": pixel_format.group(1) if pixel_format else None,
+            "timescale": int(float(timescale.group(1)) * (1000 if timescale.group(2) else 1)) if timescale else None,
+            "audioCodec": audio_line.split(" ")[0] if audio_line else None,
+            "sampleRate": int(sample_rate.group(1)) if sample_rate else None,
+            "channels": channels.group(1).strip() if channels else None,
+        }
+
+    def keyframe_times(self, path: str) -> List[float]:
+        """
+        Thời điểm (giây, theo pts) các packet keyframe (sync sample) của stream video,
+        đọc cờ key của packet bằng stream copy nên không cần decode
+        Args:
+            path: File video
+        Returns:
+            Danh sách thời điểm tăng dần
+        """
+        result = subprocess.run(
+            [self.binary, "-hide_banner", "-loglevel", "error", "-i", path,
+             "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            error = result.stderr.decode("utf-8", errors="ignore").strip()
+            raise Exception(f"Lỗi khi chạy ffmpeg: {error[-500:]}")
+        output = result.stdout.decode("utf-8", errors="ignore")
+        time_base = re.search(r"^#tb 0: (\d+)/(\d+)", output, re.MULTILINE)
+        scale = int(time_base.group(1)) / int(time_base.group(2)) if time_base else 1.0
+        times = []
+        for line in output.splitlines():
+            fields = [field.strip() for field in line.split(",")]
+            # Packet keyframe không có cột cờ F=...
+            if line.startswith("#") or len(fields) < 6 or any(field.startswith("F=") for field in fields):
+                continue
+            times.append(int(fields[2]) * scale)
+        return sorted(times)
+
+    def decode_audio(self, path: str, sample_rate: int = 48000, duration: Optional[float] = None) -> np.ndarray:
+        """
+        Decode file audio thành mảng PCM float32 stereo
+        Args:
+            path: File audio
+            sample_rate: Sample rate đầu ra
+            duration: Chỉ decode tối đa chừng này giây (nếu có)
+        Returns:
+            Mảng numpy (N, 2) float32 trong khoảng [-1, 1]
+        """
+        command = [self.binary, "-hide_banner", "-loglevel", "error", "-i", path, "-vn"]
+        if duration:
+            command += ["-t", f"{duration:.3f}"]
+        command += ["-f", "f32le", "-ac", "2", "-ar", str(sample_rate), "pipe:1"]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            error = result.stderr.decode("utf-8", errors="ignore").strip()
+            raise Exception(f"Lỗi khi chạy ffmpeg: {error[-500:]}")
+        return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, 2)
+
+    def encode_audio(self, samples: np.ndarray, sample_rate: int, output_path: str,
+                     bitrate: Optional[str] = None) -> str:
+        """
+        Encode mảng PCM float32 stereo thành file AAC (.m4a)
+        Args:
+            samples: Mảng numpy (N, 2) float32
+            sample_rate: Sample rate của samples
+            output_path: File đầu ra
+            bitrate: Bitrate AAC, mặc định theo profile
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        command = [
+            self.binary, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "f32le", "-ac", "2", "-ar", str(sample_rate), "-i", "pipe:0",
+            "-c:a", "aac", "-b:a", bitrate or self.audio_bitrate, "-movflags", "+faststart",
+            output_path,
+        ]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, error = process.communicate(memoryview(np.ascontiguousarray(samples, dtype=np.float32)).cast("B"))
+        if process.returncode != 0:
+            error = error.decode("utf-8", errors="ignore").strip()
+            raise Exception(f"Lỗi khi chạy ffmpeg: {error[-500:]}")
+        return output_path
+
+
+class RawVideoWriter:
+    """Pipe frame raw (mảng numpy uint8) vào stdin của ffmpeg"""
+
+    def __init__(self, command: List[str]):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frames) -> None:
+        """
+        Ghi một frame (H, W, C) hoặc một khối frame (N, H, W, C) vào pipe mà không tạo bản sao bytes
+        """
+        self.process.stdin.write(memoryview(frames).cast("B"))
+
+    def close(self) -> None:
+        """Đóng pipe, chờ ffmpeg encode xong và báo lỗi nếu có"""
+        self.process.stdin.close()
+        error = self.process.stderr.read().decode("utf-8", errors="ignore").strip()
+        if self.process.wait() != 0:
+            raise Exception(f"Lỗi khi chạy ffmpeg: {error[-500:]}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.process.kill()
+            self.process.wait()
@@ -0,0 +1,145 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Callable, Optional
+import numpy as np
+from service.ffmpeg_service import RawVideoWriter
+
+
+class FrameRing:
+    """
+    Vòng buffer frame cấp phát sẵn (slots, H, W, C) uint8.
+    Khi shared=True, buffer nằm trên shared memory để tiến trình worker ghi trực tiếp vào,
+    tiến trình cha chỉ việc đưa view của slot vào pipe ffmpeg, không có bản sao trung gian.
+    """
+
+    def __init__(self, slots: int, width: int, height: int, channels: int = 3,
+                 shared: bool = False, name: Optional[str] = None):
+        self.shape = (slots, height, width, channels)
+        self.shm = None
+        self._owner = False
+        size = int(np.prod(self.shape))
+        if shared or name:
+            if name:
+                self.shm = shared_memory.SharedMemory(name=name)
+            else:
+                self.shm = shared_memory.SharedMemory(create=True, size=size)
+                self._owner = True
+            self.buffer = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        else:
+            self.buffer = np.empty(self.shape, dtype=np.uint8)
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.shm.name if self.shm else None
+
+    @property
+    def slots(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, slot: int) -> np.ndarray:
+        return self.buffer[slot]
+
+    def close(self) -> None:
+        """Giải phóng shared memory (tiến trình tạo ra ring sẽ unlink)"""
+        if self.shm:
+            self.buffer = None
+            self.shm.close()
+            if self._owner:
+                self.shm.unlink()
+            self.shm = None
+
+
+def _frame_worker(ring_name: str, shape, render_frame, free_slots, tasks, done) -> None:
+    """
+    Vòng lặp của tiến trình worker: giữ một slot trống trước rồi mới nhận frame cần render,
+    nên frame nào đã được giao cũng luôn có slot và tiến trình cha không bao giờ bị kẹt.
+    """
+    ring = FrameRing(shape[0], shape[2], shape[1], shape[3], name=ring_name)
+    try:
+        while True:
+            slot = free_slots.get()
+            index = tasks.get()
+            if index is None:
+                free_slots.put(slot)
+                break
+            render_frame(index, ring[slot])
+            done.put((index, slot))
+    finally:
+        ring.close()
+
+
+class ParallelFrameRenderer:
+    """
+    Render frame song song bằng nhiều tiến trình worker ghi vào FrameRing trên shared memory,
+    tiến trình cha ghi các slot theo đúng thứ tự frame vào pipe rawvideo của ffmpeg.
+    """
+
+    def __init__(self, workers: int = 2, slots: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.slots = slots or self.workers * 2
+
+    def render(self, render_frame: Callable[[int, np.ndarray], None], num_frames: int,
+               width: int, height: int, writer: RawVideoWriter) -> None:
+        """
+        Args:
+            render_frame: Callable pickle được, ghi frame thứ index vào mảng out (H, W, 3)
+            num_frames: Tổng số frame
+            width, height: Kích thước frame
+            writer: Pipe ffmpeg nhận frame
+        """
+        ring = FrameRing(self.slots, width, height, shared=True)
+        free_slots, tasks, done = mp.Queue(), mp.Queue(), mp.Queue()
+        for slot in range(ring.slots):
+            free_slots.put(slot)
+        for index in range(num_frames):
+            tasks.put(index)
+        for _ in range(self.workers):
+            tasks.put(None)
+
+        processes = [
+            mp.Process(target=_frame_worker,
+                       args=(ring.name, ring.shape, render_frame, free_slots, tasks, done),
+                       daemon=True)
+            for _ in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            pending = {}
+            next_index = 0
+            while next_index < num_frames:
+                index, slot = done.get(timeout=120)
+                pending[index] = slot
+                # Ghi liên tiếp các frame đã sẵn sàng theo đúng thứ tự
+                while next_index in pending:
+                    slot = pending.pop(next_index)
+                    writer.write(ring[slot])
+                    free_slots.put(slot)
+                    next_index += 1
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            ring.close()
+
+
+def stream_frames(render_frame: Callable[[int, np.ndarray], None], num_frames: int,
+                  width: int, height: int, writer: RawVideoWriter, workers: int = 0,
+                  slots: int = 4) -> None:
+    """
+    Sinh và ghi frame vào pipe ffmpeg.
+    workers = 0: render tuần tự trong tiến trình hiện tại trên ring cấp phát sẵn
+    workers > 0: dùng ParallelFrameRenderer với shared memory
+    """
+    if workers > 0:
+        ParallelFrameRenderer(workers, slots).render(render_frame, num_frames, width, height, writer)
+        return
+
+    ring = FrameRing(slots, width, height)
+    for index in range(num_frames):
+        frame = ring[index % ring.slots]
+        render_frame(index, frame)
+        writer.write(frame)
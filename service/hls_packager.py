@@ -0,0 +1,168 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, Optional
+from config.cloudinary import CloudinaryConfig
+from config.render_config import HLS_LADDER, HLS_SEGMENT_SECONDS, HLS_UPLOAD_CONCURRENCY
+from service.ffmpeg_service import FFmpegService
+
+
+class HLSPackager:
+    """
+    Đóng gói video đã render thành HLS nhiều mức bitrate (ví dụ 1080/720/480).
+    Video được decode một lần, tách (split) cho từng mức rồi encode song song trong cùng một tiến trình ffmpeg,
+    keyframe của mọi mức trùng nhau theo độ dài segment để player chuyển mức mượt.
+    Các segment được upload song song lên Cloudinary (resource raw), playlist được viết lại với URL tuyệt đối
+    nên không phụ thuộc cách Cloudinary đặt version trong URL.
+    """
+
+    def __init__(self, ladder: Optional[List[Tuple[int, str]]] = None, segment_seconds: int = HLS_SEGMENT_SECONDS,
+                 upload_concurrency: int = HLS_UPLOAD_CONCURRENCY):
+        self.ladder = ladder or HLS_LADDER
+        self.segment_seconds = segment_seconds
+        self.upload_concurrency = upload_concurrency
+        self.ffmpeg = FFmpegService()
+
+    def renditions(self, width: int, height: int) -> List[Tuple[int, str]]:
+        """Các mức của ladder không lớn hơn video gốc (luôn giữ ít nhất mức nhỏ nhất)"""
+        short_side = min(width, height)
+        rungs = sorted((rung for rung in self.ladder if rung[0] <= short_side), reverse=True)
+        return rungs or [min(self.ladder)]
+
+    def package(self, input_path: str, output_dir: str, info: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Transcode và cắt video thành HLS
+        Args:
+            input_path: File mp4 đã render
+            output_dir: Thư mục chứa master.m3u8 và thư mục con v0, v1, ... của từng mức
+            info: Thông tin video từ FFmpegService.probe_video (đọc lại nếu không có)
+        Returns:
+            Đường dẫn master playlist
+        """
+        info = info or self.ffmpeg.probe_video(input_path)
+        rungs = self.renditions(info["width"], info["height"])
+        landscape = info["width"] >= info["height"]
+
+        labels = "".join(f"[s{idx}]" for idx in range(len(rungs)))
+        filters = [f"[0:v]split={len(rungs)}{labels}"]
+        args = ["-i", input_path]
+        stream_map = []
+        for idx, (short_side, bitrate) in enumerate(rungs):
+            scale = f"scale=-2:{short_side}" if landscape else f"scale={short_side}:-2"
+            filters.append(f"[s{idx}]{scale},setsar=1,format=yuv420p[v{idx}]")
+            rate = int(bitrate.rstrip("kK"))
+            args += [
+                "-map", f"[v{idx}]",
+                f"-c:v:{idx}", "libx264",
+                f"-b:v:{idx}", bitrate,
+                f"-maxrate:v:{idx}", f"{int(rate * 1.07)}k",
+                f"-bufsize:v:{idx}", f"{int(rate * 1.5)}k",
+            ]
+            if info["hasAudio"]:
+                args += ["-map", "0:a:0", f"-c:a:{idx}", "aac", f"-b:a:{idx}", "128k"]
+                stream_map.append(f"v:{idx},a:{idx}")
+            else:
+                stream_map.append(f"v:{idx}")
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.ffmpeg.run([
+            *args[:2],
+            "-filter_complex", ";".join(filters),
+            *args[2:],
+            "-preset", self.ffmpeg.preset,
+            "-profile:v", "high",
+            # Video render local có frame rate thay đổi: giữ thời điểm từng frame và đặt keyframe theo thời gian
+            # (không theo số frame) để keyframe rơi đúng ranh giới segment và thẳng hàng giữa các mức
+            "-fps_mode", "passthrough",
+            "-enc_time_base:v", "filter",
+            *self.ffmpeg.keyframe_args(self.segment_seconds),
+            "-sc_threshold", "0",
+            "-f", "hls",
+            "-hls_time", str(self.segment_seconds),
+            "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(output_dir, "v%v", "seg_%03d.ts"),
+            "-master_pl_name", "master.m3u8",
+            "-var_stream_map", " ".join(stream_map),
+            os.path.join(output_dir, "v%v", "index.m3u8"),
+        ])
+        return os.path.join(output_dir, "master.m3u8")
+
+    def _upload(self, path: str, folder: str, public_id: str) -> str:
+        result = CloudinaryConfig().upload_file(path, folder=folder, resource_type="raw", public_id=public_id)
+        return result["secure_url"]
+
+    def _rewrite(self, playlist_path: str, urls: Dict[str, str]) -> None:
+        """Thay đường dẫn tương đối trong playlist bằng URL đã upload"""
+        with open(playlist_path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        lines = [urls.get(line.strip(), line) if line and not line.startswith("#") else line for line in lines]
+        with open(playlist_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def publish(self, output_dir: str, folder: str) -> str:
+        """
+        Upload toàn bộ HLS lên Cloudinary: segment song song, rồi playlist từng mức, cuối cùng là master
+        Args:
+            output_dir: Thư mục do package tạo
+            folder: Thư mục trên Cloudinary
+        Returns:
+            URL của master playlist
+        """
+        variants = sorted(
+            name for name in os.listdir(output_dir) if os.path.isdir(os.path.join(output_dir, name))
+        )
+        segments = [
+            (variant, name) for variant in variants
+            for name in sorted(os.listdir(os.path.join(output_dir, variant))) if name.endswith(".ts")
+        ]
+
+        with ThreadPoolExecutor(max_workers=self.upload_concurrency) as executor:
+            segment_urls = list(executor.map(
+                lambda item: self._upload(os.path.join(output_dir, *item), folder, "/".join(item)),
+                segments
+            ))
+            by_variant: Dict[str, Dict[str, str]] = {}
+            for (variant, name), url in zip(segments, segment_urls):
+                by_variant.setdefault(variant, {})[name] = url
+
+            for variant in variants:
+                self._rewrite(os.path.join(output_dir, variant, "index.m3u8"), by_variant.get(variant, {}))
+            playlist_urls = list(executor.map(
+                lambda variant: self._upload(
+                    os.path.join(output_dir, variant, "index.m3u8"), folder, f"{variant}/index.m3u8"
+                ),
+                variants
+            ))
+
+        self._rewrite(
+            os.path.join(output_dir, "master.m3u8"),
+            {f"{variant}/index.m3u8": url for variant, url in zip(variants, playlist_urls)}
+        )
+        return self._upload(os.path.join(output_dir, "master.m3u8"), folder, "master.m3u8")
+
+    def package_and_publish(self, input_path: str, work_dir: str, video_id: str) -> Dict[str, Any]:
+        """
+        Đóng gói HLS và upload lên Cloudinary
+        Args:
+            input_path: File mp4 đã render
+            work_dir: Thư mục tạm chứa file HLS
+            video_id: ID của video
+        Returns:
+            Dict gồm "url" (master playlist) và "renditions" (cạnh ngắn của từng mức)
+        """
+        try:
+            # Thư mục trên Cloudinary theo nội dung video, render lại sau khi sửa không ghi đè bản cũ
+            digest = hashlib.sha256()
+            with open(input_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            info = self.ffmpeg.probe_video(input_path)
+            master_path = self.package(input_path, work_dir, info)
+            url = self.publish(os.path.dirname(master_path), f"videos/{video_id}/hls/{digest.hexdigest()[:16]}")
+            return {
+                "url": url,
+                "renditions": [rung for rung, _ in self.renditions(info["width"], info["height"])],
+            }
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi đóng gói HLS: {str(e)}")
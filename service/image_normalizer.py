@@ -0,0 +1,214 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+from PIL import Image, ImageOps
+from config.cloudinary import CloudinaryConfig
+from config.render_config import (
+    IMAGE_NORMALIZE_DIR,
+    IMAGE_NORMALIZE_FORMAT,
+    IMAGE_NORMALIZE_QUALITY,
+    IMAGE_NORMALIZE_WORKERS,
+    get_frame_size,
+)
+from service.asset_cache import AssetCache
+
+# Tăng khi thay đổi cách resize/encode để cache cũ không còn được dùng
+NORMALIZE_VERSION = 2
+
+EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+# Giá trị EXIF Orientation (tag 0x0112) xoay ảnh 90/270 độ: chiều rộng và chiều cao lưu trong file bị đổi chỗ
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def normalize_image(source_path: str, output_path: str, width: int, height: int,
+                    image_format: str = IMAGE_NORMALIZE_FORMAT, quality: int = IMAGE_NORMALIZE_QUALITY) -> Dict[str, Any]:
+    """
+    Cắt ảnh theo tỷ lệ khung hình (cover, căn giữa) và thu nhỏ về width x height rồi encode lại.
+    Ảnh nhỏ hơn khung hình chỉ được cắt, không phóng to (renderer sẽ scale).
+    Chạy trong tiến trình worker nên chỉ nhận và trả về dữ liệu đơn giản.
+    Args:
+        source_path: Ảnh gốc
+        output_path: File ảnh đầu ra
+        width, height: Kích thước khung hình video
+        image_format: "jpeg", "webp" hoặc "png"
+        quality: Chất lượng encode (jpeg/webp)
+    Returns:
+        Dict gồm kích thước gốc, kích thước mới và dung lượng file đầu ra
+    """
+    with Image.open(source_path) as image:
+        original_size = image.size
+        # JPEG có thể decode ở độ phân giải thấp hơn (1/2, 1/4, 1/8), giảm đáng kể thời gian decode ảnh lớn
+        if image.format == "JPEG":
+            # draft tính theo chiều của dữ liệu lưu trong file, trước khi xoay theo EXIF
+            if image.getexif().get(0x0112, 1) in TRANSPOSED_ORIENTATIONS:
+                image.draft("RGB", (height, width))
+            else:
+                image.draft("RGB", (width, height))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (0, 0, 0))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        # Vùng cắt lớn nhất có đúng tỷ lệ width:height, căn giữa
+        source_width, source_height = image.size
+        scale = max(width / source_width, height / source_height)
+        crop_width, crop_height = width / scale, height / scale
+        left = (source_width - crop_width) / 2
+        top = (source_height - crop_height) / 2
+        box = (left, top, left + crop_width, top + crop_height)
+        if scale < 1:
+            size = (width, height)
+        else:
+            size = (max(int(crop_width), 1), max(int(crop_height), 1))
+        image = image.resize(size, Image.LANCZOS, box=box, reducing_gap=3.0)
+
+        options = {"quality": quality}
+        if image_format == "jpeg":
+            options.update(optimize=True, progressive=True, subsampling="4:2:0")
+        elif image_format == "webp":
+            options.update(method=4)
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        image.save(tmp_path, format=image_format.upper(), **options)
+        os.replace(tmp_path, output_path)
+
+    return {
+        "originalSize": list(original_size),
+        "size": list(size),
+        "bytes": os.path.getsize(output_path),
+    }
+
+
+class ImageNormalizer:
+    """
+    Chuẩn hóa ảnh segment trước khi render: cover-fit về đúng resolution/aspectRatio của video,
+    encode lại sang định dạng gọn hơn rồi upload lên Cloudinary và thay URL ảnh trong segment.
+    Ảnh được resize song song trong process pool. Kết quả được cache theo hash nội dung ảnh gốc
+    và kích thước đích (file đã chuẩn hóa và URL đã upload), nên cùng một ảnh chỉ xử lý và upload một lần.
+    """
+
+    def __init__(self, cache_dir: str = IMAGE_NORMALIZE_DIR, image_format: str = IMAGE_NORMALIZE_FORMAT,
+                 quality: int = IMAGE_NORMALIZE_QUALITY, max_workers: int = IMAGE_NORMALIZE_WORKERS,
+                 assets: Optional[AssetCache] = None, folder: str = "normalized_images"):
+        if image_format not in EXTENSIONS:
+            raise ValueError(f"Định dạng ảnh không hỗ trợ: {image_format}")
+        self.cache_dir = cache_dir
+        self.image_format = image_format
+        self.quality = quality
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.assets = assets or AssetCache()
+        self.folder = folder
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._uploaded: Dict[str, str] = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Process pool resize ảnh, chỉ khởi tạo khi cần"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def cache_key(self, source_path: str, width: int, height: int) -> str:
+        """Hash nội dung ảnh gốc cùng kích thước và tham số encode"""
+        digest = hashlib.sha256()
+        with open(source_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest.update(f"{width}x{height}:{self.image_format}:{self.quality}:v{NORMALIZE_VERSION}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _paths(self, key: str):
+        directory = os.path.join(self.cache_dir, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        return (os.path.join(directory, key + EXTENSIONS[self.image_format]),
+                os.path.join(directory, f"{key}-meta.json"))
+
+    def _read_meta(self, meta_path: str) -> Dict[str, Any]:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, meta_path: str, meta: Dict[str, Any]) -> None:
+        tmp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    async def normalize(self, url: str, width: int, height: int) -> str:
+        """
+        Chuẩn hóa một ảnh
+        Args:
+            url: URL ảnh gốc
+            width, height: Kích thước khung hình video
+        Returns:
+            URL ảnh đã chuẩn hóa trên Cloudinary, hoặc URL gốc nếu ảnh gốc đã đủ gọn
+        """
+        source_path = await asyncio.to_thread(self.assets.get, url)
+        key = await asyncio.to_thread(self.cache_key, source_path, width, height)
+        if key in self._uploaded:
+            return self._uploaded[key] or url
+
+        output_path, meta_path = self._paths(key)
+        meta = self._read_meta(meta_path)
+        if "url" not in meta:
+            if not os.path.exists(output_path) or "bytes" not in meta:
+                loop = asyncio.get_running_loop()
+                meta = await loop.run_in_executor(
+                    self.executor, normalize_image, source_path, output_path, width, height,
+                    self.image_format, self.quality
+                )
+
+            # Ảnh gốc đã nhỏ hơn khung hình và nhẹ hơn bản encode lại thì giữ nguyên
+            original_bytes = os.path.getsize(source_path)
+            if meta["originalSize"] == meta["size"] and original_bytes <= meta["bytes"]:
+                meta["url"] = None
+            else:
+                result = await asyncio.to_thread(
+                    CloudinaryConfig().upload_file,
+                    output_path,
+                    folder=self.folder,
+                    resource_type="image",
+                    public_id=key,
+                )
+                meta["url"] = result["secure_url"]
+            meta["originalBytes"] = original_bytes
+            await asyncio.to_thread(self._write_meta, meta_path, meta)
+
+        self._uploaded[key] = meta["url"]
+        return meta["url"] or url
+
+    async def normalize_segments(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Chuẩn hóa ảnh của mọi segment và trả về segment với URL ảnh mới.
+        Ảnh lỗi khi chuẩn hóa được giữ URL gốc để không làm hỏng lần render.
+        Args:
+            data: Dữ liệu tạo video (segments, resolution, aspectRatio)
+        Returns:
+            Danh sách segment đã thay URL ảnh
+        """
+        width, height = get_frame_size(data.get("resolution", "1080"), data.get("aspectRatio", "16:9"))
+        segments = data.get("segments", [])
+        urls = list(dict.fromkeys(segment["image"] for segment in segments))
+
+        async def normalize(url: str) -> str:
+            try:
+                return await self.normalize(url, width, height)
+            except Exception as e:
+                print(f"⚠️ Không thể chuẩn hóa ảnh {url}: {str(e)}")
+                return url
+
+        normalized = dict(zip(urls, await asyncio.gather(*(normalize(url) for url in urls))))
+        return [{**segment, "image": normalized[segment["image"]]} for segment in segments]
@@ -0,0 +1,173 @@
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
+import cv2
+import numpy as np
+from service.ffmpeg_service import FFmpegService
+from service.vid_transition_func import DEFAULT_CHUNK_SIZE
+from service.frame_pipe import stream_frames
+from service.subtitle_rasterizer import CaptionedFrameSource
+
+# Các hàm easing vector hóa, nhận và trả về mảng tiến độ trong [0, 1]
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: 1 - (1 - t) * (1 - t),
+    "ease_in_out": lambda t: t * t * (3 - 2 * t),
+}
+
+# Preset chuyển động: zoom đầu/cuối và tâm khung cắt đầu/cuối (tỷ lệ theo kích thước ảnh)
+MOTION_PRESETS = {
+    "zoom_in": {"zoom": [1.0, 1.2], "center": [[0.5, 0.5], [0.5, 0.5]]},
+    "zoom_out": {"zoom": [1.2, 1.0], "center": [[0.5, 0.5], [0.5, 0.5]]},
+    "pan_left": {"zoom": [1.15, 1.15], "center": [[0.6, 0.5], [0.4, 0.5]]},
+    "pan_right": {"zoom": [1.15, 1.15], "center": [[0.4, 0.5], [0.6, 0.5]]},
+    "pan_up": {"zoom": [1.15, 1.15], "center": [[0.5, 0.6], [0.5, 0.4]]},
+    "pan_down": {"zoom": [1.15, 1.15], "center": [[0.5, 0.4], [0.5, 0.6]]},
+}
+
+
+class KenBurnsFrameSource:
+    """Callable pickle được, ghi frame thứ index của segment vào buffer cho trước (dùng được trong worker)"""
+
+    def __init__(self, source: np.ndarray, matrices: np.ndarray, width: int, height: int):
+        self.source = source
+        self.matrices = matrices
+        self.size = (width, height)
+
+    def __call__(self, index: int, out: np.ndarray) -> None:
+        cv2.warpAffine(
+            self.source,
+            self.matrices[index],
+            self.size,
+            dst=out,
+            flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_REPLICATE,
+        )
+
+
+class KenBurnsEffect:
+    """
+    Hiệu ứng Ken Burns (pan/zoom) cho segment ảnh tĩnh.
+    Quỹ đạo khung cắt của cả segment được tính trước bằng NumPy,
+    frame được sinh theo khối bằng cv2.warpAffine trên buffer cấp phát sẵn rồi pipe thẳng vào ffmpeg.
+    """
+
+    def __init__(self, motion: Union[str, Dict[str, Any]], easing: str = "ease_in_out"):
+        if isinstance(motion, str):
+            if motion not in MOTION_PRESETS:
+                raise ValueError(f"Motion không hợp lệ: {motion}")
+            motion = MOTION_PRESETS[motion]
+        self.zoom = [float(value) for value in motion["zoom"]]
+        self.center = [[float(value) for value in point] for point in motion["center"]]
+        self.easing = motion.get("easing", easing)
+        if self.easing not in EASINGS:
+            raise ValueError(f"Easing không hợp lệ: {self.easing}")
+        if min(self.zoom) < 1:
+            raise ValueError("Zoom phải lớn hơn hoặc bằng 1")
+
+    def prepare_source(self, image: np.ndarray, width: int, height: int) -> np.ndarray:
+        """
+        Resize ảnh một lần về kích thước cover của khung hình nhân với zoom lớn nhất,
+        để warpAffine chỉ còn thu nhỏ tối đa theo hệ số zoom (nội suy tuyến tính vẫn đủ nét)
+        """
+        src_h, src_w = image.shape[:2]
+        ratio = max(width / src_w, height / src_h) * max(self.zoom)
+        if abs(ratio - 1.0) < 1e-3:
+            return image
+        interpolation = cv2.INTER_AREA if ratio < 1 else cv2.INTER_CUBIC
+        size = (max(1, round(src_w * ratio)), max(1, round(src_h * ratio)))
+        return cv2.resize(image, size, interpolation=interpolation)
+
+    def trajectory(self, num_frames: int, src_w: int, src_h: int, width: int, height: int,
+                   start: float = 0.0, end: float = 1.0) -> np.ndarray:
+        """
+        Tính ma trận affine cho mọi frame của segment
+        Args:
+            num_frames: Số frame cần sinh
+            src_w, src_h: Kích thước ảnh nguồn
+            width, height: Kích thước khung hình đầu ra
+            start, end: Khoảng tiến độ chuyển động (0..1) mà các frame này phủ
+        Returns:
+            Mảng (num_frames, 2, 3) cho cv2.warpAffine
+        """
+        t = start + (end - start) * (np.arange(num_frames) + 0.5) / max(num_frames, 1)
+        progress = EASINGS[self.easing](np.clip(t, 0, 1))
+
+        zoom = self.zoom[0] + (self.zoom[1] - self.zoom[0]) * progress
+        center_x = self.center[0][0] + (self.center[1][0] - self.center[0][0]) * progress
+        center_y = self.center[0][1] + (self.center[1][1] - self.center[0][1]) * progress
+
+        # Khung cắt lớn nhất có tỷ lệ của đầu ra nằm gọn trong ảnh nguồn, thu nhỏ theo zoom
+        base = min(src_w / width, src_h / height)
+        crop_w = width * base / zoom
+        crop_h = height * base / zoom
+        crop_x = np.clip(center_x * src_w - crop_w / 2, 0, src_w - crop_w)
+        crop_y = np.clip(center_y * src_h - crop_h / 2, 0, src_h - crop_h)
+
+        # Tọa độ thực (sub-pixel) của khung cắt được giữ nguyên trong ma trận
+        scale = width / crop_w
+        matrices = np.zeros((num_frames, 2, 3))
+        matrices[:, 0, 0] = scale
+        matrices[:, 0, 2] = -crop_x * scale
+        matrices[:, 1, 1] = scale
+        matrices[:, 1, 2] = -crop_y * scale
+        return matrices
+
+    def frame_source(self, image: np.ndarray, num_frames: int, width: int, height: int,
+                     start: float = 0.0, end: float = 1.0) -> KenBurnsFrameSource:
+        """Chuẩn bị ảnh nguồn và quỹ đạo, trả về callable sinh từng frame"""
+        source = self.prepare_source(image, width, height)
+        src_h, src_w = source.shape[:2]
+        matrices = self.trajectory(num_frames, src_w, src_h, width, height, start, end)
+        return KenBurnsFrameSource(source, matrices, width, height)
+
+    def iter_chunks(self, image: np.ndarray, num_frames: int, width: int, height: int,
+                    start: float = 0.0, end: float = 1.0, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    buffer: Optional[np.ndarray] = None) -> Iterator[np.ndarray]:
+        """
+        Sinh các khối frame của segment trên một buffer cấp phát sẵn
+        Yields:
+            View (n, H, W, 3) trên buffer, chỉ hợp lệ tới lần yield tiếp theo
+        """
+        render_frame = self.frame_source(image, num_frames, width, height, start, end)
+        if buffer is None:
+            buffer = np.empty((chunk_size, height, width, 3), dtype=np.uint8)
+        chunk_size = buffer.shape[0]
+
+        for first in range(0, num_frames, chunk_size):
+            count = min(chunk_size, num_frames - first)
+            chunk = buffer[:count]
+            for offset in range(count):
+                render_frame(first + offset, chunk[offset])
+            yield chunk
+
+    def frame_at(self, image: np.ndarray, width: int, height: int, progress: float) -> np.ndarray:
+        """Frame tại một thời điểm (tiến độ 0..1), dùng làm ảnh đầu/cuối cho transition"""
+        chunk = next(self.iter_chunks(image, 1, width, height, progress, progress, chunk_size=1))
+        return chunk[0].copy()
+
+    def write_segment(self, image: np.ndarray, output_path: str, duration: float, width: int, height: int,
+                      fps: int = 30, start: float = 0.0, end: float = 1.0,
+                      ffmpeg: Optional[FFmpegService] = None, workers: int = 0,
+                      caption: Optional[Tuple[np.ndarray, int, int]] = None) -> str:
+        """
+        Render segment có chuyển động và ghi thẳng vào pipe của encoder
+        Args:
+            image: Ảnh nguồn BGR
+            output_path: Đường dẫn file mp4 đầu ra
+            duration: Thời lượng đoạn (giây)
+            width, height: Kích thước khung hình
+            fps: Frame rate
+            start, end: Khoảng tiến độ chuyển động mà đoạn này phủ
+            workers: Số tiến trình worker sinh frame (0 = sinh tuần tự trong tiến trình hiện tại)
+            caption: (bitmap BGRA, x, y) của SubtitleRasterizer, vẽ lên mọi frame nếu có
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        num_frames = max(int(round(duration * fps)), 1)
+        ffmpeg = ffmpeg or FFmpegService()
+        render_frame = self.frame_source(image, num_frames, width, height, start, end)
+        if caption:
+            render_frame = CaptionedFrameSource(render_frame, *caption)
+        with ffmpeg.open_rawvideo_writer(output_path, width, height, fps) as writer:
+            stream_frames(render_frame, num_frames, width, height, writer, workers=workers)
+        return output_path
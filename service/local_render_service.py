@@ -0,0 +1,343 @@
+import os
+import json
+import hashlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+import numpy as np
+from config.render_config import (
+    RENDER_CACHE_DIR,
+    DEFAULT_FPS,
+    STILL_FPS,
+    DEFAULT_TRANSITION_DURATION,
+    FRAME_WORKERS,
+    get_frame_size,
+)
+from service.ffmpeg_service import FFmpegService
+from service.vid_transition_func import ANIMATIONS, load_frame, read_image, write_transition
+from service.ken_burns_effect import KenBurnsEffect
+from service.subtitle_rasterizer import SubtitleRasterizer
+from service.asset_cache import AssetCache
+from service.timeline_optimizer import TimelineOptimizer
+from service.caption_builder import CaptionBuilder
+
+# Các trường của segment ảnh hưởng tới hình ảnh của video
+VIDEO_FIELDS = ("image", "duration", "motion", "caption")
+
+
+class LocalRenderService:
+    """
+    Renderer local cho video dạng ảnh tĩnh + voice-over.
+    Mỗi segment ảnh tĩnh chỉ được encode một lần (frame rate nội bộ thấp, tune stillimage) và được cache,
+    chỉ các đoạn transition ngắn được encode ở frame rate đầy đủ,
+    sau đó tất cả được ghép bằng concat demuxer với stream copy.
+    """
+
+    def __init__(self, cache_dir: str = RENDER_CACHE_DIR, fps: int = DEFAULT_FPS,
+                 still_fps: int = STILL_FPS, max_workers: Optional[int] = None,
+                 frame_workers: int = FRAME_WORKERS, rasterizer: Optional[SubtitleRasterizer] = None,
+                 assets: Optional[AssetCache] = None, ffmpeg: Optional[FFmpegService] = None):
+        self.cache_dir = cache_dir
+        self.fps = fps
+        self.still_fps = min(still_fps, fps)
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.frame_workers = frame_workers
+        self.rasterizer = rasterizer or SubtitleRasterizer()
+        self.assets = assets or AssetCache()
+        self.ffmpeg = ffmpeg or FFmpegService()
+        self._file_hashes: Dict[tuple, str] = {}
+        os.makedirs(os.path.join(self.cache_dir, "segments"), exist_ok=True)
+
+    def render_slideshow(self, segments: List[Dict[str, Any]], output_path: str,
+                         resolution: str = "1080", aspect_ratio: str = "16:9",
+                         audio_path: Optional[str] = None, subtitle_enabled: bool = False) -> str:
+        """
+        Render video từ danh sách segment ảnh tĩnh
+        Args:
+            segments: Danh sách segment, mỗi segment gồm "image" (đường dẫn local hoặc URL), "duration",
+                      tùy chọn "transition" {"type", "duration"} cho transition vào segment đó
+                      và tùy chọn "motion" (preset hoặc dict của KenBurnsEffect)
+            output_path: Đường dẫn file mp4 đầu ra
+            resolution: Độ phân giải theo chuẩn Shotstack
+            aspect_ratio: Tỷ lệ khung hình
+            audio_path: File audio gắn vào video (nếu có)
+            subtitle_enabled: Vẽ "script" của segment làm phụ đề (rasterize bằng Pillow, không dùng ImageMagick)
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        try:
+            if not segments:
+                raise ValueError("Segments phải là một mảng không rỗng")
+
+            width, height = get_frame_size(resolution, aspect_ratio)
+            parts = self.plan(segments, subtitle_enabled)
+
+            total_duration = sum(float(segment["duration"]) for segment in segments)
+            if audio_path:
+                video_only_path = f"{output_path}.video.mp4"
+                self.render_parts(parts, width, height, video_only_path)
+                try:
+                    self.ffmpeg.mux_audio(video_only_path, audio_path, output_path, total_duration)
+                finally:
+                    os.remove(video_only_path)
+            else:
+                self.render_parts(parts, width, height, output_path)
+
+            return output_path
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi render video local: {str(e)}")
+
+    def plan(self, segments: List[Dict[str, Any]], subtitle_enabled: bool = False) -> List[Dict[str, Any]]:
+        """
+        Lập plan các đoạn cần encode cho danh sách segment (chưa đọc file ảnh)
+        Args:
+            segments: Danh sách segment như render_slideshow
+            subtitle_enabled: Gắn "script" của segment làm phụ đề (chia thành các cue theo thời gian)
+        Returns:
+            Danh sách đoạn "still"/"transition", JSON serialize được
+        """
+        if subtitle_enabled:
+            # Mỗi cue phụ đề (chia theo thời lượng audio) là một đoạn ảnh tĩnh riêng với caption của cue
+            segments = CaptionBuilder().split_segments(segments)
+        # Segment liền nhau cùng ảnh được gộp, không encode transition giữa 2 ảnh giống nhau
+        return self._build_plan(TimelineOptimizer().merge_segments(segments))
+
+    def render_parts(self, parts: List[Dict[str, Any]], width: int, height: int, output_path: str) -> str:
+        """
+        Encode (hoặc lấy từ cache) các đoạn của plan và ghép bằng stream copy.
+        Ảnh dạng URL được tải về cache trước khi encode.
+        Args:
+            parts: Các đoạn liên tiếp của plan (có thể chỉ là một phần timeline)
+            width, height: Kích thước khung hình
+            output_path: Đường dẫn file mp4 đầu ra (chỉ có hình)
+        Returns:
+            Đường dẫn file đầu ra
+        """
+        # Encode song song các đoạn chưa có trong cache
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            part_paths = list(executor.map(lambda part: self.render_part(part, width, height), parts))
+        return self.ffmpeg.concat_copy(part_paths, output_path)
+
+    def render_part(self, part: Dict[str, Any], width: int, height: int) -> str:
+        """
+        Encode một đoạn của plan (tải ảnh về nếu là URL)
+        Returns:
+            Đường dẫn file mp4 của đoạn trong cache
+        """
+        return self._render_part(self._localize_part(part), width, height)
+
+    def part_key(self, part: Dict[str, Any], width: int, height: int) -> str:
+        """
+        Khóa nội dung của một đoạn tính từ input của segment (không đọc file ảnh),
+        gồm cả ảnh hưởng của transition kề bên (thời lượng và khoảng chuyển động của đoạn),
+        dùng cho kho đoạn đã render dùng chung giữa các worker và giữa các lần chỉnh sửa video
+        """
+        def inputs(segment: Dict[str, Any]) -> Dict[str, Any]:
+            return {field: segment.get(field) for field in VIDEO_FIELDS}
+
+        if part["kind"] == "still":
+            signature = {
+                "kind": "still",
+                "segment": inputs(part["segment"]),
+                "duration": round(part["duration"], 3),
+                "progress": [round(value, 4) for value in part["progress"]],
+            }
+        else:
+            signature = {
+                "kind": "transition",
+                "type": part["type"],
+                "from": inputs(part["from"]),
+                "to": inputs(part["to"]),
+                "duration": round(part["duration"], 3),
+            }
+        return self._cache_key({
+            **signature,
+            "size": [width, height],
+            "fps": [self.fps, self.still_fps],
+            "style": self.rasterizer.style_key,
+            "codec": [self.ffmpeg.preset, self.ffmpeg.crf, self.ffmpeg.gop_seconds],
+        })
+
+    def localize(self, source: str) -> str:
+        """
+        Trả về đường dẫn local của asset, lấy qua AssetCache nếu source là URL
+        Args:
+            source: Đường dẫn local hoặc URL http(s)
+        Returns:
+            Đường dẫn file local
+        """
+        if not source.startswith(("http://", "https://")):
+            return source
+        return self.assets.get(source)
+
+    def _localize_part(self, part: Dict[str, Any]) -> Dict[str, Any]:
+        """Bản sao của đoạn plan với ảnh của các segment đã được tải về local"""
+        localized = dict(part)
+        for field in ("segment", "from", "to"):
+            if field in part:
+                localized[field] = dict(part[field], image=self.localize(part[field]["image"]))
+        return localized
+
+    def _transition_of(self, segments: List[Dict[str, Any]], index: int) -> Optional[Dict[str, Any]]:
+        """Transition vào segment index, giới hạn bởi thời lượng của 2 segment kề nhau"""
+        if index <= 0 or index >= len(segments):
+            return None
+        transition = segments[index].get("transition") or {}
+        duration = float(transition.get("duration", DEFAULT_TRANSITION_DURATION))
+        limit = min(float(segments[index - 1]["duration"]), float(segments[index]["duration"])) / 2
+        duration = min(duration, limit)
+        if duration * self.fps < 1:
+            return None
+        transition_type = transition.get("type", "fade")
+        return {"type": transition_type if transition_type in ANIMATIONS else "fade", "duration": duration}
+
+    def _build_plan(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Chia timeline thành các đoạn "still" và "transition".
+        Mỗi transition lấy một nửa thời lượng từ mỗi segment hai bên, nên tổng thời lượng không đổi.
+        """
+        parts = []
+        for idx, segment in enumerate(segments):
+            transition_in = self._transition_of(segments, idx)
+            transition_out = self._transition_of(segments, idx + 1)
+
+            if transition_in:
+                parts.append({
+                    "kind": "transition",
+                    "type": transition_in["type"],
+                    "from": segments[idx - 1],
+                    "to": segment,
+                    "duration": transition_in["duration"],
+                })
+
+            duration = float(segment["duration"])
+            head = transition_in["duration"] / 2 if transition_in else 0
+            tail = transition_out["duration"] / 2 if transition_out else 0
+            if duration - head - tail > 0:
+                parts.append({
+                    "kind": "still",
+                    "segment": segment,
+                    "duration": duration - head - tail,
+                    # Khoảng tiến độ chuyển động Ken Burns mà đoạn này phủ
+                    "progress": [head / duration, (duration - tail) / duration],
+                })
+        return parts
+
+    def _render_part(self, part: Dict[str, Any], width: int, height: int) -> str:
+        """Encode một đoạn của plan, trả về file trong cache nếu đã có"""
+        if part["kind"] == "still":
+            segment = part["segment"]
+            motion = segment.get("motion")
+            caption = segment.get("caption")
+            fps = self.fps if motion else self._still_rate(part["duration"])
+            key = self._cache_key({
+                "kind": "still",
+                "image": self._file_hash(segment["image"]),
+                "duration": round(part["duration"], 3),
+                "size": [width, height],
+                "fps": fps,
+                "motion": [motion, [round(value, 4) for value in part["progress"]]] if motion else None,
+                "caption": [caption, self.rasterizer.style_key] if caption else None,
+                "codec": [self.ffmpeg.preset, self.ffmpeg.crf, self.ffmpeg.gop_seconds],
+            })
+            if motion:
+                # Segment có chuyển động cần frame rate đầy đủ
+                return self._cached(key, lambda tmp: KenBurnsEffect(motion).write_segment(
+                    read_image(segment["image"]), tmp, part["duration"], width, height,
+                    self.fps, part["progress"][0], part["progress"][1],
+                    ffmpeg=self.ffmpeg, workers=self.frame_workers,
+                    caption=self.rasterizer.render(caption, width, height) if caption else None
+                ))
+            if caption:
+                # Phụ đề được vẽ một lần lên ảnh, segment vẫn là ảnh tĩnh
+                return self._cached(key, lambda tmp: self.ffmpeg.encode_still_frame(
+                    self.rasterizer.burn(load_frame(segment["image"], width, height), caption),
+                    tmp, part["duration"], fps
+                ))
+            return self._cached(key, lambda tmp: self.ffmpeg.encode_still(
+                segment["image"], tmp, part["duration"], width, height, fps
+            ))
+
+        key = self._cache_key({
+            "kind": "transition",
+            "type": part["type"],
+            "from": [self._file_hash(part["from"]["image"]), part["from"].get("motion"), part["from"].get("caption")],
+            "to": [self._file_hash(part["to"]["image"]), part["to"].get("motion"), part["to"].get("caption")],
+            "style": self.rasterizer.style_key,
+            "duration": round(part["duration"], 3),
+            "size": [width, height],
+            "fps": self.fps,
+            "codec": [self.ffmpeg.preset, self.ffmpeg.crf, self.ffmpeg.gop_seconds],
+        })
+        needs_frames = any(part[side].get("motion") or part[side].get("caption") for side in ("from", "to"))
+        if part["type"] in ANIMATIONS or needs_frames:
+            return self._cached(key, lambda tmp: self._encode_animated_transition(part, tmp, width, height))
+        return self._cached(key, lambda tmp: self.ffmpeg.encode_crossfade(
+            part["from"]["image"], part["to"]["image"], tmp, part["duration"], width, height, self.fps
+        ))
+
+    def _still_rate(self, duration: float) -> int:
+        """
+        Frame rate nội bộ thấp nhất (ước của fps đầu ra, không dưới still_fps) biểu diễn đúng thời lượng đoạn,
+        để số frame làm tròn không làm video lệch dần so với audio (ví dụ 2.5s ở 5fps sẽ bị thiếu 0.1s)
+        """
+        for rate in range(self.still_fps, self.fps + 1):
+            if self.fps % rate == 0 and abs(duration * rate - round(duration * rate)) < 1e-6:
+                return rate
+        return self.fps
+
+    def _segment_frame(self, segment: Dict[str, Any], width: int, height: int, progress: float) -> np.ndarray:
+        """Frame của segment tại tiến độ chuyển động progress (kèm phụ đề nếu có), dùng làm nguồn cho transition"""
+        if segment.get("motion"):
+            frame = KenBurnsEffect(segment["motion"]).frame_at(read_image(segment["image"]), width, height, progress)
+        else:
+            frame = load_frame(segment["image"], width, height)
+        if segment.get("caption"):
+            self.rasterizer.burn(frame, segment["caption"])
+        return frame
+
+    def _encode_animated_transition(self, part: Dict[str, Any], output_path: str, width: int, height: int) -> str:
+        """Encode transition bằng engine NumPy/OpenCV (rotation/zoom/translation, hoặc fade khi cần dựng frame)"""
+        # Transition nối liền với frame cuối phần hiển thị của segment trước và frame đầu của segment sau
+        half = part["duration"] / 2
+        frame_a = self._segment_frame(part["from"], width, height, 1 - half / float(part["from"]["duration"]))
+        frame_b = self._segment_frame(part["to"], width, height, half / float(part["to"]["duration"]))
+        num_frames = max(int(round(part["duration"] * self.fps)), 1)
+        return write_transition(frame_a, frame_b, output_path, part["type"], num_frames,
+                                fps=self.fps, ffmpeg=self.ffmpeg)
+
+    def _cached(self, key: str, encode) -> str:
+        """Trả về file trong cache, encode vào file tạm rồi đổi tên nguyên tử nếu chưa có"""
+        path = os.path.join(self.cache_dir, "segments", f"{key}.mp4")
+        if os.path.exists(path):
+            return path
+
+        tmp_path = f"{path}.{os.getpid()}.{id(encode)}.tmp.mp4"
+        try:
+            encode(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def _cache_key(self, parts: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _file_hash(self, path: str) -> str:
+        """Hash nội dung file, nhớ theo (path, size, mtime) để không đọc lại file"""
+        stat = os.stat(path)
+        marker = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if marker not in self._file_hashes:
+            digest = hashlib.sha1()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self._file_hashes[marker] = digest.hexdigest()
+        return self._file_hashes[marker]
+
+    def clear_cache(self):
+        """Xóa toàn bộ cache segment"""
+        shutil.rmtree(os.path.join(self.cache_dir, "segments"), ignore_errors=True)
+        os.makedirs(os.path.join(self.cache_dir, "segments"), exist_ok=True)
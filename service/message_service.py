@@ -1,9 +1,11 @@
 import pika
+from pika.exceptions import AMQPConnectionError, AMQPChannelError
 import json
 from typing import Dict, Any, Callable
 import os
 from dotenv import load_dotenv
-from models.message_model import VideoMessage
+import threading
+from models.message_model import VideoMessage, ChunkMessage
 from service.video_service import VideoService
 import asyncio
 from bson.objectid import ObjectId
@@ -18,8 +20,11 @@ class MessageService:
         self.connection = None
         self.channel = None
         self.queue_name = "video_creation_queue_test"
+        self.chunk_queue_name = os.getenv("RENDER_CHUNK_QUEUE", "video_render_chunk_queue")
         self.callback = None
         self.video_service = VideoService()
+        # BlockingConnection không an toàn khi dùng từ nhiều thread
+        self._publish_lock = threading.Lock()
         
     def connect(self):
         """Kết nối đến RabbitMQ server"""
@@ -31,6 +36,7 @@ class MessageService:
             
             # Khai báo queue
             self.channel.queue_declare(queue=self.queue_name, durable=True)
+            self.channel.queue_declare(queue=self.chunk_queue_name, durable=True)
             print("Đã kết nối đến RabbitMQ")
             
         except Exception as e:
@@ -40,28 +46,113 @@ class MessageService:
     def close(self):
         """Đóng kết nối RabbitMQ"""
         if self.connection and not self.connection.is_closed:
-            self.connection.close()
+            try:
+                self.connection.close()
+            except AMQPConnectionError:
+                pass
             
+    def _ensure_channel(self):
+        """Kết nối lại nếu chưa có kết nối hoặc broker đã đóng kết nối/channel (ví dụ sau thời gian idle)"""
+        if (not self.channel or self.channel.is_closed
+                or not self.connection or self.connection.is_closed):
+            self.close()
+            self.connect()
+
+    def _publish(self, routing_key: str, message: Dict[str, Any]):
+        """
+        Gửi message bền vững vào queue, kết nối lại và thử lại một lần nếu kết nối đã bị đóng.
+        Kết nối của API chủ yếu ở trạng thái idle, không có ai xử lý heartbeat nên broker có thể đóng bất cứ lúc nào
+        """
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    self._ensure_channel()
+                    self.channel.basic_publish(
+                        exchange="",
+                        routing_key=routing_key,
+                        body=json.dumps(message),
+                        properties=pika.BasicProperties(
+                            delivery_mode=2,  # make message persistent
+                        )
+                    )
+                    return
+                except (AMQPConnectionError, AMQPChannelError) as e:
+                    if attempt:
+                        raise
+                    print(f"⚠️ Kết nối RabbitMQ đã đóng, kết nối lại: {str(e)}")
+                    self.channel = None
+
     def publish_message(self, message: Dict[str, Any]):
         """Gửi message vào queue"""
         try:
-            if not self.channel:
-                self.connect()
-                
-            self.channel.basic_publish(
-                exchange="",
-                routing_key=self.queue_name,
-                body=json.dumps(message),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # make message persistent
-                )
-            )
+            self._publish(self.queue_name, message)
             print(f"Đã gửi message: {message['video_id']}")
             
         except Exception as e:
             print(f"Lỗi khi gửi message: {str(e)}")
             raise
             
+    def publish_chunk(self, message: Dict[str, Any]):
+        """Gửi message render chunk vào queue chunk"""
+        try:
+            self._publish(self.chunk_queue_name, message)
+            print(f"Đã gửi chunk {message['chunk_index']} của video {message['video_id']}")
+
+        except Exception as e:
+            print(f"Lỗi khi gửi chunk: {str(e)}")
+            raise
+
+    def consume_chunks(self, handler: Callable[[ChunkMessage], Any]):
+        """
+        Xử lý các message render chunk.
+        Chunk được render trong thread riêng để kết nối vẫn gửi heartbeat trong lúc render lâu.
+        Chunk lỗi vẫn được ack: coordinator đọc trạng thái lỗi và tự gửi lại chunk với attempt mới.
+        """
+        def message_callback(ch, method, properties, body):
+            try:
+                message = ChunkMessage(**json.loads(body))
+                print(f"Đang render chunk {message.chunk_index} của video {message.video_id}")
+
+                errors = []
+                def run():
+                    try:
+                        handler(message)
+                    except Exception as e:
+                        errors.append(e)
+
+                worker = threading.Thread(target=run, daemon=True)
+                worker.start()
+                while worker.is_alive():
+                    self.connection.process_data_events(time_limit=1)
+
+                if errors:
+                    print(f"Lỗi khi render chunk: {str(errors[0])}")
+                else:
+                    print(f"Đã render xong chunk {message.chunk_index} của video {message.video_id}")
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+
+            except Exception as e:
+                print(f"Lỗi khi xử lý chunk message: {str(e)}")
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+
+        try:
+            if not self.channel:
+                self.connect()
+
+            # Mỗi worker chỉ nhận một chunk tại một thời điểm
+            self.channel.basic_qos(prefetch_count=1)
+            self.channel.basic_consume(
+                queue=self.chunk_queue_name,
+                on_message_callback=message_callback
+            )
+
+            print("Bắt đầu lắng nghe chunk messages...")
+            self.channel.start_consuming()
+
+        except Exception as e:
+            print(f"Lỗi khi consume chunk messages: {str(e)}")
+            raise
+
     def set_callback(self, callback: Callable[[VideoMessage], None]):
         """Thiết lập callback function để xử lý message"""
         self.callback = callback
@@ -0,0 +1,202 @@
+import os
+import re
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from cachetools import TTLCache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PREFLIGHT_ENABLED = os.getenv("PREFLIGHT_ENABLED", "true").lower() == "true"
+PREFLIGHT_CONCURRENCY = int(os.getenv("PREFLIGHT_CONCURRENCY", "16"))
+PREFLIGHT_TIMEOUT = float(os.getenv("PREFLIGHT_TIMEOUT", "10"))
+PREFLIGHT_CACHE_TTL = int(os.getenv("PREFLIGHT_CACHE_TTL", "600"))
+
+# Dung lượng tối đa theo loại asset (bytes)
+MAX_SIZES = {
+    "image": int(float(os.getenv("PREFLIGHT_MAX_IMAGE_MB", "25")) * 1024 ** 2),
+    "audio": int(float(os.getenv("PREFLIGHT_MAX_AUDIO_MB", "100")) * 1024 ** 2),
+}
+
+# Số byte đầu file được đọc để nhận dạng định dạng
+SNIFF_BYTES = 4096
+
+# Chữ ký đầu file của các định dạng được hỗ trợ
+SIGNATURES = {
+    "image": [
+        (b"\x89PNG\r\n\x1a\n", "png"),
+        (b"\xff\xd8\xff", "jpeg"),
+        (b"GIF87a", "gif"),
+        (b"GIF89a", "gif"),
+        (b"BM", "bmp"),
+    ],
+    "audio": [
+        (b"ID3", "mp3"),
+        (b"OggS", "ogg"),
+        (b"fLaC", "flac"),
+    ],
+}
+
+
+class PreflightError(ValueError):
+    """Lỗi preflight, kèm danh sách lỗi của từng asset"""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} asset không hợp lệ")
+
+
+def sniff_format(kind: str, head: bytes) -> Optional[str]:
+    """
+    Nhận dạng định dạng file từ các byte đầu tiên
+    Args:
+        kind: "image" hoặc "audio"
+        head: Các byte đầu file
+    Returns:
+        Tên định dạng, hoặc None nếu không nhận dạng được
+    """
+    for signature, name in SIGNATURES[kind]:
+        if head.startswith(signature):
+            return name
+    if head[:4] == b"RIFF" and head[8:12] == (b"WEBP" if kind == "image" else b"WAVE"):
+        return "webp" if kind == "image" else "wav"
+    if kind == "audio":
+        if head[4:8] == b"ftyp":
+            return "mp4"
+        # Frame MPEG audio (mp3 không có ID3) hoặc ADTS (aac): 11/12 bit sync đầu tiên
+        if len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0:
+            return "mpeg"
+    return None
+
+
+class PreflightService:
+    """
+    Kiểm tra trước các URL ảnh, audio và nhạc nền của video trước khi gửi render.
+    Mỗi URL được kiểm tra bằng một GET có Range chỉ lấy vài KB đầu (status, Content-Type,
+    dung lượng từ Content-Range/Content-Length và chữ ký đầu file), các URL chạy song song
+    với số request đồng thời giới hạn. URL hợp lệ được nhớ trong một khoảng thời gian.
+    """
+
+    def __init__(self, concurrency: int = PREFLIGHT_CONCURRENCY, timeout: float = PREFLIGHT_TIMEOUT,
+                 cache_ttl: int = PREFLIGHT_CACHE_TTL):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._valid = TTLCache(maxsize=4096, ttl=cache_ttl)
+        self._lock = threading.Lock()
+
+    def collect_assets(self, data: Dict[str, Any]) -> List[Tuple[Optional[int], str, str]]:
+        """
+        Danh sách asset cần kiểm tra
+        Returns:
+            Danh sách (index segment hoặc None, tên trường, URL)
+        """
+        assets = []
+        for segment in data.get("segments", []):
+            for field in ("image", "audio"):
+                assets.append((segment.get("index"), field, segment.get(field)))
+        if data.get("backgroundMusic"):
+            assets.append((None, "backgroundMusic", data["backgroundMusic"]))
+        return assets
+
+    async def check(self, data: Dict[str, Any]) -> None:
+        """
+        Kiểm tra song song mọi asset của video
+        Args:
+            data: Dữ liệu tạo video (segments, backgroundMusic)
+        Raises:
+            PreflightError: Nếu có asset không hợp lệ, kèm lỗi của từng segment
+        """
+        assets = self.collect_assets(data)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: Dict[Tuple[str, str], asyncio.Task] = {}
+
+        async def probe(url: str, kind: str) -> Optional[str]:
+            async with semaphore:
+                return await asyncio.to_thread(self.probe, url, kind)
+
+        # Mỗi URL chỉ kiểm tra một lần dù được dùng ở nhiều segment
+        for _, field, url in assets:
+            kind = "image" if field == "image" else "audio"
+            if (url, kind) not in results:
+                results[(url, kind)] = asyncio.ensure_future(probe(url, kind))
+        await asyncio.gather(*results.values())
+
+        errors = []
+        for index, field, url in assets:
+            error = results[(url, "image" if field == "image" else "audio")].result()
+            if error:
+                errors.append({"segment": index, "field": field, "url": url, "error": error})
+        if errors:
+            raise PreflightError(errors)
+
+    def probe(self, url: str, kind: str) -> Optional[str]:
+        """
+        Kiểm tra một URL
+        Args:
+            url: URL của asset
+            kind: "image" hoặc "audio"
+        Returns:
+            Mô tả lỗi, hoặc None nếu asset hợp lệ
+        """
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            return "URL không hợp lệ"
+        with self._lock:
+            if (url, kind) in self._valid:
+                return None
+
+        try:
+            response = self.session.get(
+                url,
+                headers={"Range": f"bytes=0-{SNIFF_BYTES - 1}"},
+                stream=True,
+                timeout=self.timeout,
+            )
+        except requests.exceptions.RequestException as e:
+            return f"Không thể kết nối: {e.__class__.__name__}"
+
+        try:
+            if response.status_code not in (200, 206):
+                return f"HTTP {response.status_code}"
+
+            size = self._content_size(response)
+            if size == 0:
+                return "File rỗng"
+            if size and size > MAX_SIZES[kind]:
+                return f"File quá lớn ({size / 1024 ** 2:.1f} MB)"
+
+            # Server bỏ qua Range (200) thì chỉ đọc phần đầu rồi đóng kết nối
+            head = b""
+            for chunk in response.iter_content(chunk_size=SNIFF_BYTES):
+                head += chunk
+                if len(head) >= SNIFF_BYTES:
+                    break
+
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            detected = sniff_format(kind, head)
+            if not detected:
+                if content_type and not content_type.startswith((f"{kind}/", "application/octet-stream")):
+                    return f"Content-Type không phải {kind}: {content_type}"
+                return f"Không nhận dạng được định dạng {kind}"
+        finally:
+            response.close()
+
+        with self._lock:
+            self._valid[(url, kind)] = True
+        return None
+
+    def _content_size(self, response: requests.Response) -> Optional[int]:
+        """Dung lượng file từ Content-Range (206) hoặc Content-Length (200)"""
+        content_range = response.headers.get("Content-Range", "")
+        match = re.search(r"/(\d+)$", content_range)
+        if match:
+            return int(match.group(1))
+        if response.status_code == 200 and response.headers.get("Content-Length"):
+            return int(response.headers["Content-Length"])
+        return None
@@ -0,0 +1,196 @@
+import os
+import re
+import hashlib
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from config.render_config import PREVIEW_CACHE_MAX_AGE, PREVIEW_CHUNK_SIZE
+from service.asset_cache import AssetCache
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class PreviewProxy:
+    """
+    Lấy file video để API tự phục vụ xem trước: file được tải về kho asset (AssetCache) ở lần xem đầu,
+    các lần sau đọc trực tiếp từ đĩa, URL gốc hết hạn (Shotstack) hay bị xóa cũng không ảnh hưởng.
+    """
+
+    def __init__(self, assets: Optional[AssetCache] = None):
+        self.assets = assets or AssetCache()
+
+    def source_url(self, video: Dict[str, Any]) -> Optional[str]:
+        """URL mp4 của video: bản trên Cloudinary, URL gốc của renderer, hoặc bản nháp khi chưa render xong"""
+        return video.get("outputPath") or video.get("originPath") or video.get("draftUrl")
+
+    def fetch(self, url: str) -> Dict[str, Any]:
+        """
+        Lấy file từ cache (tải nếu chưa có) cùng thông tin dùng cho header HTTP
+        Args:
+            url: URL file video
+        Returns:
+            Dict gồm path, size, etag, lastModified (timestamp), contentType
+        """
+        try:
+            path = self.assets.get(url)
+            meta = self.assets.metadata(url) or {}
+            size = os.path.getsize(path)
+            # ETag theo nội dung đã tải (ETag của nguồn hoặc thời điểm tải), không theo mtime vì cache dùng mtime cho LRU
+            version = f"{url}|{meta.get('etag')}|{meta.get('fetchedAt')}|{size}"
+            last_modified = meta.get("fetchedAt") or os.path.getmtime(path)
+            if meta.get("lastModified"):
+                try:
+                    last_modified = parsedate_to_datetime(meta["lastModified"]).timestamp()
+                except (TypeError, ValueError):
+                    pass
+            content_type = (meta.get("contentType") or "").split(";")[0].strip()
+            if not content_type.startswith("video/"):
+                content_type = mimetypes.guess_type(url.split("?")[0])[0] or "video/mp4"
+            return {
+                "path": path,
+                "size": size,
+                "etag": f"\"{hashlib.sha256(version.encode('utf-8')).hexdigest()[:32]}\"",
+                "lastModified": int(last_modified),
+                "contentType": content_type,
+            }
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi lấy file xem trước: {str(e)}")
+
+
+def parse_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Đọc header Range dạng một khoảng byte
+    Args:
+        value: Giá trị header Range
+        size: Kích thước file
+    Returns:
+        (start, end) tính cả end; None nếu không có Range hoặc Range không dùng được (trả cả file);
+        raise ValueError nếu khoảng nằm ngoài file (416)
+    """
+    if not value:
+        return None
+    match = RANGE_PATTERN.match(value.strip().replace(" ", ""))
+    if not match or (not match.group(1) and not match.group(2)):
+        # Nhiều khoảng (multipart/byteranges) hoặc sai cú pháp: bỏ qua Range và trả cả file
+        return None
+    if not match.group(1):
+        # bytes=-N: N byte cuối
+        length = int(match.group(2))
+        if length == 0:
+            raise ValueError("Range không hợp lệ")
+        return max(size - length, 0), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range không hợp lệ")
+    return start, min(end, size - 1)
+
+
+class RangeFileResponse(Response):
+    """
+    Response file hỗ trợ Range (206/416), conditional request (If-None-Match, If-Modified-Since, If-Range → 304)
+    và HEAD. Body được gửi zero-copy (sendfile) khi server ASGI có extension "http.response.zerocopy"
+    (hoặc "http.response.pathsend" khi gửi cả file), nếu không thì đọc theo từng khối.
+    """
+
+    def __init__(self, file_info: Dict[str, Any], request_headers: Headers, method: str = "GET",
+                 max_age: int = PREVIEW_CACHE_MAX_AGE, chunk_size: int = PREVIEW_CHUNK_SIZE):
+        self.path = file_info["path"]
+        self.chunk_size = chunk_size
+        self.send_body = method != "HEAD"
+        self.range: Optional[Tuple[int, int]] = None
+        size = file_info["size"]
+        etag = file_info["etag"]
+        last_modified = file_info["lastModified"]
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(last_modified, usegmt=True),
+            # public để CDN đặt phía trước cache được, hết max-age thì kiểm tra lại bằng ETag
+            "cache-control": f"public, max-age={max_age}, must-revalidate",
+        }
+        status_code = 200
+
+        if self._not_modified(request_headers, etag, last_modified):
+            status_code = 304
+            self.send_body = False
+        else:
+            if_range = request_headers.get("if-range")
+            # If-Range khác phiên bản hiện tại: file đã đổi, trả cả file thay vì một khoảng của bản mới
+            use_range = not if_range or if_range == etag
+            try:
+                self.range = parse_range(request_headers.get("range"), size) if use_range else None
+            except ValueError:
+                status_code = 416
+                self.send_body = False
+                headers["content-range"] = f"bytes */{size}"
+                headers["content-length"] = "0"
+
+            if status_code != 416:
+                if self.range:
+                    status_code = 206
+                    start, end = self.range
+                    headers["content-range"] = f"bytes {start}-{end}/{size}"
+                    headers["content-length"] = str(end - start + 1)
+                else:
+                    self.range = (0, size - 1) if size else None
+                    headers["content-length"] = str(size)
+                headers["content-type"] = file_info["contentType"]
+
+        super().__init__(status_code=status_code, headers=headers)
+        self.full_file = status_code == 200
+
+    def _not_modified(self, request_headers: Headers, etag: str, last_modified: int) -> bool:
+        """Kiểm tra If-None-Match (ưu tiên) hoặc If-Modified-Since"""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(parsedate_to_datetime(if_modified_since).timestamp()) >= last_modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.range:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        start, end = self.range
+        extensions = scope.get("extensions") or {}
+        if self.full_file and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopy" in extensions:
+                # Server gọi sendfile trực tiếp từ file descriptor, dữ liệu không đi qua Python
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f,
+                    "offset": start,
+                    "count": end - start + 1,
+                    "more_body": False,
+                })
+                return
+
+            remaining = end - start + 1
+            await anyio.to_thread.run_sync(f.seek, start)
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(f.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,154 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import numpy as np
+from config.mongodb import MongoDB
+from config.render_config import (
+    RENDER_ETA_MIN_SAMPLES,
+    RENDER_HISTORY_LIMIT,
+    RENDER_ETA_FALLBACK_RATE,
+    UPLOAD_ETA_FALLBACK_RATE,
+    RENDER_POLL_MIN_INTERVAL,
+    RENDER_POLL_MAX_INTERVAL,
+    RENDER_TIMEOUT_FACTOR,
+    RENDER_TIMEOUT_MIN,
+    get_frame_size,
+)
+
+# Số job gần nhất dùng để ước lượng thời gian chờ trong hàng đợi của renderer
+QUEUE_SAMPLES = 50
+
+
+def _design_row(features: Dict[str, Any]) -> List[float]:
+    """Hàng của ma trận hồi quy: hệ số tự do, số segment, thời lượng, megapixel x giây, phụ đề, thời gian chờ"""
+    duration = float(features.get("duration", 0))
+    return [
+        1.0,
+        float(features.get("segments", 0)),
+        duration,
+        duration * float(features.get("megapixels", 0)),
+        1.0 if features.get("subtitles") else 0.0,
+        float(features.get("queueSeconds", 0)),
+    ]
+
+
+class RenderPredictor:
+    """
+    Dự đoán thời gian chờ, render và upload của một job từ lịch sử các job đã xong (collection render_history).
+    Mỗi renderer có một mô hình tuyến tính (bình phương tối thiểu của NumPy) theo số segment, thời lượng,
+    số pixel, phụ đề và thời gian chờ trong hàng đợi; mô hình được fit lại khi có job mới.
+    Chưa đủ lịch sử thì ước lượng theo tỷ lệ với thời lượng video.
+    """
+
+    def __init__(self, min_samples: int = RENDER_ETA_MIN_SAMPLES, history_limit: int = RENDER_HISTORY_LIMIT):
+        self.mongodb = MongoDB()
+        self.history_collection = self.mongodb.get_collection("render_history")
+        self.min_samples = min_samples
+        self.history_limit = history_limit
+        self._models: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def features(self, data: Dict[str, Any], renderer: str) -> Dict[str, Any]:
+        """
+        Đặc trưng của một job
+        Args:
+            data: Dữ liệu tạo video hoặc document video (segments, resolution, aspectRatio, subtitle)
+            renderer: "shotstack" hoặc "local"
+        Returns:
+            Dict gồm renderer, segments, duration, megapixels, subtitles
+        """
+        segments = data.get("segments") or []
+        try:
+            width, height = get_frame_size(data.get("resolution", "1080"), data.get("aspectRatio", "16:9"))
+        except ValueError:
+            width, height = 1920, 1080
+        return {
+            "renderer": renderer,
+            "segments": len(segments),
+            "duration": round(sum(float(segment.get("duration", 0)) for segment in segments), 3),
+            "megapixels": round(width * height / 1e6, 4),
+            "subtitles": bool((data.get("subtitle") or {}).get("enabled", False)),
+        }
+
+    def _fit(self, renderer: str) -> Optional[Dict[str, Any]]:
+        """Fit hệ số render/upload và thời gian chờ trung vị từ các job gần nhất của renderer"""
+        history = list(
+            self.history_collection.find({"renderer": renderer}).sort("createdAt", -1).limit(self.history_limit)
+        )
+        if len(history) < self.min_samples:
+            return None
+        design = np.array([_design_row(job) for job in history])
+        model = {"queueSeconds": float(np.median([job.get("queueSeconds", 0) for job in history[:QUEUE_SAMPLES]]))}
+        for target in ("renderSeconds", "uploadSeconds"):
+            values = np.array([float(job.get(target, 0)) for job in history])
+            coefficients, *_ = np.linalg.lstsq(design, values, rcond=None)
+            model[target] = coefficients
+        return model
+
+    def model(self, renderer: str) -> Optional[Dict[str, Any]]:
+        """Mô hình của renderer, fit khi dùng lần đầu hoặc sau khi có job mới"""
+        if renderer not in self._models:
+            try:
+                self._models[renderer] = self._fit(renderer)
+            except Exception as e:
+                print(f"⚠️ Không thể fit mô hình dự đoán thời gian render: {str(e)}")
+                self._models[renderer] = None
+        return self._models[renderer]
+
+    def predict(self, features: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Dự đoán thời gian của một job
+        Args:
+            features: Đặc trưng của job, có thể kèm queueSeconds đã biết (job đã bắt đầu render)
+        Returns:
+            Dict gồm queueSeconds, renderSeconds, uploadSeconds
+        """
+        duration = float(features.get("duration", 0))
+        fallback = {
+            "queueSeconds": 0.0,
+            "renderSeconds": RENDER_ETA_FALLBACK_RATE * duration,
+            "uploadSeconds": UPLOAD_ETA_FALLBACK_RATE * duration,
+        }
+        model = self.model(features.get("renderer", "shotstack"))
+        if model is None:
+            estimate = fallback
+        else:
+            queue = features.get("queueSeconds")
+            queue = model["queueSeconds"] if queue is None else float(queue)
+            row = np.array(_design_row({**features, "queueSeconds": queue}))
+            estimate = {
+                "queueSeconds": queue,
+                "renderSeconds": float(row @ model["renderSeconds"]),
+                "uploadSeconds": float(row @ model["uploadSeconds"]),
+            }
+        if features.get("queueSeconds") is not None:
+            estimate["queueSeconds"] = float(features["queueSeconds"])
+        # Mô hình tuyến tính có thể cho giá trị âm với job nằm ngoài vùng dữ liệu
+        return {name: round(max(value, 1.0 if name != "queueSeconds" else 0.0), 1) for name, value in estimate.items()}
+
+    def timeout(self, estimate: Dict[str, float]) -> float:
+        """Thời gian tối đa (giây, tính từ lúc gửi render) chờ renderer trả kết quả"""
+        return max(RENDER_TIMEOUT_MIN, RENDER_TIMEOUT_FACTOR * (estimate["queueSeconds"] + estimate["renderSeconds"]))
+
+    def poll_interval(self, expected_at: datetime, now: Optional[datetime] = None) -> float:
+        """
+        Thời gian chờ tới lần hỏi trạng thái tiếp theo: ngủ tới thời điểm dự kiến xong,
+        quá thời điểm đó thì hỏi dày rồi giãn dần theo thời gian trễ
+        """
+        remaining = (expected_at - (now or datetime.now())).total_seconds()
+        wait = remaining if remaining > 0 else -remaining / 4
+        return min(max(wait, RENDER_POLL_MIN_INTERVAL), RENDER_POLL_MAX_INTERVAL)
+
+    def record(self, video_id: str, features: Dict[str, Any], queue_seconds: float,
+               render_seconds: float, upload_seconds: float) -> None:
+        """Lưu thời gian thực tế của job vừa xong vào lịch sử, mô hình của renderer được fit lại ở lần dự đoán sau"""
+        try:
+            self.history_collection.insert_one({
+                **features,
+                "video_id": video_id,
+                "queueSeconds": round(queue_seconds, 3),
+                "renderSeconds": round(render_seconds, 3),
+                "uploadSeconds": round(upload_seconds, 3),
+                "createdAt": datetime.now(),
+            })
+            self._models.pop(features.get("renderer", "shotstack"), None)
+        except Exception as e:
+            print(f"⚠️ Không thể lưu lịch sử thời gian render: {str(e)}")
@@ -5,10 +5,21 @@ import time
 from dotenv import load_dotenv
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from config.render_config import get_encoding_profile
 
 # Load environment variables
 load_dotenv()
 
+# Effect Shotstack tương ứng với preset motion (Ken Burns) của segment
+MOTION_EFFECTS = {
+    "zoom_in": "zoomIn",
+    "zoom_out": "zoomOut",
+    "pan_left": "slideLeft",
+    "pan_right": "slideRight",
+    "pan_up": "slideUp",
+    "pan_down": "slideDown",
+}
+
 class ShotstackService:
     def __init__(self):
         self.api_key = os.getenv("SHOTSTACK_API_KEY")
@@ -32,9 +43,13 @@ class ShotstackService:
         session.mount("http://", adapter)
         return session
 
-    def create_timeline(self, segments, background_music=None, subtitle_enabled=False, resolution="1080", aspect_ratio="16:9"):
+    def create_timeline(self, segments, background_music=None, subtitle_enabled=False, resolution="1080", aspect_ratio="16:9",
+                        mixed_audio=None, captions_url=None, encoding_profile=None):
         """
         Tạo timeline cho video từ danh sách segments và nhạc nền, đúng chuẩn Shotstack
+        Nếu có mixed_audio (track đã mix sẵn voice-over và nhạc nền), timeline chỉ có một clip audio duy nhất
+        Nếu có captions_url (file SRT/VTT), phụ đề là một layer caption duy nhất thay cho clip title của từng segment
+        encoding_profile chọn mức quality của output (Shotstack không cho chọn preset/CRF/GOP)
         """
         clips = []
         audio_clips = []
@@ -51,13 +66,16 @@ class ShotstackService:
                 "length": segment["duration"],
                 "fit": "cover"
             }
+            # Hiệu ứng chuyển động pan/zoom (nếu có)
+            if segment.get("motion") in MOTION_EFFECTS:
+                image_clip["effect"] = MOTION_EFFECTS[segment["motion"]]
             # Thêm transition cho các clip từ clip thứ 2 trở đi
             if idx > 0:
                 image_clip["transition"] = {"in": "fade", "out": "fade"}
             clips.append(image_clip)
 
             # Clip phụ đề (nếu bật)
-            if subtitle_enabled:
+            if subtitle_enabled and not captions_url:
                 subtitle_clip = {
                     "asset": {
                         "type": "title",
@@ -73,6 +91,9 @@ class ShotstackService:
                 clips.append(subtitle_clip)
 
             # Clip audio cho từng segment
+            if mixed_audio:
+                current_time += segment["duration"]
+                continue
             audio_clip = {
                 "asset": {
                     "type": "audio",
@@ -85,8 +106,18 @@ class ShotstackService:
 
             current_time += segment["duration"]
 
+        if mixed_audio:
+            audio_clips.append({
+                "asset": {
+                    "type": "audio",
+                    "src": mixed_audio
+                },
+                "start": 0,
+                "length": current_time
+            })
+
         # Nhạc nền
-        if background_music:
+        elif background_music:
             background_music_clip = {
                 "asset": {
                     "type": "audio",
@@ -98,22 +129,50 @@ class ShotstackService:
             }
             audio_clips.append(background_music_clip)
 
-        return {
-            "timeline": {
-                "tracks": [
-                    {
-                        "clips": clips
-                    },
+        tracks = [
+            {
+                "clips": clips
+            },
+            {
+                "clips": audio_clips
+            }
+        ]
+        # Track caption nằm trên cùng (track đầu tiên được vẽ trên các track sau)
+        if subtitle_enabled and captions_url:
+            tracks.insert(0, {
+                "clips": [
                     {
-                        "clips": audio_clips
+                        "asset": {
+                            "type": "caption",
+                            "src": captions_url,
+                            "font": {
+                                "color": "#FFFFFF"
+                            },
+                            "background": {
+                                "color": "#000000",
+                                "opacity": 0.6
+                            }
+                        },
+                        "start": 0,
+                        "length": current_time
                     }
                 ]
+            })
+
+        output = {
+            "format": "mp4",
+            "resolution": resolution,
+            "aspectRatio": aspect_ratio
+        }
+        quality = get_encoding_profile(encoding_profile)["shotstackQuality"]
+        if quality:
+            output["quality"] = quality
+
+        return {
+            "timeline": {
+                "tracks": tracks
             },
-            "output": {
-                "format": "mp4",
-                "resolution": resolution,
-                "aspectRatio": aspect_ratio
-            }
+            "output": output
         }
 
     def submit_render(self, timeline_data):
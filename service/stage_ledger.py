@@ -0,0 +1,210 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+from config.mongodb import MongoDB
+from config.render_config import STAGE_LEDGER_ENABLED, STAGE_LEDGER_BATCH_SIZE, STAGE_LEDGER_FLUSH_INTERVAL
+
+
+class StageTimer:
+    """
+    Đo một giai đoạn trong khối with: thời điểm bắt đầu, thời lượng, kết quả (ok/error).
+    Có thể gán thêm bytes và attempts trong lúc chạy, ví dụ timer.bytes = os.path.getsize(path)
+    """
+
+    def __init__(self, ledger: "StageLedger", video_id: str, stage: str):
+        self.ledger = ledger
+        self.video_id = video_id
+        self.stage = stage
+        self.bytes: Optional[int] = None
+        self.attempts: Optional[int] = None
+        self.start: Optional[datetime] = None
+
+    def __enter__(self) -> "StageTimer":
+        self.start = datetime.now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.ledger.record(
+            self.video_id, self.stage, self.start, datetime.now(),
+            byte_count=self.bytes, attempts=self.attempts, error=str(exc) if exc else None
+        )
+        return False
+
+
+class StageLedger:
+    """
+    Sổ thời gian theo giai đoạn của từng video (collection video_stages, một document mỗi video).
+    Mỗi giai đoạn (chờ hàng đợi, render, tải file, upload Cloudinary, upload YouTube, ...) là một sự kiện gọn
+    {stage, start, seconds, bytes, attempts, ok}. Sự kiện được gom trong bộ nhớ và ghi theo lô
+    (một bulk_write cho nhiều video) khi đủ STAGE_LEDGER_BATCH_SIZE sự kiện hoặc sau STAGE_LEDGER_FLUSH_INTERVAL giây,
+    nên việc đo không thêm một lệnh ghi database vào mỗi giai đoạn.
+    Dùng chung một instance trong process.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(StageLedger, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.mongodb = MongoDB()
+        self.stage_collection = self.mongodb.get_collection("video_stages")
+        self.enabled = STAGE_LEDGER_ENABLED
+        self.batch_size = STAGE_LEDGER_BATCH_SIZE
+        self.flush_interval = STAGE_LEDGER_FLUSH_INTERVAL
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def stage(self, video_id: str, stage: str) -> StageTimer:
+        """
+        Đo một giai đoạn
+        Args:
+            video_id: ID của video
+            stage: Tên giai đoạn
+        Returns:
+            StageTimer dùng với with
+        """
+        return StageTimer(self, video_id, stage)
+
+    def record(self, video_id: str, stage: str, start: datetime, end: datetime, byte_count: Optional[int] = None,
+               attempts: Optional[int] = None, error: Optional[str] = None) -> None:
+        """
+        Thêm một sự kiện vào hàng chờ ghi
+        Args:
+            video_id: ID của video
+            stage: Tên giai đoạn
+            start, end: Thời điểm bắt đầu/kết thúc
+            byte_count: Số byte xử lý (tải về/upload), nếu có
+            attempts: Số lần thử/hỏi, nếu có
+            error: Lỗi nếu giai đoạn thất bại
+        """
+        if not self.enabled or not video_id:
+            return
+        event = {
+            "stage": stage,
+            "start": start,
+            "seconds": round((end - start).total_seconds(), 3),
+            "ok": error is None,
+        }
+        if byte_count is not None:
+            event["bytes"] = int(byte_count)
+        if attempts is not None:
+            event["attempts"] = int(attempts)
+        if error:
+            event["error"] = error[:200]
+
+        with self._lock:
+            self._pending.append((video_id, event))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._flush_soon()
+        else:
+            self._ensure_flusher()
+
+    def _flush_soon(self) -> None:
+        """Ghi lô hiện tại ngoài event loop (nếu có), không chặn request"""
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self.flush)
+        except RuntimeError:
+            self.flush()
+
+    def _ensure_flusher(self) -> None:
+        """Chạy task ghi định kỳ trên event loop hiện tại (chỉ khởi tạo khi có sự kiện đầu tiên)"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Gọi ngoài event loop (thread, script): lô được ghi khi đủ kích thước hoặc khi flush()
+            return
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+            with self._lock:
+                if not self._pending:
+                    return
+
+    def flush(self) -> int:
+        """
+        Ghi mọi sự kiện đang chờ, gom theo video
+        Returns:
+            Số sự kiện đã ghi
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        by_video: Dict[str, List[Dict[str, Any]]] = {}
+        for video_id, event in pending:
+            by_video.setdefault(video_id, []).append(event)
+        now = datetime.now()
+        try:
+            self.stage_collection.bulk_write([
+                UpdateOne(
+                    {"_id": ObjectId(video_id)},
+                    {
+                        "$push": {"events": {"$each": events}},
+                        "$set": {"updatedAt": now},
+                    },
+                    upsert=True
+                )
+                for video_id, events in by_video.items()
+            ], ordered=False)
+            return len(pending)
+        except Exception as e:
+            print(f"⚠️ Không thể ghi sổ thời gian giai đoạn: {str(e)}")
+            return 0
+
+    def get_stages(self, video_id: str) -> List[Dict[str, Any]]:
+        """Các sự kiện của một video theo thứ tự thời gian (gồm cả sự kiện chưa ghi)"""
+        document = self.stage_collection.find_one({"_id": ObjectId(video_id)}) or {}
+        with self._lock:
+            pending = [event for pending_id, event in self._pending if pending_id == video_id]
+        return sorted(document.get("events", []) + pending, key=lambda event: event["start"])
+
+    def latency_stats(self, since: datetime, until: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Phân vị thời gian của từng giai đoạn trong một khoảng thời gian
+        Args:
+            since, until: Khoảng thời gian theo thời điểm bắt đầu của giai đoạn
+        Returns:
+            Dict gồm since, until và stages: {stage: {count, failed, p50, p95, max, bytesP50}}
+        """
+        until = until or datetime.now()
+        self.flush()
+        groups = self.stage_collection.aggregate([
+            {"$match": {"updatedAt": {"$gte": since}}},
+            {"$unwind": "$events"},
+            {"$match": {"events.start": {"$gte": since, "$lt": until}}},
+            {"$group": {
+                "_id": "$events.stage",
+                "seconds": {"$push": {"$cond": ["$events.ok", "$events.seconds", None]}},
+                "bytes": {"$push": "$events.bytes"},
+                "failed": {"$sum": {"$cond": ["$events.ok", 0, 1]}},
+            }},
+        ])
+        stages = {}
+        for group in groups:
+            # Phân vị tính trên các lần thành công, lần lỗi chỉ được đếm
+            seconds = np.array([value for value in group["seconds"] if value is not None], dtype=float)
+            sizes = np.array([value for value in group["bytes"] if value is not None], dtype=float)
+            stages[group["_id"]] = {
+                "count": int(len(seconds)),
+                "failed": int(group["failed"]),
+                "p50": round(float(np.percentile(seconds, 50)), 3) if len(seconds) else None,
+                "p95": round(float(np.percentile(seconds, 95)), 3) if len(seconds) else None,
+                "max": round(float(seconds.max()), 3) if len(seconds) else None,
+                "bytesP50": int(np.percentile(sizes, 50)) if len(sizes) else None,
+            }
+        return {"since": since, "until": until, "stages": dict(sorted(stages.items()))}
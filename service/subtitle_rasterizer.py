@@ -0,0 +1,166 @@
+import os
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Font mặc định, cần hỗ trợ tiếng Việt có dấu
+SUBTITLE_FONT = os.getenv("SUBTITLE_FONT")
+FALLBACK_FONTS = ["DejaVuSans.ttf", "arial.ttf", "Arial.ttf", "NotoSans-Regular.ttf"]
+
+
+@lru_cache(maxsize=32)
+def load_font(font_path: Optional[str], size: int) -> ImageFont.FreeTypeFont:
+    """Nạp font một lần cho mỗi cặp (font, size)"""
+    candidates = [font_path] if font_path else []
+    candidates += [SUBTITLE_FONT] if SUBTITLE_FONT else []
+    candidates += FALLBACK_FONTS
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+class SubtitleRasterizer:
+    """
+    Vẽ phụ đề bằng Pillow ngay trong tiến trình, thay cho TextClip của moviepy (mỗi caption một lần gọi ImageMagick).
+    Độ rộng từ và bitmap của từng dòng được cache theo (font, size, text),
+    caption được alpha-blend lên frame BGR bằng NumPy.
+    """
+
+    def __init__(self, font_path: Optional[str] = None, font_scale: float = 0.045,
+                 color: Tuple[int, int, int] = (255, 255, 255),
+                 background: Tuple[int, int, int, int] = (0, 0, 0, 160),
+                 max_width_ratio: float = 0.9, bottom_margin_ratio: float = 0.06,
+                 max_lines: int = 3, cache_size: int = 512):
+        self.font_path = font_path
+        self.font_scale = font_scale
+        self.color = color
+        self.background = background
+        self.max_width_ratio = max_width_ratio
+        self.bottom_margin_ratio = bottom_margin_ratio
+        self.max_lines = max_lines
+        self.cache_size = cache_size
+        self._word_widths: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lines: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+
+    @property
+    def style_key(self) -> tuple:
+        """Khóa mô tả style, dùng trong cache key của renderer"""
+        return (self.font_path, self.font_scale, self.color, self.background,
+                self.max_width_ratio, self.bottom_margin_ratio, self.max_lines)
+
+    def _remember(self, cache: OrderedDict, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return value
+
+    def _word_width(self, font: ImageFont.FreeTypeFont, size: int, word: str) -> float:
+        key = (self.font_path, size, word)
+        if key in self._word_widths:
+            self._word_widths.move_to_end(key)
+            return self._word_widths[key]
+        return self._remember(self._word_widths, key, font.getlength(word))
+
+    def wrap(self, text: str, font: ImageFont.FreeTypeFont, size: int, max_width: float) -> List[str]:
+        """Ngắt dòng theo độ rộng thực của chữ, dùng độ rộng từ đã cache"""
+        space = self._word_width(font, size, " ")
+        lines, current, current_width = [], [], 0.0
+        for word in text.split():
+            width = self._word_width(font, size, word)
+            extra = width if not current else space + width
+            if current and current_width + extra > max_width:
+                lines.append(" ".join(current))
+                current, current_width = [word], width
+            else:
+                current.append(word)
+                current_width += extra
+        if current:
+            lines.append(" ".join(current))
+        return lines
+
+    def _line_bitmap(self, font: ImageFont.FreeTypeFont, size: int, line: str) -> np.ndarray:
+        """Bitmap BGRA của một dòng chữ (có nền), cache theo (font, size, text)"""
+        key = (self.font_path, size, line, self.color, self.background)
+        if key in self._lines:
+            self._lines.move_to_end(key)
+            return self._lines[key]
+
+        left, top, right, bottom = font.getbbox(line)
+        padding_x, padding_y = size // 2, size // 4
+        ascent, descent = font.getmetrics()
+        image = Image.new("RGBA", (int(right - left) + 2 * padding_x, ascent + descent + 2 * padding_y),
+                          self.background)
+        ImageDraw.Draw(image).text((padding_x - left, padding_y), line, font=font, fill=self.color + (255,))
+        bitmap = np.asarray(image)[:, :, [2, 1, 0, 3]].copy()
+        return self._remember(self._lines, key, bitmap)
+
+    def render(self, text: str, width: int, height: int) -> Optional[Tuple[np.ndarray, int, int]]:
+        """
+        Rasterize caption cho khung hình width x height
+        Returns:
+            (bitmap BGRA, x, y) vị trí góc trên trái trên frame, hoặc None nếu text rỗng
+        """
+        text = " ".join(text.split())
+        if not text:
+            return None
+
+        size = max(12, int(round(height * self.font_scale)))
+        font = load_font(self.font_path, size)
+        lines = self.wrap(text, font, size, width * self.max_width_ratio)
+        if len(lines) > self.max_lines:
+            lines = lines[:self.max_lines]
+            lines[-1] = lines[-1].rstrip(".,;:") + "…"
+
+        bitmaps = [self._line_bitmap(font, size, line) for line in lines]
+        caption_w = min(max(bitmap.shape[1] for bitmap in bitmaps), width)
+        caption_h = sum(bitmap.shape[0] for bitmap in bitmaps)
+        caption = np.zeros((caption_h, caption_w, 4), dtype=np.uint8)
+        y = 0
+        for bitmap in bitmaps:
+            line_w = min(bitmap.shape[1], caption_w)
+            x = (caption_w - line_w) // 2
+            caption[y:y + bitmap.shape[0], x:x + line_w] = bitmap[:, :line_w]
+            y += bitmap.shape[0]
+
+        x = (width - caption_w) // 2
+        y = max(0, height - caption_h - int(height * self.bottom_margin_ratio))
+        return caption, x, y
+
+    @staticmethod
+    def blend(frame: np.ndarray, caption: np.ndarray, x: int, y: int) -> np.ndarray:
+        """Alpha-blend caption BGRA lên frame BGR (ghi đè trực tiếp lên frame)"""
+        h = min(caption.shape[0], frame.shape[0] - y)
+        w = min(caption.shape[1], frame.shape[1] - x)
+        region = frame[y:y + h, x:x + w]
+        alpha = caption[:h, :w, 3:4].astype(np.uint16)
+        blended = (caption[:h, :w, :3].astype(np.uint16) * alpha
+                   + region.astype(np.uint16) * (255 - alpha) + 127) // 255
+        region[...] = blended.astype(np.uint8)
+        return frame
+
+    def burn(self, frame: np.ndarray, text: str) -> np.ndarray:
+        """Vẽ caption lên frame BGR, trả về chính frame đó"""
+        rendered = self.render(text, frame.shape[1], frame.shape[0])
+        if rendered:
+            self.blend(frame, *rendered)
+        return frame
+
+
+class CaptionedFrameSource:
+    """Bọc một frame source (ví dụ KenBurnsFrameSource), vẽ caption cố định lên mỗi frame"""
+
+    def __init__(self, inner, caption: np.ndarray, x: int, y: int):
+        self.inner = inner
+        self.caption = caption
+        self.x = x
+        self.y = y
+
+    def __call__(self, index: int, out: np.ndarray) -> None:
+        self.inner(index, out)
+        SubtitleRasterizer.blend(out, self.caption, self.x, self.y)
@@ -0,0 +1,193 @@
+import os
+import math
+import asyncio
+import hashlib
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+from config.cloudinary import CloudinaryConfig
+from config.render_config import (
+    FFMPEG_BINARY,
+    THUMBNAIL_SIZE,
+    THUMBNAIL_POSITION,
+    STORYBOARD_INTERVAL,
+    STORYBOARD_TILE_WIDTH,
+    STORYBOARD_COLUMNS,
+    STORYBOARD_ROWS,
+    THUMBNAIL_WORKERS,
+)
+from service.ffmpeg_service import FFmpegService
+from service.caption_builder import format_timestamp
+
+
+def _run_ffmpeg(binary: str, args: List[str]) -> None:
+    result = subprocess.run([binary, "-hide_banner", "-loglevel", "error", "-y", *args],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise Exception(f"Lỗi khi chạy ffmpeg: {result.stderr.decode('utf-8', errors='ignore')[-500:]}")
+
+
+def extract_poster(binary: str, input_path: str, time: float, output_path: str, width: int, height: int) -> str:
+    """
+    Lấy một frame làm thumbnail: seek tới keyframe trước time rồi decode tới đúng thời điểm.
+    Chạy trong tiến trình worker nên chỉ nhận và trả về dữ liệu đơn giản.
+    """
+    _run_ffmpeg(binary, [
+        "-ss", f"{time:.3f}", "-i", input_path, "-an",
+        "-frames:v", "1", "-vf", f"scale={width}:{height},setsar=1", "-q:v", "3",
+        output_path,
+    ])
+    return output_path
+
+
+def extract_sprite(binary: str, input_path: str, start: float, count: int, interval: float,
+                   tile_width: int, tile_height: int, columns: int, output_path: str) -> str:
+    """
+    Ghép count frame (mỗi interval giây, từ start) thành một ảnh sprite dạng lưới.
+    Chỉ decode keyframe (-skip_frame nokey) nên nhanh hơn nhiều so với decode toàn bộ video,
+    ô ứng với thời điểm không có keyframe dùng keyframe gần nhất trước đó.
+    """
+    rows = math.ceil(count / columns)
+    _run_ffmpeg(binary, [
+        "-skip_frame", "nokey", "-ss", f"{start:.3f}", "-t", f"{count * interval:.3f}", "-i", input_path, "-an",
+        "-vf", f"fps=1/{interval},scale={tile_width}:{tile_height},setsar=1,"
+               f"tile={columns}x{rows}",
+        "-frames:v", "1", "-q:v", "5",
+        output_path,
+    ])
+    return output_path
+
+
+def _fit(width: int, height: int, long_side: int) -> tuple:
+    """Kích thước chẵn giữ tỷ lệ với cạnh dài long_side (không phóng to)"""
+    scale = min(long_side / max(width, height), 1.0)
+    return max(int(width * scale) // 2 * 2, 2), max(int(height * scale) // 2 * 2, 2)
+
+
+class ThumbnailService:
+    """
+    Tạo thumbnail và storyboard (sprite + WebVTT chỉ mục để xem trước khi tua) từ file video đã render.
+    Thumbnail và từng sprite được trích song song trong process pool ngay từ file local,
+    không phụ thuộc transformation bất đồng bộ của Cloudinary nên thumbnailUrl luôn có khi video hoàn thành.
+    Tên file trên Cloudinary theo hash nội dung nên upload lại cùng ảnh không tạo bản mới.
+    """
+
+    def __init__(self, size: int = THUMBNAIL_SIZE, position: float = THUMBNAIL_POSITION,
+                 interval: float = STORYBOARD_INTERVAL, tile_width: int = STORYBOARD_TILE_WIDTH,
+                 columns: int = STORYBOARD_COLUMNS, rows: int = STORYBOARD_ROWS, max_workers: int = THUMBNAIL_WORKERS):
+        self.size = size
+        self.position = position
+        self.interval = interval
+        self.tile_width = tile_width
+        self.columns = columns
+        self.rows = rows
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.ffmpeg = FFmpegService()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Process pool trích frame, chỉ khởi tạo khi cần"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def storyboard_vtt(self, sprite_urls: List[str], duration: float, tile_width: int, tile_height: int) -> str:
+        """
+        Chỉ mục WebVTT của storyboard: mỗi cue trỏ tới một ô trong sprite (#xywh=x,y,w,h)
+        Args:
+            sprite_urls: URL các sprite theo thứ tự thời gian
+            duration: Thời lượng video (giây)
+            tile_width, tile_height: Kích thước một ô
+        Returns:
+            Nội dung file VTT
+        """
+        per_sprite = self.columns * self.rows
+        count = math.ceil(duration / self.interval)
+        blocks = []
+        for idx in range(count):
+            start, end = idx * self.interval, min((idx + 1) * self.interval, duration)
+            position = idx % per_sprite
+            x, y = position % self.columns * tile_width, position // self.columns * tile_height
+            blocks.append(
+                f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n"
+                f"{sprite_urls[idx // per_sprite]}#xywh={x},{y},{tile_width},{tile_height}\n"
+            )
+        return "WEBVTT\n\n" + "\n".join(blocks)
+
+    def _upload(self, path: str, folder: str, name: str, extension: str, resource_type: str) -> str:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+        # Ảnh không cần đuôi trong public ID, file raw (VTT) giữ đuôi để player nhận đúng định dạng
+        public_id = f"{name}-{digest}.{extension}" if resource_type == "raw" else f"{name}-{digest}"
+        result = CloudinaryConfig().upload_file(path, folder=folder, resource_type=resource_type, public_id=public_id)
+        return result["secure_url"]
+
+    async def create(self, input_path: str, work_dir: str, video_id: str) -> Dict[str, Any]:
+        """
+        Trích, upload thumbnail và storyboard của video
+        Args:
+            input_path: File mp4 đã render
+            work_dir: Thư mục tạm chứa ảnh
+            video_id: ID của video
+        Returns:
+            Dict gồm "thumbnailUrl" và "storyboard" {"vtt", "sprites", "interval", "tileWidth", "tileHeight"}
+        """
+        try:
+            info = await asyncio.to_thread(self.ffmpeg.probe_video, input_path)
+            duration = info["duration"]
+            if duration <= 0:
+                raise ValueError("Không đọc được thời lượng video")
+            os.makedirs(work_dir, exist_ok=True)
+            loop = asyncio.get_running_loop()
+
+            width, height = _fit(info["width"], info["height"], self.size)
+            tile_width, tile_height = _fit(info["width"], info["height"], self.tile_width)
+            poster = loop.run_in_executor(
+                self.executor, extract_poster, FFMPEG_BINARY, input_path,
+                min(duration * self.position, max(duration - 0.1, 0.0)),
+                os.path.join(work_dir, "poster.jpg"), width, height
+            )
+
+            # Mỗi sprite là một job riêng, video dài có nhiều sprite được trích song song
+            per_sprite = self.columns * self.rows
+            count = math.ceil(duration / self.interval)
+            sprites = [
+                loop.run_in_executor(
+                    self.executor, extract_sprite, FFMPEG_BINARY, input_path, first * self.interval,
+                    min(per_sprite, count - first), self.interval, tile_width, tile_height, self.columns,
+                    os.path.join(work_dir, f"storyboard_{first // per_sprite:03d}.jpg")
+                )
+                for first in range(0, count, per_sprite)
+            ]
+            poster_path, *sprite_paths = await asyncio.gather(poster, *sprites)
+
+            folder = f"videos/{video_id}/thumbnails"
+            uploads = [asyncio.to_thread(self._upload, poster_path, folder, "poster", "jpg", "image")]
+            uploads += [
+                asyncio.to_thread(self._upload, path, folder, f"storyboard-{number:03d}", "jpg", "image")
+                for number, path in enumerate(sprite_paths)
+            ]
+            poster_url, *sprite_urls = await asyncio.gather(*uploads)
+
+            vtt_path = os.path.join(work_dir, "storyboard.vtt")
+            with open(vtt_path, "w", encoding="utf-8") as f:
+                f.write(self.storyboard_vtt(sprite_urls, duration, tile_width, tile_height))
+            vtt_url = await asyncio.to_thread(self._upload, vtt_path, folder, "storyboard", "vtt", "raw")
+
+            return {
+                "thumbnailUrl": poster_url,
+                "storyboard": {
+                    "vtt": vtt_url,
+                    "sprites": sprite_urls,
+                    "interval": self.interval,
+                    "tileWidth": tile_width,
+                    "tileHeight": tile_height,
+                },
+            }
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi tạo thumbnail: {str(e)}")
@@ -0,0 +1,151 @@
+import copy
+from typing import Dict, Any, List, Tuple
+
+# Độ chính xác thời gian trên timeline (giây), start/length được làm tròn theo mili giây
+TIME_PRECISION = 3
+
+# Clip ngắn hơn ngưỡng này (sau khi làm tròn) bị coi là rỗng
+MIN_CLIP_LENGTH = 0.001
+
+
+def _round(value: float) -> float:
+    return round(float(value), TIME_PRECISION)
+
+
+class TimelineOptimizer:
+    """
+    Tối ưu timeline Shotstack trước khi gửi render:
+    - làm tròn start/length theo mili giây dựa trên mốc đầu/cuối của clip, không cộng dồn sai số
+    - bỏ clip rỗng (length bằng 0, thiếu src, title không có chữ)
+    - gộp các clip ảnh liền nhau dùng cùng ảnh (và cùng fit, không có effect chuyển động)
+      thành một clip, bỏ luôn transition giữa 2 ảnh giống nhau; gộp các clip title liền nhau cùng nội dung
+    - bỏ transition rỗng
+    Kết quả kèm báo cáo số clip/transition đã bỏ.
+    """
+
+    def optimize(self, timeline_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        """
+        Tối ưu timeline
+        Args:
+            timeline_data: Dữ liệu render Shotstack (timeline, output) do create_timeline tạo
+        Returns:
+            Tuple (timeline đã tối ưu, báo cáo {clipsBefore, clipsAfter, removedClips, mergedClips,
+            droppedClips, removedTransitions})
+        """
+        optimized = copy.deepcopy(timeline_data)
+        report = {"clipsBefore": 0, "clipsAfter": 0, "removedClips": 0, "mergedClips": 0,
+                  "droppedClips": 0, "removedTransitions": 0}
+
+        tracks = optimized.get("timeline", {}).get("tracks", [])
+        for track in tracks:
+            clips = track.get("clips", [])
+            report["clipsBefore"] += len(clips)
+            clips = self._round_clips(clips)
+            clips = self._drop_degenerate(clips, report)
+            clips = self._merge_adjacent(clips, report)
+            for clip in clips:
+                if "transition" in clip and not any(clip["transition"].values()):
+                    del clip["transition"]
+                    report["removedTransitions"] += 1
+            track["clips"] = clips
+            report["clipsAfter"] += len(clips)
+
+        # Bỏ track không còn clip nào
+        optimized["timeline"]["tracks"] = [track for track in tracks if track.get("clips")]
+        report["removedClips"] = report["clipsBefore"] - report["clipsAfter"]
+        return optimized, report
+
+    def _round_clips(self, clips: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Làm tròn mốc bắt đầu và kết thúc rồi tính lại length, để clip liền nhau vẫn khớp mốc"""
+        for clip in clips:
+            start = float(clip.get("start", 0))
+            end = start + float(clip.get("length", 0))
+            clip["start"] = _round(start)
+            clip["length"] = _round(_round(end) - clip["start"])
+        return clips
+
+    def _drop_degenerate(self, clips: List[Dict[str, Any]], report: Dict[str, int]) -> List[Dict[str, Any]]:
+        kept = []
+        for clip in clips:
+            asset = clip.get("asset") or {}
+            empty = (
+                clip["length"] < MIN_CLIP_LENGTH
+                or (asset.get("type") in ("image", "video", "audio") and not asset.get("src"))
+                or (asset.get("type") == "title" and not str(asset.get("text") or "").strip())
+            )
+            if empty:
+                report["droppedClips"] += 1
+            else:
+                kept.append(clip)
+        return kept
+
+    def _mergeable(self, previous: Dict[str, Any], clip: Dict[str, Any]) -> bool:
+        """2 clip liền nhau (clip sau bắt đầu đúng lúc clip trước kết thúc) có cùng nội dung"""
+        if _round(previous["start"] + previous["length"]) != clip["start"]:
+            return False
+        asset_type = clip["asset"].get("type")
+        if asset_type not in ("image", "title"):
+            # Audio/video phát lại từ đầu ở mỗi clip nên không gộp được
+            return False
+        # Effect chuyển động chạy lại theo từng clip, gộp sẽ làm thay đổi chuyển động
+        if previous.get("effect") or clip.get("effect"):
+            return False
+        keys = set(previous) | set(clip)
+        return all(
+            previous.get(key) == clip.get(key)
+            for key in keys - {"start", "length", "transition"}
+        )
+
+    def _merge_adjacent(self, clips: List[Dict[str, Any]], report: Dict[str, int]) -> List[Dict[str, Any]]:
+        # Mỗi loại asset được xét riêng (ảnh và title nằm xen kẽ trên cùng track)
+        last_by_type: Dict[str, Dict[str, Any]] = {}
+        merged = []
+        for clip in sorted(clips, key=lambda item: item["start"]):
+            asset_type = clip["asset"].get("type")
+            previous = last_by_type.get(asset_type)
+            if previous is not None and self._mergeable(previous, clip):
+                previous["length"] = _round(clip["start"] + clip["length"] - previous["start"])
+                # Giữ transition vào của clip đầu và transition ra của clip cuối
+                transition = {}
+                if (previous.get("transition") or {}).get("in"):
+                    transition["in"] = previous["transition"]["in"]
+                if (clip.get("transition") or {}).get("out"):
+                    transition["out"] = clip["transition"]["out"]
+                removed = sum(
+                    1 for item in (previous.get("transition") or {}, clip.get("transition") or {})
+                    for _ in item
+                ) - len(transition)
+                report["removedTransitions"] += removed
+                if transition:
+                    previous["transition"] = transition
+                else:
+                    previous.pop("transition", None)
+                report["mergedClips"] += 1
+                continue
+            last_by_type[asset_type] = clip
+            merged.append(clip)
+        return merged
+
+    def merge_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Gộp các segment liền nhau có cùng ảnh, cùng phụ đề và không có chuyển động (dùng cho renderer local,
+        bỏ được đoạn transition giữa 2 ảnh giống nhau). Transition vào của segment đầu được giữ lại.
+        Args:
+            segments: Danh sách segment theo thứ tự timeline
+        Returns:
+            Danh sách segment đã gộp (tổng thời lượng không đổi)
+        """
+        merged: List[Dict[str, Any]] = []
+        for segment in segments:
+            previous = merged[-1] if merged else None
+            if (
+                previous is not None
+                and previous.get("image") == segment.get("image")
+                and previous.get("caption") == segment.get("caption")
+                and not previous.get("motion")
+                and not segment.get("motion")
+            ):
+                merged[-1] = {**previous, "duration": _round(float(previous["duration"]) + float(segment["duration"]))}
+                continue
+            merged.append(segment)
+        return merged
@@ -0,0 +1,205 @@
+import os
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, Optional
+import cv2
+import numpy as np
+from config.cloudinary import CloudinaryConfig
+from config.render_config import VARIANT_PLATFORMS
+from service.ffmpeg_service import FFmpegService
+
+# Kích thước cạnh dài của frame dùng để phân tích saliency và tốc độ lấy mẫu (frame/giây)
+ANALYSIS_SIZE = 192
+ANALYSIS_FPS = 2
+
+# Chênh lệch trung bình so với frame đầu cảnh (0-255) coi là chuyển cảnh
+SHOT_CHANGE_THRESHOLD = 18.0
+# Trọng tâm saliency dịch quá tỷ lệ này của khung hình so với trọng tâm của cảnh cũng coi là cảnh mới
+SALIENCY_SHIFT_THRESHOLD = 0.1
+
+
+def spectral_residual_saliency(frame: np.ndarray) -> np.ndarray:
+    """
+    Bản đồ saliency theo phương pháp spectral residual (Hou & Zhang 2007).
+    cv2.saliency chỉ có trong opencv-contrib nên thuật toán được viết lại bằng FFT của NumPy và bộ lọc của OpenCV.
+    Args:
+        frame: Ảnh xám uint8
+    Returns:
+        Bản đồ saliency float32 cùng kích thước frame, chuẩn hóa tổng bằng 1
+    """
+    small = cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA).astype(np.float32)
+    spectrum = np.fft.fft2(small)
+    log_amplitude = np.log(np.abs(spectrum) + 1e-6).astype(np.float32)
+    residual = log_amplitude - cv2.blur(log_amplitude, (3, 3))
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    saliency = cv2.GaussianBlur(saliency.astype(np.float32), (0, 0), 3)
+    saliency = cv2.resize(saliency, (frame.shape[1], frame.shape[0]), interpolation=cv2.INTER_LINEAR)
+    total = float(saliency.sum())
+    return saliency / total if total > 0 else np.full_like(saliency, 1.0 / saliency.size)
+
+
+def _even(value: float) -> int:
+    return max(int(value) // 2 * 2, 2)
+
+
+class VariantService:
+    """
+    Tạo các bản video theo tỷ lệ khung hình của từng nền tảng (9:16, 1:1, ...) từ một video đã render.
+    Video được lấy mẫu ở độ phân giải thấp, chia theo chuyển cảnh; với mỗi cảnh, khung cắt được đặt ở
+    trọng tâm saliency dọc theo cạnh bị cắt. Các bản được encode song song (crop theo biểu thức thời gian,
+    audio giữ nguyên) và không phóng to: kích thước đầu ra bằng kích thước khung cắt.
+    """
+
+    def __init__(self, platforms: Optional[Dict[str, str]] = None, max_workers: int = 3):
+        self.platforms = platforms or VARIANT_PLATFORMS
+        self.max_workers = max_workers
+        self.ffmpeg = FFmpegService()
+
+    def sample_frames(self, input_path: str, width: int, height: int) -> Tuple[np.ndarray, int, int]:
+        """Decode frame xám thu nhỏ ANALYSIS_FPS frame/giây"""
+        scale = ANALYSIS_SIZE / max(width, height)
+        sample_width, sample_height = _even(width * scale), _even(height * scale)
+        result = subprocess.run(
+            [self.ffmpeg.binary, "-hide_banner", "-loglevel", "error", "-i", input_path, "-an",
+             "-vf", f"fps={ANALYSIS_FPS},scale={sample_width}:{sample_height},format=gray",
+             "-f", "rawvideo", "pipe:1"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            raise Exception(f"Lỗi khi chạy ffmpeg: {result.stderr.decode('utf-8', errors='ignore')[-500:]}")
+        frames = np.frombuffer(result.stdout, dtype=np.uint8)
+        return frames.reshape(-1, sample_height, sample_width), sample_width, sample_height
+
+    def centroids(self, maps: np.ndarray) -> np.ndarray:
+        """Trọng tâm (x, y) của từng bản đồ saliency, tỷ lệ 0-1 theo kích thước frame"""
+        height, width = maps.shape[1:]
+        x = (maps.sum(axis=1) * (np.arange(width) + 0.5)).sum(axis=1) / maps.sum(axis=(1, 2)) / width
+        y = (maps.sum(axis=2) * (np.arange(height) + 0.5)).sum(axis=1) / maps.sum(axis=(1, 2)) / height
+        return np.stack([x, y], axis=1)
+
+    def shots(self, frames: np.ndarray, centers: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        Chia các frame mẫu thành cảnh: cảnh mới khi frame khác nhiều so với frame đầu cảnh
+        (bắt được cả chuyển cảnh mờ dần) hoặc khi trọng tâm saliency dịch xa khỏi trọng tâm của cảnh
+        """
+        cuts, start = [0], 0
+        for idx in range(1, len(frames)):
+            difference = float(np.abs(frames[idx].astype(np.int16) - frames[start]).mean())
+            shift = float(np.abs(centers[idx] - centers[start:idx].mean(axis=0)).max())
+            if difference > SHOT_CHANGE_THRESHOLD or shift > SALIENCY_SHIFT_THRESHOLD:
+                cuts.append(idx)
+                start = idx
+        cuts.append(len(frames))
+        return list(zip(cuts, cuts[1:]))
+
+    def crop_windows(self, input_path: str, info: Dict[str, Any],
+                     crop_width: int, crop_height: int) -> List[Tuple[float, int, int]]:
+        """
+        Vị trí khung cắt cho từng cảnh
+        Returns:
+            Danh sách (thời điểm bắt đầu cảnh, x, y) theo pixel của video gốc
+        """
+        width, height = info["width"], info["height"]
+        frames, sample_width, sample_height = self.sample_frames(input_path, width, height)
+        if not len(frames):
+            return [(0.0, (width - crop_width) // 2, (height - crop_height) // 2)]
+
+        maps = np.stack([spectral_residual_saliency(frame) for frame in frames])
+        centers = self.centroids(maps)
+        windows = []
+        for start, end in self.shots(frames, centers):
+            # Trọng tâm của cảnh theo saliency cộng dồn, quy về pixel của video gốc
+            center_x, center_y = self.centroids(maps[start:end].sum(axis=0, keepdims=True))[0]
+            x = int(np.clip(center_x * width - crop_width / 2, 0, width - crop_width)) // 2 * 2
+            y = int(np.clip(center_y * height - crop_height / 2, 0, height - crop_height)) // 2 * 2
+            windows.append((start / ANALYSIS_FPS, x, y))
+        return windows
+
+    def crop_size(self, width: int, height: int, aspect_ratio: str) -> Tuple[int, int]:
+        """Khung cắt lớn nhất có tỷ lệ aspect_ratio nằm trong video gốc"""
+        ratio_w, ratio_h = (float(part) for part in aspect_ratio.split(":"))
+        if width / height > ratio_w / ratio_h:
+            return _even(height * ratio_w / ratio_h), _even(height)
+        return _even(width), _even(width * ratio_h / ratio_w)
+
+    def _position_expression(self, windows: List[Tuple[float, int, int]], axis: int) -> str:
+        """Biểu thức ffmpeg của vị trí khung cắt theo thời gian (bậc thang theo cảnh)"""
+        expression = str(windows[-1][axis])
+        for current, following in reversed(list(zip(windows, windows[1:]))):
+            expression = f"if(lt(t,{following[0]:.3f}),{current[axis]},{expression})"
+        return expression
+
+    def encode_variant(self, input_path: str, output_path: str, info: Dict[str, Any], aspect_ratio: str) -> Dict[str, Any]:
+        """
+        Cắt video theo tỷ lệ aspect_ratio với khung cắt theo saliency của từng cảnh
+        Returns:
+            Dict gồm aspectRatio, width, height, path
+        """
+        crop_width, crop_height = self.crop_size(info["width"], info["height"], aspect_ratio)
+        windows = self.crop_windows(input_path, info, crop_width, crop_height)
+        crop = (
+            f"crop={crop_width}:{crop_height}:"
+            f"x='{self._position_expression(windows, 1)}':y='{self._position_expression(windows, 2)}'"
+        )
+        self.ffmpeg.run([
+            "-i", input_path,
+            "-vf", f"{crop},setsar=1",
+            # Giữ thời điểm từng frame của video gốc (frame rate thay đổi), keyframe mỗi 2 giây
+            *self.ffmpeg.passthrough_codec_args(crop_width, crop_height, keyframe_seconds=2),
+            "-c:a", "copy",
+            "-movflags", "+faststart",
+            output_path,
+        ])
+        return {"aspectRatio": aspect_ratio, "width": crop_width, "height": crop_height, "path": output_path}
+
+    def create_variants(self, input_path: str, work_dir: str, video_id: str, source_aspect: str,
+                        source_url: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Tạo và upload bản video cho mọi nền tảng
+        Args:
+            input_path: File mp4 đã render
+            work_dir: Thư mục tạm
+            video_id: ID của video
+            source_aspect: Tỷ lệ khung hình của video gốc
+            source_url: URL video gốc, dùng cho nền tảng cùng tỷ lệ với video gốc
+        Returns:
+            Dict platform -> {aspectRatio, width, height, url}
+        """
+        try:
+            info = self.ffmpeg.probe_video(input_path)
+            digest = hashlib.sha256()
+            with open(input_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            digest = digest.hexdigest()[:16]
+
+            variants = {}
+            aspects = sorted({aspect for aspect in self.platforms.values() if aspect != source_aspect})
+            os.makedirs(work_dir, exist_ok=True)
+
+            def build(aspect: str) -> Dict[str, Any]:
+                name = aspect.replace(":", "x")
+                variant = self.encode_variant(input_path, os.path.join(work_dir, f"{name}.mp4"), info, aspect)
+                result = CloudinaryConfig().upload_file(
+                    variant.pop("path"),
+                    folder=f"videos/{video_id}/variants",
+                    resource_type="video",
+                    public_id=f"{name}-{digest}",
+                )
+                return {**variant, "url": result["secure_url"]}
+
+            # Mỗi tỷ lệ chỉ encode một lần dù nhiều nền tảng dùng chung
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                by_aspect = dict(zip(aspects, executor.map(build, aspects)))
+
+            for platform, aspect in self.platforms.items():
+                if aspect == source_aspect:
+                    variants[platform] = {"aspectRatio": aspect, "width": info["width"],
+                                          "height": info["height"], "url": source_url}
+                else:
+                    variants[platform] = by_aspect[aspect]
+            return variants
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi tạo bản video theo nền tảng: {str(e)}")
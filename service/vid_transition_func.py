@@ -0,0 +1,218 @@
+import os
+import uuid
+from typing import Iterator, Optional, Tuple
+import cv2
+import numpy as np
+from service.ffmpeg_service import FFmpegService
+
+# Các kiểu transition được engine hỗ trợ
+ANIMATIONS = (
+    "rotation", "rotation_inv", "zoom_in", "zoom_out",
+    "translation", "translation_inv", "long_translation", "long_translation_inv"
+)
+
+# Số frame xử lý trong một khối, giới hạn bộ nhớ của mảng frame (8 frame 1080p ~ 50MB)
+DEFAULT_CHUNK_SIZE = 8
+
+
+def _smoothstep(t: np.ndarray) -> np.ndarray:
+    return t * t * (3 - 2 * t)
+
+
+def transition_matrices(animation: str, num_frames: int, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tính ma trận affine của toàn bộ frame trong transition cùng một lúc
+    Args:
+        animation: Kiểu transition (xem ANIMATIONS)
+        num_frames: Số frame của transition
+        width, height: Kích thước frame
+    Returns:
+        Tuple (matrices, use_next):
+            matrices: Mảng (num_frames, 2, 3) float64 cho cv2.warpAffine
+            use_next: Mảng bool (num_frames,), True nếu frame lấy từ ảnh của segment sau
+    """
+    if animation not in ANIMATIONS:
+        raise ValueError(f"Transition không hợp lệ: {animation}")
+
+    # Nửa đầu: ảnh trước biến đổi từ 0 -> 1, nửa sau: ảnh sau biến đổi từ 1 -> 0
+    t = (np.arange(num_frames) + 0.5) / num_frames
+    use_next = t >= 0.5
+    progress = np.where(use_next, 2 * (1 - t), 2 * t)
+    progress = _smoothstep(np.clip(progress, 0, 1))
+    side = np.where(use_next, -1.0, 1.0)
+
+    angle = np.zeros(num_frames)
+    scale = np.ones(num_frames)
+    shift_x = np.zeros(num_frames)
+
+    base = animation.replace("_inv", "")
+    direction = -1.0 if animation.endswith("_inv") else 1.0
+    if base == "rotation":
+        angle = direction * side * 90.0 * progress
+    elif base == "zoom_in":
+        scale = np.where(use_next, 1 / (1 + progress), 1 + progress)
+    elif base == "zoom_out":
+        scale = np.where(use_next, 1 + progress, 1 / (1 + progress))
+    elif base == "translation":
+        shift_x = -direction * side * 0.5 * width * progress
+    elif base == "long_translation":
+        shift_x = -direction * side * width * progress
+
+    # Giống cv2.getRotationMatrix2D nhưng vector hóa trên toàn bộ frame
+    radians = np.deg2rad(angle)
+    alpha = scale * np.cos(radians)
+    beta = scale * np.sin(radians)
+    cx, cy = width / 2, height / 2
+
+    matrices = np.empty((num_frames, 2, 3))
+    matrices[:, 0, 0] = alpha
+    matrices[:, 0, 1] = beta
+    matrices[:, 0, 2] = (1 - alpha) * cx - beta * cy + shift_x
+    matrices[:, 1, 0] = -beta
+    matrices[:, 1, 1] = alpha
+    matrices[:, 1, 2] = beta * cx + (1 - alpha) * cy
+    return matrices, use_next
+
+
+def brightness_luts(num_frames: int, max_brightness: float) -> np.ndarray:
+    """
+    Bảng tra độ sáng cho từng frame: sáng dần tới max_brightness ở giữa transition rồi trở lại bình thường
+    Returns:
+        Mảng (num_frames, 256) uint8
+    """
+    t = (np.arange(num_frames) + 0.5) / num_frames
+    gain = 1 + (max_brightness - 1) * np.sin(np.pi * t)
+    return np.clip(np.arange(256)[None, :] * gain[:, None], 0, 255).astype(np.uint8)
+
+
+def read_image(path: str) -> np.ndarray:
+    """Đọc ảnh BGR, dùng np.fromfile + imdecode để đọc được cả đường dẫn unicode trên Windows"""
+    image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Không đọc được ảnh: {path}")
+    return image
+
+
+def load_frame(source, width: int, height: int, last: bool = False) -> np.ndarray:
+    """
+    Đọc một frame BGR kích thước (height, width) theo kiểu cover
+    Args:
+        source: Đường dẫn ảnh, mảng numpy BGR hoặc clip có get_frame (moviepy, trả về RGB)
+        width, height: Kích thước frame
+        last: Lấy frame cuối nếu source là clip
+    """
+    if isinstance(source, np.ndarray):
+        frame = source
+    elif hasattr(source, "get_frame"):
+        moment = max(source.duration - 1.0 / (source.fps or 30), 0) if last else 0
+        frame = cv2.cvtColor(np.asarray(source.get_frame(moment), dtype=np.uint8), cv2.COLOR_RGB2BGR)
+    else:
+        frame = read_image(source)
+
+    src_h, src_w = frame.shape[:2]
+    ratio = max(width / src_w, height / src_h)
+    resized_w, resized_h = max(width, round(src_w * ratio)), max(height, round(src_h * ratio))
+    interpolation = cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR
+    frame = cv2.resize(frame, (resized_w, resized_h), interpolation=interpolation)
+    x, y = (resized_w - width) // 2, (resized_h - height) // 2
+    return np.ascontiguousarray(frame[y:y + height, x:x + width, :3])
+
+
+def iter_transition_chunks(frame_a: np.ndarray, frame_b: np.ndarray, animation: str, num_frames: int = 30,
+                           max_brightness: float = 1.5, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                           buffer: Optional[np.ndarray] = None) -> Iterator[np.ndarray]:
+    """
+    Sinh các khối frame của transition trên một buffer cấp phát sẵn
+    Args:
+        frame_a: Frame của segment trước (H, W, 3) uint8
+        frame_b: Frame của segment sau, cùng kích thước
+        animation: Kiểu transition (xem ANIMATIONS) hoặc "fade"
+        num_frames: Số frame
+        max_brightness: Độ sáng tối đa ở giữa transition
+        chunk_size: Số frame mỗi khối
+        buffer: Buffer (chunk_size, H, W, 3) dùng lại giữa các lần gọi
+    Yields:
+        View (n, H, W, 3) trên buffer, chỉ hợp lệ tới lần yield tiếp theo
+    """
+    height, width = frame_a.shape[:2]
+    if buffer is None:
+        buffer = np.empty((chunk_size, height, width, 3), dtype=np.uint8)
+    chunk_size = buffer.shape[0]
+
+    if animation == "fade":
+        # Crossfade: trọng số của cả transition tính một lần
+        weights = (np.arange(num_frames) + 0.5) / num_frames
+        for start in range(0, num_frames, chunk_size):
+            count = min(chunk_size, num_frames - start)
+            chunk = buffer[:count]
+            for offset in range(count):
+                weight = float(weights[start + offset])
+                cv2.addWeighted(frame_a, 1 - weight, frame_b, weight, 0, dst=chunk[offset])
+            yield chunk
+        return
+
+    matrices, use_next = transition_matrices(animation, num_frames, width, height)
+    luts = brightness_luts(num_frames, max_brightness)
+
+    for start in range(0, num_frames, chunk_size):
+        count = min(chunk_size, num_frames - start)
+        chunk = buffer[:count]
+        for offset in range(count):
+            index = start + offset
+            cv2.warpAffine(
+                frame_b if use_next[index] else frame_a,
+                matrices[index],
+                (width, height),
+                dst=chunk[offset],
+                flags=cv2.INTER_LINEAR,
+                borderMode=cv2.BORDER_REFLECT_101,
+            )
+            cv2.LUT(chunk[offset], luts[index], dst=chunk[offset])
+        yield chunk
+
+
+def write_transition(frame_a: np.ndarray, frame_b: np.ndarray, output_path: str, animation: str,
+                     num_frames: int = 30, max_brightness: float = 1.5, fps: int = 30,
+                     ffmpeg: Optional[FFmpegService] = None) -> str:
+    """
+    Render transition và ghi thẳng các khối frame vào pipe của encoder
+    Returns:
+        Đường dẫn file mp4 đầu ra
+    """
+    height, width = frame_a.shape[:2]
+    ffmpeg = ffmpeg or FFmpegService()
+    with ffmpeg.open_rawvideo_writer(output_path, width, height, fps) as writer:
+        for chunk in iter_transition_chunks(frame_a, frame_b, animation, num_frames, max_brightness):
+            writer.write(chunk)
+    return output_path
+
+
+def create_transition(input_videos, temp_path: str, animation: str, num_frames: int = 30,
+                      max_brightness: float = 1.5, fps: int = 30,
+                      width: int = 1920, height: int = 1080) -> str:
+    """
+    Tạo video transition giữa 2 ảnh hoặc 2 clip
+    Args:
+        input_videos: [nguồn trước, nguồn sau], mỗi nguồn là đường dẫn ảnh, mảng BGR hoặc clip moviepy
+        temp_path: Thư mục lưu video transition
+        animation: Kiểu transition (xem ANIMATIONS)
+        num_frames: Số frame của transition
+        max_brightness: Độ sáng tối đa ở giữa transition
+        fps: Frame rate
+        width, height: Kích thước frame
+    Returns:
+        Đường dẫn file mp4 của transition
+    """
+    try:
+        if len(input_videos) != 2:
+            raise ValueError("Cần đúng 2 nguồn để tạo transition")
+
+        frame_a = load_frame(input_videos[0], width, height, last=True)
+        frame_b = load_frame(input_videos[1], width, height)
+
+        os.makedirs(temp_path, exist_ok=True)
+        output_path = os.path.join(temp_path, f"transition_{animation}_{uuid.uuid4().hex[:8]}.mp4")
+        return write_transition(frame_a, frame_b, output_path, animation, num_frames, max_brightness, fps)
+
+    except Exception as e:
+        raise Exception(f"Lỗi khi tạo transition: {str(e)}")
@@ -1,22 +1,74 @@
 from models.video_model import VideoModel
 from typing import Dict, Any, List
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
 from config.mongodb import MongoDB
 from service.shotstack_service import ShotstackService
 from config.cloudinary import CloudinaryConfig
+from config.render_config import (
+    RENDERER, RENDER_SHARED_DIR, IMAGE_NORMALIZE_ENABLED, AUDIO_PREMIX_ENABLED, HLS_ENABLED, VARIANTS_ENABLED,
+    THUMBNAIL_ENABLED, DRAFT_PREVIEW_ENABLED, VIDEO_DETAIL_MAX_AGE, VIDEO_PREVIEW_MAX_AGE, ENCODING_PROFILE,
+    get_encoding_profile,
+)
+from service.chunk_render_service import ChunkRenderCoordinator
+from service.asset_cache import AssetCache
+from service.preflight_service import PreflightService, PreflightError, PREFLIGHT_ENABLED
+from service.audio_probe import AudioProbe, DURATION_MODE
+from service.image_normalizer import ImageNormalizer
+from service.audio_mixer import AudioMixer
+from service.timeline_optimizer import TimelineOptimizer
+from service.caption_builder import CaptionBuilder
+from service.hls_packager import HLSPackager
+from service.variant_service import VariantService
+from service.thumbnail_service import ThumbnailService
+from service.draft_render_service import DraftRenderService
+from service.preview_proxy import PreviewProxy
+from service.clip_service import ClipService
+from service.render_predictor import RenderPredictor
+from service.stage_ledger import StageLedger
 import asyncio
+import json
 import time
 import requests
 import tempfile
+import shutil
 
 class VideoService:
     def __init__(self):
         self.mongodb = MongoDB()
-        self.video_collection = self.mongodb.get_collection("videos")
+        self.video_collection = self.mongodb.get_collection("videos", versioned=True)
         self.shotstack = ShotstackService()
         self.cloudinary = CloudinaryConfig()
+        self.preflight = PreflightService()
+        self.audio_probe = AudioProbe()
+        self.image_normalizer = ImageNormalizer()
+        self.audio_mixer = AudioMixer()
+        self.timeline_optimizer = TimelineOptimizer()
+        self.caption_builder = CaptionBuilder()
+        self.hls_packager = HLSPackager()
+        self.variant_service = VariantService()
+        self.thumbnail_service = ThumbnailService()
+        self._draft_renderer = None
+        self.preview_proxy = PreviewProxy()
+        self.clip_service = ClipService()
+        self.render_predictor = RenderPredictor()
+        self.ledger = StageLedger()
+        self._chunk_renderer = None
+
+    @property
+    def chunk_renderer(self) -> ChunkRenderCoordinator:
+        """Coordinator render local theo chunk, chỉ khởi tạo khi có video dùng renderer local"""
+        if self._chunk_renderer is None:
+            self._chunk_renderer = ChunkRenderCoordinator()
+        return self._chunk_renderer
+
+    @property
+    def draft_renderer(self) -> DraftRenderService:
+        """Renderer bản nháp được tạo khi cần"""
+        if self._draft_renderer is None:
+            self._draft_renderer = DraftRenderService()
+        return self._draft_renderer
     
     async def generate_video(self, data: Dict[str, Any]) -> Dict[str, str]:
         """
@@ -27,11 +79,27 @@ class VideoService:
             Dict chứa message và videoId
         """
         try:
+            received_at = datetime.now()
             # Validate ObjectId
             ObjectId(data["job_id"])
             
             # Validate inputs
             self._validate_inputs(data)
+            renderer = data.get("renderer") or RENDERER
+            if renderer not in ("shotstack", "local"):
+                raise ValueError(f"Renderer không hợp lệ: {renderer}")
+            data["encodingProfile"] = data.get("encodingProfile") or ENCODING_PROFILE
+            get_encoding_profile(data["encodingProfile"])
+
+            # Kiểm tra trước các URL ảnh/audio, tránh gửi render rồi mới thất bại
+            if PREFLIGHT_ENABLED:
+                await self.preflight.check(data)
+            checked_at = datetime.now()
+
+            # Đặt hoặc kiểm tra duration của segment theo thời lượng audio (đọc từ header file)
+            duration_mode = data.get("durationMode") or DURATION_MODE
+            data["segments"] = await self.audio_probe.align_segments(data, duration_mode)
+            probed_at = datetime.now()
             
             # Tạo model
             video_model = VideoModel(
@@ -52,6 +120,13 @@ class VideoService:
                 "user_id": data["user_id"],
                 "segments": data["segments"],
                 "backgroundMusic": data.get("backgroundMusic"),
+                "subtitle": data.get("subtitle", {}),
+                "resolution": data.get("resolution", "1080"),
+                "aspectRatio": data.get("aspectRatio", "16:9"),
+                "renderer": renderer,
+                "encodingProfile": data["encodingProfile"],
+                "durationMode": duration_mode,
+                "draftPreview": self._draft_enabled(data),
                 "status": video_model.status,
                 "progress": video_model.progress,
                 "log": video_model.log,
@@ -59,45 +134,513 @@ class VideoService:
             }
             result = self.video_collection.insert_one(video_data)
             video_id = str(result.inserted_id)
+            # Video chưa có ID khi kiểm tra asset nên thời gian được ghi sau khi tạo document
+            if PREFLIGHT_ENABLED:
+                self.ledger.record(video_id, "preflight", received_at, checked_at)
+            self.ledger.record(video_id, "duration_probe", checked_at, probed_at)
+
+            # Chuẩn hóa ảnh, phụ đề, mix audio và gửi render chạy nền, request trả về ngay
+            asyncio.create_task(self._prepare_render(video_id, renderer, data))
+            
+            return {
+                "message": "Đang tiến hành tạo video...",
+                "videoId": video_id
+            }
             
-            # Tạo timeline và gửi request render
+        except PreflightError:
+            raise
+        except Exception as e:
+            raise Exception(f"Lỗi khi tạo video: {str(e)}")
+
+    async def _prepare_render(self, video_id: str, renderer: str, data: Dict[str, Any]):
+        """
+        Chạy nền các bước trước render và gửi render, lỗi được ghi vào trạng thái của video
+        Args:
+            video_id: ID của video trong database
+            renderer: "shotstack" hoặc "local"
+            data: Dữ liệu tạo video
+        """
+        try:
+            await self._start_render(video_id, renderer, data)
+        except Exception as e:
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {
+                    "$set": {
+                        "status": "failed",
+                        "log": f"Lỗi chuẩn bị render: {str(e)}"
+                    }
+                }
+            )
+
+    async def _start_render(self, video_id: str, renderer: str, data: Dict[str, Any]):
+        """
+        Bắt đầu render video bằng Shotstack hoặc renderer local theo chunk
+        Args:
+            video_id: ID của video trong database
+            renderer: "shotstack" hoặc "local"
+            data: Dữ liệu tạo video
+        """
+        # Phụ đề và mix audio không phụ thuộc ảnh nên chạy song song với bước chuẩn hóa ảnh
+        captions = asyncio.create_task(self._publish_captions(video_id, data))
+        premix = None
+        if renderer != "local":
+            premix = asyncio.create_task(self._premix_audio(video_id, data))
+
+        # Thay ảnh gốc (có thể rất lớn) bằng bản đã cắt/thu nhỏ đúng khung hình, URL trong database giữ nguyên
+        if IMAGE_NORMALIZE_ENABLED:
+            with self.ledger.stage(video_id, "image_normalize"):
+                data = {**data, "segments": await self.image_normalizer.normalize_segments(data)}
+
+        # Bản nháp độ phân giải thấp render song song, preview dùng bản nháp cho tới khi bản đầy đủ xong
+        if self._draft_enabled(data):
+            self.video_collection.update_one({"_id": ObjectId(video_id)}, {"$set": {"draftUrl": None}})
+            asyncio.create_task(self.render_draft(video_id, data))
+
+        captions = await captions
+
+        if renderer == "local":
+            # Render trên các chunk worker thay vì Shotstack
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {
+                    "$set": {
+                        "status": "processing",
+                        "streamingUrl": None,
+                        "variants": None,
+                        "log": "Đang render video..."
+                    }
+                }
+            )
+            asyncio.create_task(self.render_local(video_id, data))
+            return
+
+        mixed_audio = await premix
+
+        # Tạo timeline và gửi request render
+        with self.ledger.stage(video_id, "render_submit"):
             timeline = self.shotstack.create_timeline(
                 data["segments"],
                 data.get("backgroundMusic"),
-                data.get("subtitle", {}).get("enabled", False),
+                (data.get("subtitle") or {}).get("enabled", False),
                 data.get("resolution", "1080"),
-                data.get("aspectRatio", "16:9")
+                data.get("aspectRatio", "16:9"),
+                mixed_audio,
+                captions["srt"] if captions else None,
+                data.get("encodingProfile")
             )
+            # Gộp clip trùng, bỏ clip rỗng và làm tròn thời gian trước khi gửi render
+            timeline, timeline_report = self.timeline_optimizer.optimize(timeline)
+            print(f"🧹 Tối ưu timeline: {timeline_report['clipsBefore']} -> {timeline_report['clipsAfter']} clip "
+                  f"(bỏ {timeline_report['removedClips']} clip, {timeline_report['removedTransitions']} transition)")
             print(timeline)
             render_response = self.shotstack.submit_render(timeline)
             
             if not render_response or "response" not in render_response or "id" not in render_response["response"]:
                 raise Exception("Không thể lấy Render ID từ response")
-                
-            render_id = render_response["response"]["id"]
             
-            # Cập nhật render_id vào database
+        render_id = render_response["response"]["id"]
+        
+        # Cập nhật render_id vào database
+        self.video_collection.update_one(
+            {"_id": ObjectId(video_id)},
+            {
+                "$set": {
+                    "render_id": render_id,
+                    "timelineReport": timeline_report,
+                    "status": "processing",
+                    "streamingUrl": None,
+                    "variants": None,
+                    "renderFeatures": self.render_predictor.features(data, "shotstack"),
+                    "renderSubmittedAt": datetime.now(),
+                    "log": "Đang render video..."
+                }
+            }
+        )
+        
+        # Bắt đầu kiểm tra trạng thái render
+        asyncio.create_task(self.check_render_status(video_id, render_id))
+
+    async def _publish_captions(self, video_id: str, data: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Tạo phụ đề có thời gian (SRT/VTT) lưu cạnh video, Shotstack vẽ thành một layer caption duy nhất
+        Args:
+            video_id: ID của video trong database
+            data: Dữ liệu tạo video
+        Returns:
+            Dict chứa URL srt/vtt, None nếu không có phụ đề
+        """
+        if not (data.get("subtitle") or {}).get("enabled", False):
+            return None
+        try:
+            with self.ledger.stage(video_id, "captions"):
+                captions = await self.caption_builder.publish(
+                    video_id, self.caption_builder.build_cues(data["segments"])
+                )
+            self.video_collection.update_one({"_id": ObjectId(video_id)}, {"$set": {"captions": captions}})
+            return captions
+        except Exception as e:
+            print(f"⚠️ Không thể tạo file phụ đề, dùng clip title cho từng segment: {str(e)}")
+            return None
+
+    async def _premix_audio(self, video_id: str, data: Dict[str, Any]) -> str:
+        """
+        Mix sẵn voice-over và nhạc nền thành một track, lỗi thì để Shotstack mix từng clip như cũ
+        Args:
+            video_id: ID của video trong database
+            data: Dữ liệu tạo video
+        Returns:
+            URL của track đã mix, None nếu không mix
+        """
+        if not AUDIO_PREMIX_ENABLED or not all(segment.get("audio") for segment in data["segments"]):
+            return None
+        try:
+            with self.ledger.stage(video_id, "audio_premix"):
+                return await self.audio_mixer.premix_url(data)
+        except Exception as e:
+            print(f"⚠️ Không thể mix sẵn audio, dùng audio từng segment: {str(e)}")
+            return None
+
+    async def edit_segments(self, video_id: str, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Sửa một số segment của video đã tạo và render lại.
+        Với renderer local, chỉ các đoạn có nội dung thay đổi (segment bị sửa và transition kề bên) được render lại,
+        các đoạn còn lại lấy từ kho đoạn dùng chung rồi ghép lại bằng stream copy.
+        Shotstack không hỗ trợ render một phần nên video dùng Shotstack được render lại toàn bộ.
+        Args:
+            video_id: ID của video cần sửa
+            changes: Danh sách thay đổi, mỗi phần tử có "index" của segment và các trường cần sửa
+        Returns:
+            Dict chứa message, videoId và index các segment đã thay đổi
+        """
+        try:
+            # Kiểm tra ObjectId hợp lệ
+            ObjectId(video_id)
+            
+            video = self.video_collection.find_one({"_id": ObjectId(video_id)})
+            if not video:
+                raise ValueError(f"Không tìm thấy video với ID: {video_id}")
+            if video.get("status") in ("pending", "processing"):
+                raise ValueError("Video đang được render, vui lòng thử lại sau")
+            if video.get("kind") in ("trim", "compilation"):
+                raise ValueError("Video cắt/ghép từ video khác không có segment để sửa")
+
+            segments = [dict(segment) for segment in video.get("segments", [])]
+            positions = {segment["index"]: position for position, segment in enumerate(segments)}
+            changed = []
+            for change in changes:
+                if change.get("index") not in positions:
+                    raise ValueError(f"Không tìm thấy segment với index: {change.get('index')}")
+                segment = segments[positions[change["index"]]]
+                updates = {
+                    field: value for field, value in change.items()
+                    if field != "index" and value is not None and segment.get(field) != value
+                }
+                if updates:
+                    segment.update(updates)
+                    changed.append(change["index"])
+
+            if not changed:
+                return {
+                    "message": "Không có thay đổi",
+                    "videoId": video_id,
+                    "changedSegments": []
+                }
+
+            data = {
+                "job_id": video["job_id"],
+                "script_id": video["script_id"],
+                "segments": segments,
+                "backgroundMusic": video.get("backgroundMusic"),
+                "subtitle": video.get("subtitle", {}),
+                "resolution": video.get("resolution", "1080"),
+                "aspectRatio": video.get("aspectRatio", "16:9"),
+                "encodingProfile": video.get("encodingProfile"),
+                "draftPreview": video.get("draftPreview"),
+            }
+            self._validate_inputs(data)
+            if PREFLIGHT_ENABLED:
+                await self.preflight.check(data)
+            segments = await self.audio_probe.align_segments(data, video.get("durationMode", "client"))
+            data["segments"] = segments
+
             self.video_collection.update_one(
                 {"_id": ObjectId(video_id)},
                 {
                     "$set": {
-                        "render_id": render_id,
-                        "status": "processing",
-                        "log": "Đang render video..."
+                        "segments": segments,
+                        "status": "pending",
+                        "progress": 0,
+                        "log": f"Đang render lại {len(changed)} segment đã sửa...",
+                        "updatedAt": datetime.now()
                     }
                 }
             )
-            
-            # Bắt đầu kiểm tra trạng thái render
-            asyncio.create_task(self.check_render_status(video_id, render_id))
-            
+            asyncio.create_task(self._prepare_render(video_id, video.get("renderer", "shotstack"), data))
+
             return {
-                "message": "Đang tiến hành tạo video...",
-                "videoId": video_id
+                "message": "Đang tiến hành render lại video...",
+                "videoId": video_id,
+                "changedSegments": sorted(changed)
             }
-            
+
+        except PreflightError:
+            raise
         except Exception as e:
-            raise Exception(f"Lỗi khi tạo video: {str(e)}")
+            raise Exception(f"Lỗi khi sửa video: {str(e)}")
+
+    def _finished_sources(self, video_ids: List[str]) -> List[Dict[str, Any]]:
+        """Lấy các video nguồn theo thứ tự, tất cả phải đã render xong"""
+        sources = []
+        for video_id in video_ids:
+            ObjectId(video_id)
+            video = self.video_collection.find_one({"_id": ObjectId(video_id)})
+            if not video:
+                raise ValueError(f"Không tìm thấy video với ID: {video_id}")
+            if video.get("status") != "done" or not self.preview_proxy.source_url(video):
+                raise ValueError(f"Video chưa render xong: {video_id}")
+            sources.append(video)
+        return sources
+
+    def _insert_clip(self, kind: str, first: Dict[str, Any], user_id: str, **fields) -> str:
+        """Tạo document cho video cắt/ghép, thông tin job/script lấy theo video nguồn đầu tiên"""
+        result = self.video_collection.insert_one({
+            "job_id": first.get("job_id"),
+            "script_id": first.get("script_id"),
+            "user_id": user_id or first.get("user_id"),
+            "kind": kind,
+            "segments": [],
+            "resolution": first.get("resolution", "1080"),
+            "aspectRatio": first.get("aspectRatio", "16:9"),
+            "renderer": "clip",
+            "status": "processing",
+            "progress": 0,
+            "log": "Đang cắt/ghép video...",
+            "createdAt": datetime.now(),
+            **fields
+        })
+        return str(result.inserted_id)
+
+    async def trim_video(self, video_id: str, start: float, end: float = None) -> Dict[str, str]:
+        """
+        Tạo video mới là một đoạn của video đã render (stream copy, chỉ encode lại phần sát điểm cắt)
+        Args:
+            video_id: ID của video nguồn
+            start: Thời điểm bắt đầu (giây)
+            end: Thời điểm kết thúc (giây), None là tới hết video
+        Returns:
+            Dict chứa message và videoId của video mới
+        """
+        try:
+            if start < 0 or (end is not None and end <= start):
+                raise ValueError("Khoảng cắt không hợp lệ")
+            source = self._finished_sources([video_id])[0]
+            new_id = self._insert_clip(
+                "trim", source, source.get("user_id"),
+                source={"videoId": video_id, "start": start, "end": end}
+            )
+            asyncio.create_task(self.process_clip(new_id, [source], start, end))
+            return {
+                "message": "Đang tiến hành cắt video...",
+                "videoId": new_id
+            }
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi cắt video: {str(e)}")
+
+    async def compile_videos(self, video_ids: List[str], user_id: str = None) -> Dict[str, str]:
+        """
+        Tạo video mới ghép nối tiếp các video đã render (stream copy, chỉ encode lại video khác tham số)
+        Args:
+            video_ids: ID các video nguồn theo thứ tự
+            user_id: Người tạo, mặc định theo video nguồn đầu tiên
+        Returns:
+            Dict chứa message và videoId của video mới
+        """
+        try:
+            if len(video_ids) < 2:
+                raise ValueError("Cần ít nhất 2 video để ghép")
+            sources = self._finished_sources(video_ids)
+            new_id = self._insert_clip("compilation", sources[0], user_id, sources=video_ids)
+            asyncio.create_task(self.process_clip(new_id, sources))
+            return {
+                "message": "Đang tiến hành ghép video...",
+                "videoId": new_id
+            }
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi ghép video: {str(e)}")
+
+    async def process_clip(self, video_id: str, sources: List[Dict[str, Any]], start: float = None, end: float = None):
+        """
+        Cắt (một nguồn, start/end) hoặc ghép (nhiều nguồn) video rồi upload lên Cloudinary như video thường
+        Args:
+            video_id: ID của video mới
+            sources: Document các video nguồn
+            start, end: Khoảng cắt khi cắt video
+        """
+        work_dir = tempfile.mkdtemp(prefix=f"clip_{video_id}_")
+        try:
+            # File nguồn lấy qua kho asset nên video đã xem trước/cắt trước đó không phải tải lại
+            paths = [
+                (await asyncio.to_thread(self.preview_proxy.fetch, self.preview_proxy.source_url(video)))["path"]
+                for video in sources
+            ]
+            output_path = os.path.join(work_dir, "clip.mp4")
+            if len(sources) == 1:
+                result = await asyncio.to_thread(self.clip_service.trim, paths[0], start, end, output_path)
+            else:
+                result = await asyncio.to_thread(self.clip_service.compile, paths, output_path)
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {
+                    "$set": {
+                        "progress": 80,
+                        "log": "Đang upload video lên Cloudinary...",
+                        "copiedSeconds": round(result["copiedSeconds"], 3),
+                        "encodedSeconds": round(result["encodedSeconds"], 3)
+                    }
+                }
+            )
+
+            cloudinary_info = await self.upload_file_to_cloudinary(output_path, video_id)
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {"$set": {"originPath": cloudinary_info["video_url"]}}
+            )
+            self._complete_video(video_id, cloudinary_info, duration=int(round(result["duration"])))
+            if HLS_ENABLED or VARIANTS_ENABLED:
+                await self.publish_outputs(video_id, output_path)
+
+        except Exception as e:
+            print(f"Lỗi khi cắt/ghép video: {str(e)}")
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {
+                    "$set": {
+                        "status": "failed",
+                        "log": f"Lỗi cắt/ghép: {str(e)}"
+                    }
+                }
+            )
+
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _draft_enabled(self, data: Dict[str, Any]) -> bool:
+        """Bật bản nháp theo tham số draftPreview của request, mặc định theo biến môi trường DRAFT_PREVIEW_ENABLED"""
+        draft_preview = data.get("draftPreview")
+        return DRAFT_PREVIEW_ENABLED if draft_preview is None else bool(draft_preview)
+
+    async def render_draft(self, video_id: str, data: Dict[str, Any]):
+        """
+        Render bản nháp, upload và lưu vào draftUrl (lỗi chỉ được log, không ảnh hưởng bản đầy đủ)
+        Args:
+            video_id: ID của video trong database
+            data: Dữ liệu tạo video
+        """
+        work_dir = tempfile.mkdtemp(prefix=f"draft_{video_id}_")
+        try:
+            started = time.time()
+            draft_url = await asyncio.to_thread(self.draft_renderer.render_and_upload, data, work_dir, video_id)
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {"$set": {"draftUrl": draft_url, "draftReadyAt": datetime.now()}}
+            )
+            print(f"📝 Bản nháp của video {video_id} sẵn sàng sau {time.time() - started:.1f}s")
+
+        except Exception as e:
+            print(f"⚠️ Không thể render bản nháp: {str(e)}")
+
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _schedule_eta(self, video_id: str, features: Dict[str, Any], estimate: Dict[str, float],
+                      submitted_at: datetime, started_at: datetime = None) -> datetime:
+        """
+        Lưu dự đoán thời gian và thời điểm dự kiến hoàn thành (etaAt, gồm cả upload) của job
+        Returns:
+            Thời điểm renderer dự kiến render xong
+        """
+        render_done_at = (
+            (started_at or submitted_at + timedelta(seconds=estimate["queueSeconds"]))
+            + timedelta(seconds=estimate["renderSeconds"])
+        )
+        self.video_collection.update_one(
+            {"_id": ObjectId(video_id)},
+            {
+                "$set": {
+                    "renderFeatures": features,
+                    "renderEstimate": estimate,
+                    "etaAt": render_done_at + timedelta(seconds=estimate["uploadSeconds"])
+                }
+            }
+        )
+        return render_done_at
+
+    async def render_local(self, video_id: str, data: Dict[str, Any]):
+        """
+        Render video bằng renderer local phân tán theo chunk rồi upload lên Cloudinary
+        Args:
+            video_id: ID của video trong database
+            data: Dữ liệu tạo video
+        """
+        def on_progress(done: int, total: int):
+            # Phần upload chiếm 10% cuối
+            progress = int(done * 90 / total)
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {
+                    "$set": {
+                        "progress": progress,
+                        "log": f"Đang render: {done}/{total} chunk"
+                    }
+                }
+            )
+
+        try:
+            features = self.render_predictor.features(data, "local")
+            estimate = self.render_predictor.predict({**features, "queueSeconds": 0})
+            started_at = datetime.now()
+            self._schedule_eta(video_id, features, estimate, started_at, started_at)
+
+            output_path = os.path.join(RENDER_SHARED_DIR, video_id, "final.mp4")
+            with self.ledger.stage(video_id, "render") as timer:
+                await self.chunk_renderer.render(video_id, data, output_path, on_progress)
+                timer.bytes = os.path.getsize(output_path)
+            rendered_at = datetime.now()
+
+            cloudinary_info = await self.upload_file_to_cloudinary(output_path, video_id)
+            # Renderer local không có URL gốc, dùng URL trên Cloudinary
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {
+                    "$set": { "originPath": cloudinary_info["video_url"] }
+                }
+            )
+            self._complete_video(video_id, cloudinary_info)
+            self.render_predictor.record(
+                video_id, features, 0,
+                (rendered_at - started_at).total_seconds(),
+                (datetime.now() - rendered_at).total_seconds()
+            )
+            if HLS_ENABLED or VARIANTS_ENABLED:
+                await self.publish_outputs(video_id, output_path)
+
+        except Exception as e:
+            print(f"Lỗi khi render video local: {str(e)}")
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {
+                    "$set": {
+                        "status": "failed",
+                        "log": f"Lỗi render: {str(e)}"
+                    }
+                }
+            )
+
+        finally:
+            self.chunk_renderer.cleanup(video_id)
 
     async def upload_to_cloudinary(self, video_url: str, video_id: str) -> dict:
         """
@@ -109,21 +652,48 @@ class VideoService:
             Dict chứa thông tin về video trên Cloudinary
         """
         try:
-            # Tải video về máy tạm thời
-            response = requests.get(video_url, stream=True)
-            if response.status_code != 200:
-                raise Exception("Không thể tải video từ URL")
-
-            # Tạo file tạm thời
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        temp_file.write(chunk)
-                temp_file_path = temp_file.name
-
-            # Upload lên Cloudinary
-            result = self.cloudinary.upload_file(
-                temp_file_path,
+            with self.ledger.stage(video_id, "download") as timer:
+                # Tải video về máy tạm thời
+                response = requests.get(video_url, stream=True)
+                if response.status_code != 200:
+                    raise Exception("Không thể tải video từ URL")
+
+                # Tạo file tạm thời
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if chunk:
+                            temp_file.write(chunk)
+                    temp_file_path = temp_file.name
+                timer.bytes = os.path.getsize(temp_file_path)
+
+            try:
+                return await self.upload_file_to_cloudinary(temp_file_path, video_id)
+            finally:
+                # Xóa file tạm thời
+                os.unlink(temp_file_path)
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi upload video lên Cloudinary: {str(e)}")
+
+    async def _timed(self, video_id: str, stage: str, awaitable, byte_count: int = None):
+        """Chờ awaitable và ghi thời gian vào sổ giai đoạn của video"""
+        with self.ledger.stage(video_id, stage) as timer:
+            timer.bytes = byte_count
+            return await awaitable
+
+    async def upload_file_to_cloudinary(self, file_path: str, video_id: str) -> dict:
+        """
+        Upload file video local lên Cloudinary
+        Args:
+            file_path: Đường dẫn file video
+            video_id: ID của video trong database
+        Returns:
+            Dict chứa thông tin về video trên Cloudinary
+        """
+        try:
+            upload = self._timed(video_id, "cloudinary_upload", asyncio.to_thread(
+                self.cloudinary.upload_file,
+                file_path,
                 folder=f"videos/{video_id}",
                 resource_type="video",
                 eager_transformations=[
@@ -135,38 +705,195 @@ class VideoService:
                         "crop": "fill"
                     }
                 ]
-            )
+            ), os.path.getsize(file_path))
+            if not THUMBNAIL_ENABLED:
+                result, thumbnails = await upload, None
+            else:
+                # Thumbnail và storyboard lấy từ file local, chạy song song với upload video
+                work_dir = tempfile.mkdtemp(prefix=f"thumbnails_{video_id}_")
+                try:
+                    result, thumbnails = await asyncio.gather(
+                        upload,
+                        self._timed(video_id, "thumbnails", self.thumbnail_service.create(file_path, work_dir, video_id)),
+                        return_exceptions=True
+                    )
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                if isinstance(result, BaseException):
+                    raise result
+                if isinstance(thumbnails, BaseException):
+                    print(f"⚠️ Không thể tạo thumbnail từ video, dùng thumbnail của Cloudinary: {str(thumbnails)}")
+                    thumbnails = None
 
-            # Xóa file tạm thời
-            os.unlink(temp_file_path)
-            
+            # Thumbnail eager của Cloudinary chạy bất đồng bộ nên thường chưa có ngay trong response
+            eager_thumbnail = result["eager"][0]["secure_url"] if result.get("eager") else None
             return {
                 "video_url": result["secure_url"],
-                "thumbnail_url": result["eager"][0]["secure_url"] if result.get("eager") else None,
+                "thumbnail_url": thumbnails["thumbnailUrl"] if thumbnails else eager_thumbnail,
+                "storyboard": thumbnails["storyboard"] if thumbnails else None,
                 "public_id": result["public_id"]
             }
 
         except Exception as e:
             raise Exception(f"Lỗi khi upload video lên Cloudinary: {str(e)}")
 
-    async def check_render_status(self, video_id: str, render_id: str):
+    async def publish_outputs(self, video_id: str, source: str):
         """
-        Kiểm tra trạng thái render của video
+        Tạo các bản phát hành từ video đã render (chạy sau khi video đã hoàn thành, lỗi không làm hỏng video):
+        HLS nhiều mức bitrate (streamingUrl) và bản theo tỷ lệ khung hình của từng nền tảng (variants).
+        Video được tải về một lần và hai việc chạy song song.
+        Args:
+            video_id: ID của video trong database
+            source: File mp4 local hoặc URL của video đã render
         """
-        max_attempts = 60  # Số lần kiểm tra tối đa
-        interval = 5  # Thời gian giữa các lần kiểm tra (giây)
+        work_dir = tempfile.mkdtemp(prefix=f"outputs_{video_id}_")
+        try:
+            input_path = source
+            if source.startswith(("http://", "https://")):
+                input_path = os.path.join(work_dir, "source.mp4")
+                response = requests.get(source, stream=True, timeout=60)
+                if response.status_code != 200:
+                    raise Exception("Không thể tải video từ URL")
+                with open(input_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        if chunk:
+                            f.write(chunk)
+
+            tasks = []
+            if HLS_ENABLED:
+                tasks.append(self.package_stream(video_id, input_path, os.path.join(work_dir, "hls")))
+            if VARIANTS_ENABLED:
+                tasks.append(self.create_variants(video_id, input_path, os.path.join(work_dir, "variants")))
+            await asyncio.gather(*tasks)
+
+        except Exception as e:
+            print(f"Lỗi khi tạo bản phát hành của video: {str(e)}")
+
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def package_stream(self, video_id: str, input_path: str, work_dir: str):
+        """
+        Đóng gói video đã render thành HLS nhiều mức bitrate và lưu URL master playlist vào streamingUrl
+        Args:
+            video_id: ID của video trong database
+            input_path: File mp4 đã render
+            work_dir: Thư mục tạm chứa file HLS
+        """
+        try:
+            with self.ledger.stage(video_id, "hls_package"):
+                result = await asyncio.to_thread(self.hls_packager.package_and_publish, input_path, work_dir, video_id)
+            self.video_collection.update_one(
+                {"_id": ObjectId(video_id)},
+                {
+                    "$set": {
+                        "streamingUrl": result["url"],
+                        "streamingRenditions": result["renditions"]
+                    }
+                }
+            )
+
+        except Exception as e:
+            print(f"Lỗi khi đóng gói HLS: {str(e)}")
+
+    async def create_variants(self, video_id: str, input_path: str, work_dir: str):
+        """
+        Tạo bản video theo tỷ lệ khung hình của từng nền tảng (cắt theo saliency) và lưu vào variants
+        Args:
+            video_id: ID của video trong database
+            input_path: File mp4 đã render
+            work_dir: Thư mục tạm chứa các bản video
+        """
+        try:
+            video = self.video_collection.find_one({"_id": ObjectId(video_id)})
+            if not video:
+                raise ValueError(f"Không tìm thấy video với ID: {video_id}")
+            with self.ledger.stage(video_id, "variants"):
+                variants = await asyncio.to_thread(
+                    self.variant_service.create_variants,
+                    input_path,
+                    work_dir,
+                    video_id,
+                    video.get("aspectRatio", "16:9"),
+                    video.get("outputPath", ""),
+                )
+            self.video_collection.update_one({"_id": ObjectId(video_id)}, {"$set": {"variants": variants}})
+
+        except Exception as e:
+            print(f"Lỗi khi tạo bản video theo nền tảng: {str(e)}")
+
+    def _complete_video(self, video_id: str, cloudinary_info: dict, duration: int = None):
+        """
+        Cập nhật video đã hoàn thành: URL trên Cloudinary, thumbnail và tổng duration
+        (video cắt/ghép không có segment nên truyền duration đo từ file)
+        """
+        # Lấy thông tin video từ database để tính duration
+        video = self.video_collection.find_one({"_id": ObjectId(video_id)})
+        if not video:
+            raise ValueError(f"Không tìm thấy video với ID: {video_id}")
+            
+        # Tính tổng duration dạng int từ các segments
+        total_duration = duration if duration is not None else sum(
+            int(segment.get("duration", 0)) for segment in video.get("segments", [])
+        )
         
-        for attempt in range(max_attempts):
+        # Cập nhật trạng thái, URL video và duration
+        fields = {
+            "status": "done",
+            "outputPath": cloudinary_info["video_url"],
+            "storyboard": cloudinary_info.get("storyboard"),
+            "cloudinaryPublicId": cloudinary_info["public_id"],
+            "progress": 100,
+            "log": "Hoàn thành!",
+            "duration": total_duration
+        }
+        # Notification eager của Cloudinary có thể tới trước và đã lưu thumbnail: không ghi đè bằng None
+        derived_assets = video.get("derivedAssets") or []
+        thumbnail_url = cloudinary_info["thumbnail_url"] or (derived_assets[0]["url"] if derived_assets else None)
+        if thumbnail_url is not None:
+            fields["thumbnailUrl"] = thumbnail_url
+        self.video_collection.update_one({"_id": ObjectId(video_id)}, {"$set": fields})
+
+    async def check_render_status(self, video_id: str, render_id: str):
+        """
+        Kiểm tra trạng thái render của video.
+        Lịch hỏi trạng thái và thời gian chờ tối đa theo thời gian dự đoán của job (RenderPredictor):
+        ngủ tới lúc job dự kiến rời hàng đợi rồi tới lúc dự kiến render xong thay vì hỏi đều đặn,
+        video dài được chờ lâu hơn video ngắn
+        """
+        video = self.video_collection.find_one({"_id": ObjectId(video_id)}) or {}
+        features = video.get("renderFeatures") or self.render_predictor.features(video, "shotstack")
+        submitted_at = video.get("renderSubmittedAt") or datetime.now()
+        estimate = self.render_predictor.predict(features)
+        render_done_at = self._schedule_eta(video_id, features, estimate, submitted_at)
+        started_at = None
+        polls = queue_polls = 0
+
+        while (datetime.now() - submitted_at).total_seconds() < self.render_predictor.timeout(estimate):
             try:
                 # Kiểm tra trạng thái render
+                polls += 1
                 render_status = self.shotstack.get_render_status(render_id)
-                
-                if not render_status:
-                    continue
-                    
-                status = render_status.get("response", {}).get("status")
-                
+                status = (render_status or {}).get("response", {}).get("status")
+
+                if started_at is None and status in ("fetching", "rendering", "saving"):
+                    # Job rời hàng đợi: dự đoán lại với thời gian chờ thực tế
+                    started_at = datetime.now()
+                    queue_polls = polls
+                    self.ledger.record(video_id, "queue", submitted_at, started_at, attempts=polls)
+                    estimate = self.render_predictor.predict(
+                        {**features, "queueSeconds": (started_at - submitted_at).total_seconds()}
+                    )
+                    render_done_at = self._schedule_eta(video_id, features, estimate, submitted_at, started_at)
+
                 if status == "done":
+                    rendered_at = datetime.now()
+                    if started_at is None:
+                        # Không kịp thấy trạng thái đang render: thời gian chờ lấy theo dự đoán
+                        started_at = min(submitted_at + timedelta(seconds=estimate["queueSeconds"]), rendered_at)
+                        self.ledger.record(video_id, "queue", submitted_at, started_at, attempts=polls)
+                    self.ledger.record(video_id, "render", started_at, rendered_at, attempts=polls - queue_polls)
+
                     # Lấy URL video từ response
                     video_url = render_status["response"]["url"]
                     
@@ -180,34 +907,21 @@ class VideoService:
                     
                     # Upload video lên Cloudinary
                     cloudinary_info = await self.upload_to_cloudinary(video_url, video_id)
-                    
-                    # Lấy thông tin video từ database để tính duration
-                    video = self.video_collection.find_one({"_id": ObjectId(video_id)})
-                    if not video:
-                        raise ValueError(f"Không tìm thấy video với ID: {video_id}")
-                        
-                    # Tính tổng duration dạng int từ các segments
-                    total_duration = sum(int(segment.get("duration", 0)) for segment in video.get("segments", []))
-                    
-                    # Cập nhật trạng thái, URL video và duration
-                    self.video_collection.update_one(
-                        {"_id": ObjectId(video_id)},
-                        {
-                            "$set": {
-                                "status": "done",
-                                "outputPath": cloudinary_info["video_url"],
-                                "thumbnailUrl": cloudinary_info["thumbnail_url"],
-                                "cloudinaryPublicId": cloudinary_info["public_id"],
-                                "progress": 100,
-                                "log": "Hoàn thành!",
-                                "duration": total_duration
-                            }
-                        }
+                    self._complete_video(video_id, cloudinary_info)
+                    self.render_predictor.record(
+                        video_id, features,
+                        (started_at - submitted_at).total_seconds(),
+                        (rendered_at - started_at).total_seconds(),
+                        (datetime.now() - rendered_at).total_seconds()
                     )
+                    if HLS_ENABLED or VARIANTS_ENABLED:
+                        asyncio.create_task(self.publish_outputs(video_id, video_url))
                     return
                     
                 elif status == "failed":
                     error_message = render_status.get("response", {}).get("error", "Không xác định")
+                    self.ledger.record(video_id, "render", started_at or submitted_at, datetime.now(),
+                                       attempts=polls - queue_polls, error=error_message)
                     self.video_collection.update_one(
                         {"_id": ObjectId(video_id)},
                         {
@@ -219,26 +933,29 @@ class VideoService:
                     )
                     return
                     
-                # Cập nhật tiến độ
-                progress = render_status.get("response", {}).get("progress", 0)
-                self.video_collection.update_one(
-                    {"_id": ObjectId(video_id)},
-                    {
-                        "$set": {
-                            "progress": progress,
-                            "log": f"Đang render: {progress}%"
+                elif render_status:
+                    # Cập nhật tiến độ
+                    progress = render_status.get("response", {}).get("progress", 0)
+                    self.video_collection.update_one(
+                        {"_id": ObjectId(video_id)},
+                        {
+                            "$set": {
+                                "progress": progress,
+                                "log": f"Đang render: {progress}%"
+                            }
                         }
-                    }
-                )
-                
-                # Đợi một khoảng thời gian trước khi kiểm tra lại
-                await asyncio.sleep(interval)
+                    )
                 
             except Exception as e:
                 print(f"Lỗi khi kiểm tra trạng thái render: {str(e)}")
-                await asyncio.sleep(interval)
+
+            # Còn trong hàng đợi thì hỏi lại quanh lúc dự kiến bắt đầu render, sau đó quanh lúc dự kiến xong
+            expected_at = render_done_at if started_at else submitted_at + timedelta(seconds=estimate["queueSeconds"])
+            await asyncio.sleep(self.render_predictor.poll_interval(expected_at))
         
-        # Nếu hết số lần kiểm tra mà vẫn chưa xong
+        # Nếu quá thời gian chờ mà vẫn chưa xong
+        self.ledger.record(video_id, "render", started_at or submitted_at, datetime.now(),
+                           attempts=polls - queue_polls, error="timeout")
         self.video_collection.update_one(
             {"_id": ObjectId(video_id)},
             {
@@ -285,6 +1002,46 @@ class VideoService:
         except Exception as e:
             raise ValueError(f"Lỗi khi kiểm tra input: {str(e)}")
 
+    async def get_video_version(self, video_id: str, endpoint: str) -> Dict[str, Any]:
+        """
+        Lấy phiên bản hiện tại của video (chỉ đọc version và status) để xử lý conditional GET
+        mà không phải dựng response
+        Args:
+            video_id: ID của video
+            endpoint: "status", "detail" hoặc "preview"
+        Returns:
+            Dict gồm "etag", "cacheControl" và "revalidate" (True nếu phải kiểm tra lại với renderer trước khi trả 304)
+        """
+        try:
+            # Kiểm tra ObjectId hợp lệ
+            ObjectId(video_id)
+
+            video = self.video_collection.find_one(
+                {"_id": ObjectId(video_id)}, {"version": 1, "status": 1, "render_id": 1}
+            )
+            if not video:
+                raise ValueError(f"Không tìm thấy video với ID: {video_id}")
+
+            status = video.get("status")
+            # Video đã xong vẫn có thể đổi (HLS, bản theo nền tảng, asset của Cloudinary, sửa segment) nên không dùng immutable
+            if status != "done" or endpoint == "status":
+                cache_control = "no-cache"
+            elif endpoint == "detail":
+                cache_control = f"public, max-age={VIDEO_DETAIL_MAX_AGE}, must-revalidate"
+            else:
+                cache_control = f"public, max-age={VIDEO_PREVIEW_MAX_AGE}, must-revalidate"
+
+            return {
+                # ETag yếu: cùng version thì nội dung tương đương (có thể khác thứ tự trường)
+                "etag": f'W/"{video_id}-{video.get("version", 0)}"',
+                "cacheControl": cache_control,
+                # get_video_status hỏi lại Shotstack khi đang render, không trả 304 trước bước đó
+                "revalidate": endpoint == "status" and status == "processing" and "render_id" in video,
+            }
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi lấy phiên bản video: {str(e)}")
+
     async def get_video_status(self, video_id: str) -> Dict[str, Any]:
         """
         Lấy thông tin trạng thái của video từ database
@@ -333,11 +1090,15 @@ class VideoService:
             
             # Lấy thông tin cập nhật từ database
             video = self.video_collection.find_one({"_id": ObjectId(video_id)})
+            # Thời gian còn lại dự đoán tới khi video hoàn thành (gồm cả upload), 0 khi đã trễ so với dự đoán
+            eta_at = video.get("etaAt") if video.get("status") in ("pending", "processing") else None
             return {
                 "videoId": video_id,
                 "status": video.get("status", "unknown"),
                 "progress": video.get("progress", 0),
-                "log": video.get("log", "Không có thông tin")
+                "log": video.get("log", "Không có thông tin"),
+                "etaSeconds": max(int((eta_at - datetime.now()).total_seconds()), 0) if eta_at else None,
+                "etaAt": eta_at
             }
             
         except Exception as e:
@@ -367,6 +1128,12 @@ class VideoService:
                 "url": video.get("outputPath", ""),
                 "status": video.get("status", "unknown"),
                 "duration": video.get("duration", 0),
+                "captions": video.get("captions"),
+                "variants": video.get("variants"),
+                "thumbnailUrl": video.get("thumbnailUrl"),
+                "storyboard": video.get("storyboard"),
+                "derivedAssets": video.get("derivedAssets"),
+                "kind": video.get("kind"),
                 "createdAt": video.get("createdAt", datetime.now())
             }
             
@@ -393,19 +1160,52 @@ class VideoService:
             # Lấy URL video từ outputPath
             video_url = video.get("outputPath")
 
-            # Lấy URL stream từ originPath
-            origin_url = video.get("originPath")
+            if video.get("status") != "done" and video.get("draftUrl"):
+                # Bản đầy đủ chưa xong: trả bản nháp độ phân giải thấp
+                return {
+                    "streamUrl": video["draftUrl"],
+                    "url": video_url,
+                    "isDraft": True
+                }
+
+            # Ưu tiên HLS nhiều mức bitrate, chưa đóng gói xong thì dùng file gốc
+            origin_url = video.get("streamingUrl") or video.get("originPath")
             if not origin_url:
                 raise ValueError("Không tìm thấy origin url")
             
             return {
                 "streamUrl": origin_url,
-                "url": video_url
+                "url": video_url,
+                "isDraft": False
             }
             
         except Exception as e:
             raise Exception(f"Lỗi khi lấy URL stream: {str(e)}")
 
+    async def get_preview_file(self, video_id: str) -> Dict[str, Any]:
+        """
+        Lấy file mp4 của video từ kho asset local (tải về ở lần xem đầu) để API tự phục vụ xem trước
+        Args:
+            video_id: ID của video cần xem trước
+        Returns:
+            Dict gồm path, size, etag, lastModified, contentType
+        """
+        try:
+            # Kiểm tra ObjectId hợp lệ
+            ObjectId(video_id)
+
+            video = self.video_collection.find_one({"_id": ObjectId(video_id)})
+            if not video:
+                raise ValueError(f"Không tìm thấy video với ID: {video_id}")
+
+            url = self.preview_proxy.source_url(video)
+            if not url:
+                raise ValueError("Video chưa có file để xem trước")
+            return await asyncio.to_thread(self.preview_proxy.fetch, url)
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi lấy file xem trước: {str(e)}")
+
     async def delete_video(self, video_id: str) -> Dict[str, str]:
         """
         Xóa video từ database
@@ -429,5 +1229,108 @@ class VideoService:
             }
             
         except Exception as e:
-            raise Exception(f"Lỗi khi xóa video: {str(e)}") 
-        
\ No newline at end of file
+            raise Exception(f"Lỗi khi xóa video: {str(e)}")
+
+    async def get_asset_cache_stats(self) -> Dict[str, Any]:
+        """
+        Lấy số liệu của cache asset (hit/miss, dung lượng) gộp từ API và các worker
+        Returns:
+            Dict chứa số liệu cache
+        """
+        try:
+            return await asyncio.to_thread(AssetCache().stats)
+        except Exception as e:
+            raise Exception(f"Lỗi khi lấy số liệu cache asset: {str(e)}")
+
+    async def get_video_stages(self, video_id: str) -> Dict[str, Any]:
+        """
+        Lấy thời gian từng giai đoạn xử lý của video
+        Args:
+            video_id: ID của video
+        Returns:
+            Dict chứa videoId và danh sách giai đoạn theo thứ tự thời gian
+        """
+        try:
+            if not self.video_collection.find_one({"_id": ObjectId(video_id)}, {"_id": 1}):
+                raise Exception("Không tìm thấy video")
+            stages = await asyncio.to_thread(self.ledger.get_stages, video_id)
+            return {"videoId": video_id, "stages": stages}
+        except Exception as e:
+            raise Exception(f"Lỗi khi lấy thời gian giai đoạn của video: {str(e)}")
+
+    async def get_stage_latency(self, since: datetime = None, until: datetime = None, hours: float = 24) -> Dict[str, Any]:
+        """
+        Lấy phân vị thời gian (p50/p95) của từng giai đoạn trong một khoảng thời gian
+        Args:
+            since: Thời điểm bắt đầu, mặc định là hours giờ trước until
+            until: Thời điểm kết thúc, mặc định là hiện tại
+            hours: Độ dài khoảng thời gian khi không truyền since
+        Returns:
+            Dict chứa since, until và số liệu theo giai đoạn
+        """
+        try:
+            # Mốc thời gian trong database là giờ local không kèm timezone: đổi tham số có timezone về dạng đó
+            # (pymongo đổi datetime có timezone sang UTC khi query)
+            since, until = (
+                value.astimezone().replace(tzinfo=None) if value is not None and value.tzinfo else value
+                for value in (since, until)
+            )
+            until = until or datetime.now()
+            since = since or until - timedelta(hours=hours)
+            if since >= until:
+                raise ValueError("Khoảng thời gian không hợp lệ")
+            return await asyncio.to_thread(self.ledger.latency_stats, since, until)
+        except Exception as e:
+            raise Exception(f"Lỗi khi lấy thời gian theo giai đoạn: {str(e)}")
+
+    async def handle_cloudinary_notification(self, body: str, timestamp: str, signature: str) -> Dict[str, Any]:
+        """
+        Nhận notification của Cloudinary khi transformation eager (chạy bất đồng bộ) hoàn thành
+        và ghi URL các asset dẫn xuất vào video tương ứng
+        Args:
+            body: Body gốc của request
+            timestamp: Header X-Cld-Timestamp
+            signature: Header X-Cld-Signature
+        Returns:
+            Dict chứa message và videoId (None nếu notification không thuộc video nào)
+        """
+        if not self.cloudinary.verify_notification(body, timestamp, signature):
+            raise PermissionError("Chữ ký notification của Cloudinary không hợp lệ")
+
+        try:
+            notification = json.loads(body)
+            public_id = notification.get("public_id")
+            eager = notification.get("eager") or []
+            if notification.get("notification_type") not in ("eager", "upload") or not public_id or not eager:
+                return {"message": "Bỏ qua notification", "videoId": None}
+
+            video = self.video_collection.find_one({"cloudinaryPublicId": public_id})
+            if not video:
+                # Notification có thể tới trước khi cloudinaryPublicId được lưu, video được upload vào videos/{video_id}
+                parts = public_id.split("/")
+                if len(parts) == 3 and parts[0] == "videos" and ObjectId.is_valid(parts[1]):
+                    video = self.video_collection.find_one({"_id": ObjectId(parts[1])})
+            if not video:
+                return {"message": "Không tìm thấy video của notification", "videoId": None}
+
+            derived_assets = [
+                {
+                    "transformation": asset.get("transformation"),
+                    "url": asset.get("secure_url") or asset.get("url"),
+                    "width": asset.get("width"),
+                    "height": asset.get("height"),
+                }
+                for asset in eager
+                if asset.get("secure_url") or asset.get("url")
+            ]
+            self.video_collection.update_one({"_id": video["_id"]}, {"$set": {"derivedAssets": derived_assets}})
+            # Thumbnail tạo từ file local (nếu có) được ưu tiên, eager chỉ bù khi chưa có thumbnail
+            if derived_assets:
+                self.video_collection.update_one(
+                    {"_id": video["_id"], "thumbnailUrl": None},
+                    {"$set": {"thumbnailUrl": derived_assets[0]["url"]}}
+                )
+            return {"message": "Đã cập nhật asset dẫn xuất", "videoId": str(video["_id"])}
+
+        except Exception as e:
+            raise Exception(f"Lỗi khi xử lý notification của Cloudinary: {str(e)}")
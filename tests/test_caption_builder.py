@@ -0,0 +1,113 @@
+import pytest
+from service.caption_builder import CaptionBuilder, format_timestamp
+
+
+@pytest.fixture
+def builder():
+    return CaptionBuilder(max_chars=20, max_lines=2, min_duration=1.0)
+
+
+def test_format_timestamp():
+    assert format_timestamp(0) == "00:00:00,000"
+    assert format_timestamp(3723.4567) == "01:02:03,457"
+    assert format_timestamp(59.9996, ".") == "00:01:00.000"
+
+
+def test_split_text_prefers_sentence_then_clause(builder):
+    text = "Xin chào mọi người. Hôm nay chúng ta học Python, một ngôn ngữ rất phổ biến."
+    assert builder.split_text(text) == [
+        "Xin chào mọi người.",
+        "Hôm nay chúng ta học Python,",
+        "một ngôn ngữ rất phổ biến.",
+    ]
+
+
+def test_split_text_respects_limit_and_keeps_words(builder):
+    text = "một hai ba bốn năm sáu bảy tám chín mười " * 4
+    chunks = builder.split_text(text)
+    assert all(len(chunk) <= 40 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_split_text_empty(builder):
+    assert builder.split_text("") == []
+    assert builder.split_text("   \n ") == []
+
+
+def test_segment_cues_cover_duration(builder):
+    cues = builder.segment_cues("Câu thứ nhất khá dài. Câu hai. Và câu thứ ba cũng khá dài.", 9)
+    assert cues[0]["start"] == 0
+    assert cues[-1]["end"] == 9
+    for previous, cue in zip(cues, cues[1:]):
+        assert previous["end"] == pytest.approx(cue["start"])
+    assert all(cue["end"] - cue["start"] >= builder.min_duration for cue in cues)
+
+
+def test_segment_cues_weight_by_length(builder):
+    cues = builder.segment_cues("Ngắn. Một câu dài hơn nhiều lần", 6)
+    assert len(cues) == 2
+    assert cues[1]["end"] - cues[1]["start"] > cues[0]["end"] - cues[0]["start"]
+
+
+def test_segment_cues_merges_short_cues(builder):
+    # Mỗi cue dưới 1 giây nên được gộp vào cue trước
+    cues = builder.segment_cues("Một. Hai. Ba.", 1.5)
+    assert len(cues) == 1
+    assert cues[0]["text"] == "Một. Hai. Ba."
+    assert cues[0]["end"] == 1.5
+
+
+def test_segment_cues_empty(builder):
+    assert builder.segment_cues("", 5) == []
+    assert builder.segment_cues("Xin chào", 0) == []
+
+
+def test_build_cues_offsets_by_segment(builder):
+    cues = builder.build_cues([
+        {"index": 0, "script": "Xin chào.", "duration": 2},
+        {"index": 1, "script": "", "duration": 3},
+        {"index": 2, "script": "Tạm biệt.", "duration": 4},
+    ])
+    assert [(cue["start"], cue["end"], cue["segment"]) for cue in cues] == [(0, 2, 0), (5, 9, 2)]
+
+
+def test_split_segments_cuts_between_parts_and_same_image(builder):
+    parts = builder.split_segments([
+        {"index": 0, "image": "a.jpg", "script": "Câu thứ nhất khá dài. Câu thứ hai cũng dài.", "duration": 6},
+        {"index": 1, "image": "a.jpg", "script": "Câu khác.", "duration": 2},
+        {"index": 2, "image": "b.jpg", "script": "Ảnh mới.", "duration": 2},
+    ])
+    assert [part["index"] for part in parts] == [0, 0, 1, 2]
+    assert sum(part["duration"] for part in parts) == pytest.approx(10)
+    assert "transition" not in parts[0]
+    assert parts[1]["transition"] == {"duration": 0}
+    # Cùng ảnh với segment trước: chỉ đổi caption, không fade
+    assert parts[2]["transition"] == {"duration": 0}
+    assert "transition" not in parts[3]
+
+
+def test_split_segments_keeps_motion_segment(builder):
+    parts = builder.split_segments([
+        {"index": 0, "image": "a.jpg", "script": "Câu thứ nhất khá dài. Câu thứ hai cũng dài.", "duration": 6,
+         "motion": "zoomIn"},
+        {"index": 1, "image": "a.jpg", "script": "Câu khác.", "duration": 2},
+    ])
+    assert len(parts) == 2
+    assert parts[0]["caption"] == "Câu thứ nhất khá dài. Câu thứ hai cũng dài."
+    assert "transition" not in parts[1]
+
+
+def test_srt_and_vtt(builder):
+    cues = [{"start": 0, "end": 1.5, "text": "Xin chào"}, {"start": 1.5, "end": 3, "text": "Tạm biệt"}]
+    assert builder.to_srt(cues) == (
+        "1\n00:00:00,000 --> 00:00:01,500\nXin chào\n\n"
+        "2\n00:00:01,500 --> 00:00:03,000\nTạm biệt\n"
+    )
+    assert builder.to_vtt(cues).startswith("WEBVTT\n\n00:00:00.000 --> 00:00:01.500\nXin chào\n")
+
+
+def test_wrap_balances_lines(builder):
+    wrapped = builder.wrap("Hôm nay chúng ta học Python rất vui")
+    lines = wrapped.split("\n")
+    assert len(lines) == 2
+    assert all(len(line) <= 20 for line in lines)
@@ -0,0 +1,137 @@
+import re
+import subprocess
+import numpy as np
+import pytest
+from service.clip_service import ClipService
+from service.ffmpeg_service import FFmpegService
+
+FRAME = 1 / 30
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0]
+
+CLIP_FRAMES = 250
+CLIP_WIDTH, CLIP_HEIGHT, CLIP_BITS = 160, 96, 8
+
+
+@pytest.fixture
+def clips():
+    return ClipService(ffmpeg=object())
+
+
+def test_plan_trim_between_keyframes(clips):
+    assert clips.plan_trim(KEYFRAMES, 1.0, 7.0, 10.0, FRAME) == [
+        ("encode", 1.0, 2.0),
+        ("copy", 2.0, 6.0),
+        ("encode", 6.0, 7.0),
+    ]
+
+
+def test_plan_trim_start_on_keyframe(clips):
+    # Điểm cắt lệch keyframe dưới nửa frame: copy ngay từ keyframe
+    assert clips.plan_trim(KEYFRAMES, 2.0 + FRAME / 4, 5.0, 10.0, FRAME) == [
+        ("copy", 2.0, 4.0),
+        ("encode", 4.0, 5.0),
+    ]
+
+
+def test_plan_trim_to_end_copies_tail(clips):
+    assert clips.plan_trim(KEYFRAMES, 3.0, 10.0, 10.0, FRAME) == [
+        ("encode", 3.0, 4.0),
+        ("copy", 4.0, 10.0),
+    ]
+
+
+def test_plan_trim_whole_video_is_one_copy(clips):
+    assert clips.plan_trim(KEYFRAMES, 0.0, 10.0, 10.0, FRAME) == [("copy", 0.0, 10.0)]
+
+
+def test_plan_trim_without_keyframe_inside(clips):
+    assert clips.plan_trim(KEYFRAMES, 2.5, 3.5, 10.0, FRAME) == [("encode", 2.5, 3.5)]
+
+
+def test_plan_trim_single_keyframe_inside(clips):
+    # Không có gì để copy giữa 2 đoạn encode: gộp thành một đoạn
+    assert clips.plan_trim(KEYFRAMES, 1.5, 3.0, 10.0, FRAME) == [("encode", 1.5, 3.0)]
+
+
+def test_plan_trim_ignores_keyframe_at_end(clips):
+    # Keyframe trùng điểm kết thúc không tạo đoạn rỗng
+    assert clips.plan_trim(KEYFRAMES, 1.0, 4.0, 10.0, FRAME) == [("encode", 1.0, 4.0)]
+
+
+@pytest.mark.parametrize("start, end", [(0.0, 10.0), (0.5, 9.5), (1.0, 7.0), (3.3, 3.9), (6.0, 10.0)])
+def test_plan_trim_pieces_are_contiguous(clips, start, end):
+    pieces = clips.plan_trim(KEYFRAMES, start, end, 10.0, FRAME)
+    assert pieces[0][1] == start
+    assert pieces[-1][2] == end
+    for (_, _, previous_end), (_, next_start, _) in zip(pieces, pieces[1:]):
+        assert previous_end == next_start
+    # Đoạn copy luôn bắt đầu ở keyframe, không có 2 đoạn encode liền nhau
+    assert all(piece_start in KEYFRAMES for kind, piece_start, _ in pieces if kind == "copy")
+    assert all(not (a == b == "encode") for (a, _, _), (b, _, _) in zip(pieces, pieces[1:]))
+
+
+def _write_clip(ffmpeg, path):
+    """Clip 10s, 25fps có B-frame, keyframe mỗi 2s; số thứ tự frame ghi thành các ô đen/trắng ở dải trên cùng"""
+    frames = np.full((CLIP_FRAMES, CLIP_HEIGHT, CLIP_WIDTH), 96, dtype=np.uint8)
+    for number in range(CLIP_FRAMES):
+        frames[number, CLIP_HEIGHT // 2:, :] = (number * 5) % 256
+        for bit in range(CLIP_BITS):
+            frames[number, :16, bit * 16:(bit + 1) * 16] = 255 if number >> bit & 1 else 0
+    subprocess.run(
+        [ffmpeg.binary, "-hide_banner", "-loglevel", "error", "-y",
+         "-f", "rawvideo", "-pix_fmt", "gray", "-s", f"{CLIP_WIDTH}x{CLIP_HEIGHT}", "-r", "25", "-i", "-",
+         "-f", "lavfi", "-i", "sine=frequency=440:duration=10",
+         "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", "50", "-bf", "3",
+         "-c:a", "aac", "-shortest", path],
+        input=frames.tobytes(), check=True,
+    )
+
+
+def _read_frames(ffmpeg, path):
+    """Số thứ tự và pts (giây) của từng frame đã decode"""
+    pixels = subprocess.run(
+        [ffmpeg.binary, "-loglevel", "error", "-i", path, "-map", "0:v:0", "-fps_mode", "passthrough",
+         "-f", "rawvideo", "-pix_fmt", "gray", "-"],
+        stdout=subprocess.PIPE, check=True,
+    ).stdout
+    frames = np.frombuffer(pixels, dtype=np.uint8).reshape(-1, CLIP_HEIGHT, CLIP_WIDTH)
+    numbers = [
+        sum(1 << bit for bit in range(CLIP_BITS) if frame[4:12, bit * 16 + 4:bit * 16 + 12].mean() > 128)
+        for frame in frames
+    ]
+    report = subprocess.run(
+        [ffmpeg.binary, "-loglevel", "error", "-i", path, "-map", "0:v:0", "-fps_mode", "passthrough",
+         "-f", "framecrc", "-"],
+        stdout=subprocess.PIPE, check=True,
+    ).stdout.decode()
+    num, den = re.search(r"^#tb 0: (\d+)/(\d+)", report, re.MULTILINE).groups()
+    times = [int(line.split(",")[2]) * int(num) / int(den) for line in report.splitlines() if not line.startswith("#")]
+    return numbers, times
+
+
+@pytest.fixture(scope="module")
+def source_clip(tmp_path_factory):
+    ffmpeg = FFmpegService()
+    path = str(tmp_path_factory.mktemp("clips") / "source.mp4")
+    try:
+        _write_clip(ffmpeg, path)
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("Không chạy được ffmpeg")
+    return path
+
+
+@pytest.mark.parametrize("start, end", [(1.0, 7.0), (2.0, 6.0), (0.5, 1.5), (3.3, None), (0.0, 4.0), (2.0, None)])
+def test_trim_is_frame_accurate(source_clip, tmp_path, start, end):
+    clips = ClipService()
+    output_path = str(tmp_path / "trim.mp4")
+    result = clips.trim(source_clip, start, end, output_path)
+
+    numbers, times = _read_frames(clips.ffmpeg, output_path)
+    expected = [number for number in range(CLIP_FRAMES) if start <= number / 25 < (end or 10.0)]
+    # Đủ frame, đúng thứ tự, không lặp/thiếu ở điểm nối giữa đoạn copy và đoạn encode
+    assert numbers == expected
+    # Khoảng cách giữa các frame giữ nguyên 1/25s
+    assert np.allclose(np.diff(times), 0.04, atol=1e-3)
+    assert clips.ffmpeg.probe_video(output_path)["hasAudio"]
+    if end is not None and end - start >= 4.0:
+        assert result["copiedSeconds"] > 0
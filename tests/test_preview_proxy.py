@@ -0,0 +1,176 @@
+import asyncio
+import pytest
+from starlette.datastructures import Headers
+from service.preview_proxy import parse_range, RangeFileResponse
+
+SIZE = 1000
+ETAG = "\"abc123\""
+LAST_MODIFIED = 1700000000
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-", (0, SIZE - 1)),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-199", (100, 199)),
+    ("bytes=900-5000", (900, SIZE - 1)),
+    ("bytes=-100", (900, SIZE - 1)),
+    ("bytes=-5000", (0, SIZE - 1)),
+    (" bytes = 10 - 20 ", (10, 20)),
+])
+def test_parse_range(value, expected):
+    assert parse_range(value, SIZE) == expected
+
+
+@pytest.mark.parametrize("value", ["bytes=0-99,200-299", "bytes=-", "items=0-10", "bytes=abc-"])
+def test_parse_range_ignores_unsupported(value):
+    # Nhiều khoảng hoặc sai cú pháp: trả cả file
+    assert parse_range(value, SIZE) is None
+
+
+@pytest.mark.parametrize("value", [f"bytes={SIZE}-", f"bytes={SIZE + 10}-{SIZE + 20}", "bytes=50-10", "bytes=-0"])
+def test_parse_range_unsatisfiable(value):
+    with pytest.raises(ValueError):
+        parse_range(value, SIZE)
+
+
+class Result:
+    def __init__(self, status_code: int, headers: Headers, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+class Client:
+    """Gọi RangeFileResponse như server ASGI (không có extension zero-copy) và gom body"""
+
+    def __init__(self, file_info):
+        self.file_info = file_info
+
+    def request(self, method: str, headers=None) -> Result:
+        response = RangeFileResponse(self.file_info, Headers(headers or {}), method, chunk_size=100)
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        asyncio.run(response({"type": "http", "method": method, "headers": []}, receive, send))
+        start = messages[0]
+        return Result(
+            start["status"],
+            Headers(raw=start["headers"]),
+            b"".join(message.get("body", b"") for message in messages[1:]),
+        )
+
+    def get(self, path: str, headers=None) -> Result:
+        return self.request("GET", headers)
+
+    def head(self, path: str, headers=None) -> Result:
+        return self.request("HEAD", headers)
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(bytes(range(256)) * 4)
+    file_info = {
+        "path": str(path),
+        "size": 1024,
+        "etag": ETAG,
+        "lastModified": LAST_MODIFIED,
+        "contentType": "video/mp4",
+    }
+    return Client(file_info), path.read_bytes()
+
+
+def test_full_file(client):
+    client, content = client
+    response = client.get("/stream")
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == ETAG
+    assert response.headers["content-length"] == "1024"
+
+
+def test_open_ended_range(client):
+    client, content = client
+    response = client.get("/stream", headers={"Range": "bytes=0-"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 0-1023/1024"
+    assert response.content == content
+
+
+def test_suffix_range(client):
+    client, content = client
+    response = client.get("/stream", headers={"Range": "bytes=-300"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 724-1023/1024"
+    assert response.headers["content-length"] == "300"
+    assert response.content == content[-300:]
+
+
+def test_range_past_end_is_416(client):
+    client, _ = client
+    response = client.get("/stream", headers={"Range": "bytes=1024-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1024"
+    assert response.content == b""
+
+
+def test_multi_range_returns_full_file(client):
+    client, content = client
+    response = client.get("/stream", headers={"Range": "bytes=0-9,20-29"})
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_if_range_match_returns_range(client):
+    client, content = client
+    response = client.get("/stream", headers={"Range": "bytes=10-19", "If-Range": ETAG})
+    assert response.status_code == 206
+    assert response.content == content[10:20]
+
+
+def test_if_range_mismatch_returns_full_file(client):
+    client, content = client
+    response = client.get("/stream", headers={"Range": "bytes=10-19", "If-Range": "\"old\""})
+    assert response.status_code == 200
+    assert response.content == content
+
+
+@pytest.mark.parametrize("value", [ETAG, f"W/{ETAG}", f"\"other\", {ETAG}", "*"])
+def test_if_none_match_returns_304(client, value):
+    client, _ = client
+    response = client.get("/stream", headers={"If-None-Match": value})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == ETAG
+
+
+def test_if_none_match_mismatch_ignores_if_modified_since(client):
+    client, content = client
+    response = client.get("/stream", headers={
+        "If-None-Match": "\"other\"",
+        "If-Modified-Since": "Wed, 01 Jan 2031 00:00:00 GMT",
+    })
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_if_modified_since(client):
+    client, _ = client
+    assert client.get("/stream", headers={"If-Modified-Since": "Tue, 14 Nov 2023 22:13:20 GMT"}).status_code == 304
+    assert client.get("/stream", headers={"If-Modified-Since": "Tue, 14 Nov 2023 22:13:19 GMT"}).status_code == 200
+
+
+def test_head_has_headers_without_body(client):
+    client, _ = client
+    response = client.head("/stream", headers={"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "100"
+    assert response.content == b""
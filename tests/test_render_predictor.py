@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+import service.render_predictor as render_predictor
+from service.render_predictor import RenderPredictor
+from config.render_config import (
+    RENDER_ETA_FALLBACK_RATE,
+    UPLOAD_ETA_FALLBACK_RATE,
+    RENDER_POLL_MIN_INTERVAL,
+    RENDER_POLL_MAX_INTERVAL,
+    RENDER_TIMEOUT_FACTOR,
+    RENDER_TIMEOUT_MIN,
+)
+
+
+class FakeCursor(list):
+    def sort(self, field, direction):
+        return FakeCursor(sorted(self, key=lambda item: item[field], reverse=direction < 0))
+
+    def limit(self, count):
+        return FakeCursor(self[:count])
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    def find(self, query):
+        return FakeCursor(item for item in self.documents if all(item.get(k) == v for k, v in query.items()))
+
+    def insert_one(self, document):
+        self.documents.append(document)
+
+
+class FakeMongoDB:
+    def __init__(self):
+        self.collection = FakeCollection()
+
+    def get_collection(self, name, versioned=False):
+        return self.collection
+
+
+@pytest.fixture
+def predictor(monkeypatch):
+    monkeypatch.setattr(render_predictor, "MongoDB", FakeMongoDB)
+    return RenderPredictor(min_samples=5, history_limit=100)
+
+
+def features(segments, duration, megapixels=2.0736, subtitles=False):
+    return {"renderer": "shotstack", "segments": segments, "duration": duration,
+            "megapixels": megapixels, "subtitles": subtitles}
+
+
+def test_features(predictor):
+    data = {
+        "segments": [{"duration": 2.5}, {"duration": "3"}],
+        "resolution": "720",
+        "aspectRatio": "16:9",
+        "subtitle": {"enabled": True},
+    }
+    assert predictor.features(data, "local") == {
+        "renderer": "local", "segments": 2, "duration": 5.5, "megapixels": 0.9216, "subtitles": True,
+    }
+
+
+def test_predict_falls_back_without_history(predictor):
+    assert predictor.predict(features(3, 40)) == {
+        "queueSeconds": 0.0,
+        "renderSeconds": round(max(RENDER_ETA_FALLBACK_RATE * 40, 1.0), 1),
+        "uploadSeconds": round(max(UPLOAD_ETA_FALLBACK_RATE * 40, 1.0), 1),
+    }
+
+
+def test_predict_fits_history(predictor):
+    rng = np.random.default_rng(0)
+    for number in range(30):
+        job = features(int(rng.integers(1, 20)), float(rng.uniform(10, 120)), float(rng.choice([0.9216, 2.0736])),
+                       bool(number % 2))
+        job["queueSeconds"] = float(rng.uniform(2, 6))
+        job["renderSeconds"] = 5 + 0.5 * job["segments"] + 0.2 * job["duration"] * job["megapixels"] + 3 * job["subtitles"]
+        job["uploadSeconds"] = 1 + 0.1 * job["duration"]
+        job["createdAt"] = datetime(2026, 1, 1) + timedelta(minutes=number)
+        predictor.history_collection.insert_one(job)
+
+    estimate = predictor.predict(features(10, 60, 2.0736, True))
+    assert estimate["renderSeconds"] == pytest.approx(5 + 5 + 0.2 * 60 * 2.0736 + 3, abs=0.1)
+    assert estimate["uploadSeconds"] == pytest.approx(7, abs=0.1)
+    assert 2 <= estimate["queueSeconds"] <= 6
+
+    # Thời gian chờ đã biết (job đã bắt đầu render) được giữ nguyên
+    assert predictor.predict({**features(10, 60), "queueSeconds": 12.5})["queueSeconds"] == 12.5
+
+
+def test_predict_is_never_below_one_second(predictor):
+    for number in range(10):
+        predictor.history_collection.insert_one({
+            **features(1, 10 + number), "queueSeconds": 0, "renderSeconds": 50 - 5 * (10 + number),
+            "uploadSeconds": 1, "createdAt": datetime(2026, 1, 1) + timedelta(minutes=number),
+        })
+    estimate = predictor.predict(features(1, 200))
+    assert estimate["renderSeconds"] == 1.0
+    assert estimate["queueSeconds"] == 0.0
+
+
+def test_record_refits_model(predictor):
+    assert predictor.model("shotstack") is None
+    for number in range(5):
+        predictor.record(f"video{number}", features(2, 30), 1, 20, 5)
+    assert predictor.model("shotstack") is not None
+    assert predictor.predict(features(2, 30))["renderSeconds"] == pytest.approx(20, abs=0.1)
+
+
+def test_timeout(predictor):
+    assert predictor.timeout({"queueSeconds": 0, "renderSeconds": 1}) == RENDER_TIMEOUT_MIN
+    long_job = {"queueSeconds": 100, "renderSeconds": RENDER_TIMEOUT_MIN}
+    assert predictor.timeout(long_job) == RENDER_TIMEOUT_FACTOR * (100 + RENDER_TIMEOUT_MIN)
+
+
+def test_poll_interval(predictor):
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    expected = RENDER_POLL_MIN_INTERVAL + (RENDER_POLL_MAX_INTERVAL - RENDER_POLL_MIN_INTERVAL) / 2
+    # Trước thời điểm dự kiến: ngủ tới lúc đó
+    assert predictor.poll_interval(now + timedelta(seconds=expected), now) == pytest.approx(expected)
+    # Xa hơn mức tối đa hoặc sát thời điểm dự kiến: giới hạn trong [min, max]
+    assert predictor.poll_interval(now + timedelta(hours=1), now) == RENDER_POLL_MAX_INTERVAL
+    assert predictor.poll_interval(now, now) == RENDER_POLL_MIN_INTERVAL
+    # Quá thời điểm dự kiến: giãn dần theo thời gian trễ
+    late = predictor.poll_interval(now - timedelta(seconds=4 * expected), now)
+    assert late == pytest.approx(expected)
+    assert predictor.poll_interval(now - timedelta(hours=1), now) == RENDER_POLL_MAX_INTERVAL
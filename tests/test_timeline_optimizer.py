@@ -0,0 +1,98 @@
+from service.timeline_optimizer import TimelineOptimizer
+
+
+def image(src, start, length, **fields):
+    return {"asset": {"type": "image", "src": src}, "start": start, "length": length, **fields}
+
+
+def title(text, start, length, **fields):
+    return {"asset": {"type": "title", "text": text}, "start": start, "length": length, **fields}
+
+
+def optimize(*tracks):
+    return TimelineOptimizer().optimize({"timeline": {"tracks": [{"clips": clips} for clips in tracks]}, "output": {}})
+
+
+def test_rounds_edges_without_accumulating_error():
+    timeline, _ = optimize([
+        image("a.jpg", 0, 1.0004, fit="cover"),
+        image("b.jpg", 1.0004, 2.0004, fit="cover"),
+    ])
+    clips = timeline["timeline"]["tracks"][0]["clips"]
+    assert [(clip["start"], clip["length"]) for clip in clips] == [(0, 1.0), (1.0, 2.001)]
+    # Clip sau bắt đầu đúng lúc clip trước kết thúc
+    assert clips[0]["start"] + clips[0]["length"] == clips[1]["start"]
+
+
+def test_drops_degenerate_clips_and_empty_tracks():
+    timeline, report = optimize(
+        [image("a.jpg", 0, 2), image("", 2, 2), image("b.jpg", 4, 0.0001), title("  ", 0, 2)],
+        [title("", 0, 1)],
+    )
+    tracks = timeline["timeline"]["tracks"]
+    assert len(tracks) == 1
+    assert [clip["asset"]["src"] for clip in tracks[0]["clips"]] == ["a.jpg"]
+    assert report["droppedClips"] == 4
+    assert report["clipsBefore"] == 5 and report["clipsAfter"] == 1 and report["removedClips"] == 4
+
+
+def test_merges_adjacent_identical_images_and_keeps_outer_transitions():
+    timeline, report = optimize([
+        image("a.jpg", 0, 2, transition={"in": "fade", "out": "fade"}),
+        image("a.jpg", 2, 3, transition={"in": "fade", "out": "wipeLeft"}),
+        image("b.jpg", 5, 1),
+    ])
+    clips = timeline["timeline"]["tracks"][0]["clips"]
+    assert len(clips) == 2
+    assert clips[0]["length"] == 5
+    assert clips[0]["transition"] == {"in": "fade", "out": "wipeLeft"}
+    assert report["mergedClips"] == 1
+    assert report["removedTransitions"] == 2
+
+
+def test_merges_interleaved_titles_separately_from_images():
+    timeline, report = optimize([
+        image("a.jpg", 0, 2), title("Xin chào", 0, 2),
+        image("b.jpg", 2, 2), title("Xin chào", 2, 2),
+    ])
+    clips = timeline["timeline"]["tracks"][0]["clips"]
+    titles = [clip for clip in clips if clip["asset"]["type"] == "title"]
+    assert len(clips) == 3
+    assert [(clip["start"], clip["length"]) for clip in titles] == [(0, 4)]
+    assert report["mergedClips"] == 1
+
+
+def test_does_not_merge_gaps_effects_or_audio():
+    timeline, report = optimize(
+        [image("a.jpg", 0, 2), image("a.jpg", 2.5, 2)],
+        [image("a.jpg", 0, 2, effect="zoomIn"), image("a.jpg", 2, 2, effect="zoomIn")],
+        [{"asset": {"type": "audio", "src": "a.mp3"}, "start": 0, "length": 2},
+         {"asset": {"type": "audio", "src": "a.mp3"}, "start": 2, "length": 2}],
+    )
+    assert [len(track["clips"]) for track in timeline["timeline"]["tracks"]] == [2, 2, 2]
+    assert report["mergedClips"] == 0
+
+
+def test_removes_empty_transition():
+    timeline, report = optimize([image("a.jpg", 0, 2, transition={"in": None, "out": ""})])
+    assert "transition" not in timeline["timeline"]["tracks"][0]["clips"][0]
+    assert report["removedTransitions"] == 1
+
+
+def test_does_not_modify_input():
+    data = {"timeline": {"tracks": [{"clips": [image("a.jpg", 0, 1.00049), image("a.jpg", 1.00049, 1)]}]}}
+    TimelineOptimizer().optimize(data)
+    assert len(data["timeline"]["tracks"][0]["clips"]) == 2
+    assert data["timeline"]["tracks"][0]["clips"][0]["length"] == 1.00049
+
+
+def test_merge_segments():
+    segments = [
+        {"index": 0, "image": "a.jpg", "caption": "x", "duration": 1.5},
+        {"index": 1, "image": "a.jpg", "caption": "x", "duration": 2.25, "transition": {"type": "fade"}},
+        {"index": 2, "image": "a.jpg", "caption": "y", "duration": 1},
+        {"index": 3, "image": "a.jpg", "caption": "y", "duration": 1, "motion": "zoomIn"},
+    ]
+    merged = TimelineOptimizer().merge_segments(segments)
+    assert [(segment["index"], segment["duration"]) for segment in merged] == [(0, 3.75), (2, 1), (3, 1)]
+    assert "transition" not in merged[0]